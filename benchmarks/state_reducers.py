@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: per-node overhead as the append-only state lists grow.
+
+Runs a one-node looping graph that adds one DecisionLogEntry per step,
+starting from decision logs of increasing size, and compares:
+
+  copy    - pre-reducer schema; the node returns state.decision_log + [entry]
+  append  - WorkItemState's operator.add channel; the node returns [entry]
+
+What remains in "append" is LangGraph rebuilding WorkItemState from its
+channels before each node/router call, which still touches every list entry
+(an isinstance check per item, no revalidation).
+
+Run from the repo root:
+
+    python -m benchmarks.state_reducers
+"""
+import json
+import time
+from typing import List
+
+from langgraph.graph import StateGraph, END
+
+from reliquary.schemas.state import WorkItemState
+from reliquary.schemas.help import DecisionLogEntry
+
+
+STEPS = 200
+LOG_SIZES = [0, 100, 1_000, 10_000]
+
+
+class _CopyState(WorkItemState):
+    # Plain last-value channel, as before the reducer change.
+    decision_log: List[DecisionLogEntry] = []
+
+
+def _entry() -> DecisionLogEntry:
+    return DecisionLogEntry(event="PATCH_PROPOSED", actor="owner", details={"attempt": 1})
+
+
+def _graph(mode: str, steps: int):
+    schema = _CopyState if mode == "copy" else WorkItemState
+    g = StateGraph(schema)
+
+    def node(state):
+        if mode == "copy":
+            dl = state.decision_log + [_entry()]
+        else:
+            dl = [_entry()]
+        return {"decision_log": dl, "implement_attempts": state.implement_attempts + 1}
+
+    g.add_node("step", node)
+    g.set_entry_point("step")
+    g.add_conditional_edges("step", lambda s: END if s.implement_attempts >= steps else "step")
+    return g.compile(), schema
+
+
+def measure(mode: str, log_size: int, steps: int = STEPS) -> float:
+    """Return mean milliseconds per node step starting from log_size entries."""
+    graph, schema = _graph(mode, steps)
+    state = schema(
+        work_item_id="bench",
+        repo_path=".",
+        task_raw="bench",
+        decision_log=[_entry() for _ in range(log_size)],
+    )
+
+    started = time.perf_counter()
+    final = graph.invoke(state, {"recursion_limit": steps * 2 + 10})
+    elapsed = time.perf_counter() - started
+
+    assert len(final["decision_log"]) == log_size + steps
+    return elapsed / steps * 1000
+
+
+def main():
+    results = []
+    for log_size in LOG_SIZES:
+        row = {"log_size": log_size}
+        for mode in ("copy", "append"):
+            row[f"{mode}_ms_per_node"] = round(measure(mode, log_size), 4)
+        results.append(row)
+        print(f"log_size={log_size:>6}  copy={row['copy_ms_per_node']:.4f} ms/node  "
+              f"append={row['append_ms_per_node']:.4f} ms/node")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
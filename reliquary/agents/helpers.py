@@ -1,9 +1,11 @@
 import json
-import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from reliquary.llm.client import PooledChatModel, get_chat_model
+from reliquary.llm.structured import ainvoke_structured, invoke_structured
 
+from reliquary.schemas.agent_output import HelperAdvice
 from reliquary.schemas.help import HelpDomain, HelpRequest, HelpResponse
+from reliquary.storage.trace_store import span
 
 load_dotenv()
 
@@ -29,43 +31,41 @@ Return JSON ONLY in the following schema:
 """
 
 
-def _llm() -> ChatOpenAI:
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    return ChatOpenAI(model=model, temperature=0)
+def _llm() -> PooledChatModel:
+    return get_chat_model(temperature=0)
 
 
-def _strip_code_fences(txt: str) -> str:
-    txt = (txt or "").strip()
-    if txt.startswith("```"):
-        lines = [l for l in txt.split("\n") if l.strip() not in ("```", "```json")]
-        txt = "\n".join(lines).strip()
-    return txt
-
-
-def provide_help(req: HelpRequest) -> HelpResponse:
-    llm = _llm()
+def _help_messages(req: HelpRequest) -> list:
     user = {
         "domain": req.domain,
         "question": req.question,
         "context": req.context,
         "attempt": req.attempt,
     }
-    resp = llm.invoke([("system", HELPER_SYSTEM), ("user", json.dumps(user))])
-    txt = _strip_code_fences(resp.content)
-    data = json.loads(txt)
+    return [("system", HELPER_SYSTEM), ("user", json.dumps(user))]
+
+
+def provide_help(req: HelpRequest) -> HelpResponse:
+    with span("llm.helper", kind="llm", domain=req.domain) as s:
+        advice = invoke_structured(_llm(), _help_messages(req), HelperAdvice, s)
+    return _help_response(req, advice)
+
+
+async def aprovide_help(req: HelpRequest) -> HelpResponse:
+    with span("llm.helper", kind="llm", domain=req.domain) as s:
+        advice = await ainvoke_structured(_llm(), _help_messages(req), HelperAdvice, s)
+    return _help_response(req, advice)
 
-    conf = data.get("confidence")
-    if conf not in (None, "low", "medium", "high"):
-        conf = None
 
+def _help_response(req: HelpRequest, advice: HelperAdvice) -> HelpResponse:
     return HelpResponse(
         request_id=req.request_id,
         domain=req.domain,
-        advice=data.get("advice", []) or [],
-        checks=data.get("checks", []) or [],
-        risks=data.get("risks", []) or [],
-        needs_more_info=data.get("needs_more_info", []) or [],
-        confidence=conf,
+        advice=advice.advice,
+        checks=advice.checks,
+        risks=advice.risks,
+        needs_more_info=advice.needs_more_info,
+        confidence=advice.confidence,
     )
 
 
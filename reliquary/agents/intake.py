@@ -1,12 +1,13 @@
-import json
 from dataclasses import dataclass
-from typing import List
+from typing import Any, List
 
-from langchain_openai import ChatOpenAI
+from reliquary.llm.client import PooledChatModel, get_chat_model
+from reliquary.llm.structured import ainvoke_structured, invoke_structured
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 from reliquary.schemas.ticket import TicketSpec
+from reliquary.storage.trace_store import span
 
 
 @dataclass
@@ -16,12 +17,6 @@ class IntakeResult:
     clarification_questions: List[str]
 
 
-class _LLMOutWrapped(BaseModel):
-    ticket: TicketSpec
-    needs_info: bool = False
-    clarification_questions: List[str] = Field(default_factory=list)
-
-
 class _LLMOutFlat(BaseModel):
     # When the model returns TicketSpec directly (flat JSON)
     title: str
@@ -36,44 +31,47 @@ class _LLMOutFlat(BaseModel):
     clarification_questions: List[str] = Field(default_factory=list)
 
 
-def _parse_intake_json(txt: str) -> _LLMOutWrapped:
+class _LLMOutWrapped(BaseModel):
     """
     Accept both:
       1) Wrapped output: { "ticket": {...}, "needs_info": ..., "clarification_questions": [...] }
       2) Flat output:   { "title": ..., "description": ..., ... }  (TicketSpec fields at top level)
     """
-    data = json.loads(txt)
-
-    # Wrapped format
-    if isinstance(data, dict) and "ticket" in data:
-        return _LLMOutWrapped.model_validate(data)
-
-    # Flat format -> wrap it
-    flat = _LLMOutFlat.model_validate(data)
-    ticket = TicketSpec(
-        title=flat.title,
-        problem_statement=flat.problem_statement,
-        acceptance_criteria=flat.acceptance_criteria,
-        constraints=flat.constraints,
-        out_of_scope=flat.out_of_scope,
-        risk_level=flat.risk_level,
-        domain_tags=flat.domain_tags,
-    )
-    return _LLMOutWrapped(
-        ticket=ticket,
-        needs_info=flat.needs_info,
-        clarification_questions=flat.clarification_questions,
-    )
-
-
-def intake(task_raw: str) -> IntakeResult:
-    """
-    Stage 1: Turn user task into a structured TicketSpec.
-    """
-    model = "gpt-4o-mini"
-    llm = ChatOpenAI(model=model, temperature=0.0)
+    ticket: TicketSpec
+    needs_info: bool = False
+    clarification_questions: List[str] = Field(default_factory=list)
 
-    prompt = f"""
+    @model_validator(mode="before")
+    @classmethod
+    def _wrap_flat(cls, data: Any) -> Any:
+        # Wrapped format
+        if not isinstance(data, dict) or "ticket" in data:
+            return data
+
+        # Flat format -> wrap it
+        flat = _LLMOutFlat.model_validate(data)
+        ticket = TicketSpec(
+            title=flat.title,
+            problem_statement=flat.problem_statement,
+            acceptance_criteria=flat.acceptance_criteria,
+            constraints=flat.constraints,
+            out_of_scope=flat.out_of_scope,
+            risk_level=flat.risk_level,
+            domain_tags=flat.domain_tags,
+        )
+        return {
+            "ticket": ticket,
+            "needs_info": flat.needs_info,
+            "clarification_questions": flat.clarification_questions,
+        }
+
+
+def _llm() -> PooledChatModel:
+    return get_chat_model(temperature=0)
+
+
+def _intake_prompt(task_raw: str) -> str:
+    return f"""
 You are an Intake Agent in a software engineering organization.
 Convert USER_TASK into a JSON object.
 
@@ -105,13 +103,28 @@ USER_TASK:
 {task_raw}
 """.strip()
 
-    resp = llm.invoke(prompt)
-    txt = resp.content.strip()
-
-    parsed = _parse_intake_json(txt)
 
+def _intake_result(parsed: _LLMOutWrapped) -> IntakeResult:
     return IntakeResult(
         ticket=parsed.ticket,
         needs_info=parsed.needs_info,
         clarification_questions=parsed.clarification_questions,
     )
+
+
+def intake(task_raw: str) -> IntakeResult:
+    """
+    Stage 1: Turn user task into a structured TicketSpec.
+    """
+    with span("llm.intake", kind="llm") as s:
+        parsed = invoke_structured(_llm(), _intake_prompt(task_raw), _LLMOutWrapped, s)
+    return _intake_result(parsed)
+
+
+async def aintake(task_raw: str) -> IntakeResult:
+    """
+    Async variant of intake() for the async graph.
+    """
+    with span("llm.intake", kind="llm") as s:
+        parsed = await ainvoke_structured(_llm(), _intake_prompt(task_raw), _LLMOutWrapped, s)
+    return _intake_result(parsed)
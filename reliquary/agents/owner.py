@@ -1,11 +1,23 @@
 import os
+
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from reliquary.llm.client import PooledChatModel, get_chat_model
 
 from reliquary.tools.fs_tools import list_tree, read_text
+from reliquary.tools.code_index import select_context
 from reliquary.schemas.ticket import TicketSpec
-from reliquary.schemas.help import HelpRequest
+from reliquary.schemas.help import HelpRequest, HelpResponse
 from reliquary.agents.helpers import pick_domain_from_ticket_text
+from reliquary.storage.trace_store import span
+from reliquary.llm.stream import JSONArrayStream
+from reliquary.llm.structured import (
+    StructuredOutputError, ainvoke_structured, aresolve_structured, invoke_structured, resolve_structured,
+)
+from reliquary.schemas.agent_output import (
+    AssessOutput, FileChange, FileEdit, HelpDecision, PatchEdits, PatchFiles, PlanOutput,
+)
+from reliquary.security.scanners import detect_secrets
+from reliquary.tools.edit_tools import EditError, apply_edit, apply_file, edits_to_diff, file_diff, files_to_diff
 
 load_dotenv()
 
@@ -19,6 +31,7 @@ PATCH_SYSTEM = """You are the Owning Software Engineer in the Reliquary of Truth
 You must generate complete modified file contents to implement the ticket.
 Rules:
 - Only modify files that exist unless you need to add a new file.
+- To delete a file, give {"path": "old.py", "delete": true} instead of its content.
 - Add/modify tests when appropriate.
 - Keep changes minimal.
 - Output JSON ONLY in this format:
@@ -32,6 +45,28 @@ Rules:
 - Include the COMPLETE file content for each file you modify.
 """
 
+EDIT_SYSTEM = """You are the Owning Software Engineer in the Reliquary of Truth.
+You must implement the ticket as search/replace edits to the repository files.
+Rules:
+- Each edit replaces one snippet of a file: "search" is copied VERBATIM from the file
+  (same indentation and line breaks) and must occur exactly once, so include enough lines to be unique.
+- Keep each snippet small: the lines that change plus a line or two of context. Never repeat whole files.
+- Several edits to the same file are applied in order.
+- To create a new file, use an empty "search" and put the complete file content in "replace".
+- To delete a file, use {"path": "old.py", "delete": true}.
+- Only modify files that exist unless you need to add a new file.
+- Add/modify tests when appropriate.
+- Keep changes minimal.
+- Output JSON ONLY in this format:
+{
+  "edits": [
+    {"path": "app.py", "search": "exact existing lines", "replace": "new lines"},
+    {"path": "tests/test_new.py", "search": "", "replace": "complete content of the new file"}
+  ]
+}
+- Do NOT include markdown or code fences.
+"""
+
 HELP_DECIDER_SYSTEM = """You are the Owning Software Engineer in the Reliquary of Truth.
 
 Decide if you have enough information to safely implement the ticket with minimal changes.
@@ -48,26 +83,51 @@ Return JSON ONLY:
 """
 
 
-def _strip_code_fences(txt: str) -> str:
-    txt = (txt or "").strip()
-    if txt.startswith("```"):
-        lines = [l for l in txt.split("\n") if l.strip() not in ("```", "```json")]
-        txt = "\n".join(lines).strip()
-    return txt
+ASSESS_SYSTEM = """You are the Owning Software Engineer in the Reliquary of Truth.
+Assess the ticket against the repository before any code is written, in one answer:
 
+1) Create a short execution plan (5-10 steps max) to satisfy the ticket.
+   Do NOT write code. Do NOT mention tools you don't have. Keep steps verifiable.
+2) Decide if you have enough information to safely implement the ticket with minimal changes.
+   If the repository appears to be a skeleton (missing key files) OR the ticket requires framework-specific
+   knowledge not present in the provided context, you should request help from the appropriate specialist.
 
-def maybe_request_help(repo_path: str, ticket: TicketSpec, attempt: int) -> HelpRequest | None:
-    """Week 2: Ask whether we should request specialist help before writing a patch.
+Return JSON ONLY:
+{
+  "plan": ["step1", ...],
+  "need_help": true|false,
+  "question": "A single, concrete question to ask a specialist (no code).",
+  "why": "Short reason"
+}
+"""
 
-    Goal: avoid 'guessing under pressure'. If we are missing repo context, we ask a specialist.
-    """
-    import json
 
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    llm = ChatOpenAI(model=model, temperature=0)
+def patch_format() -> str:
+    """RELIQUARY_PATCH_FORMAT=edits (default) asks for search/replace edits; "full" for complete files."""
+    return "full" if os.getenv("RELIQUARY_PATCH_FORMAT", "edits").lower() == "full" else "edits"
 
-    files = list_tree(repo_path, max_files=200)
-    ticket_text = (
+
+def stream_enabled() -> bool:
+    """RELIQUARY_PATCH_STREAM=on (default) diffs and scans patch answers while they stream; "off" waits for them."""
+    return os.getenv("RELIQUARY_PATCH_STREAM", "on").lower() not in ("off", "0", "false")
+
+
+def assess_enabled() -> bool:
+    """RELIQUARY_PLAN_MODE=assess (default) plans and decides on help in one call; "separate" uses two."""
+    return os.getenv("RELIQUARY_PLAN_MODE", "assess").lower() != "separate"
+
+
+# Extra speculative candidates are sampled above temperature 0 so they differ
+# from the greedy patch.
+CANDIDATE_TEMPERATURE = 0.7
+
+
+def _llm(temperature: float = 0) -> PooledChatModel:
+    return get_chat_model(temperature=temperature)
+
+
+def _ticket_text(ticket: TicketSpec) -> str:
+    return (
         f"TITLE: {ticket.title}\n"
         f"PROBLEM: {ticket.problem_statement}\n"
         f"ACCEPTANCE: {ticket.acceptance_criteria}\n"
@@ -75,24 +135,47 @@ def maybe_request_help(repo_path: str, ticket: TicketSpec, attempt: int) -> Help
         f"OUT_OF_SCOPE: {ticket.out_of_scope}\n"
     )
 
-    user = {
-        "ticket": ticket_text,
+
+def _help_context(files: list[str], ticket: TicketSpec, help_responses: list[HelpResponse] | None = None) -> dict:
+    context = {
+        "ticket": _ticket_text(ticket),
         "repo_files": files,
         "note": "If key entrypoints/framework are unclear, request help.",
     }
+    if help_responses:
+        # What specialists already answered, so the decision can change once help arrived.
+        context["help_received"] = [
+            {"domain": r.domain, "advice": r.advice, "needs_more_info": r.needs_more_info}
+            for r in help_responses
+        ]
+    return context
+
+
+def _help_decider_messages(files: list[str], ticket: TicketSpec, help_responses: list[HelpResponse] | None = None) -> list:
+    import json
 
-    resp = llm.invoke([("system", HELP_DECIDER_SYSTEM), ("user", json.dumps(user))])
-    txt = _strip_code_fences(resp.content)
-    data = json.loads(txt)
+    return [("system", HELP_DECIDER_SYSTEM), ("user", json.dumps(_help_context(files, ticket, help_responses)))]
 
-    if not data.get("need_help"):
+
+def help_decision_key(repo_path: str, ticket: TicketSpec, help_responses: list[HelpResponse] | None = None) -> str:
+    """Fingerprint of everything a help decision sees; asking again with the same key learns nothing new."""
+    import hashlib
+    import json
+
+    files = list_tree(repo_path, max_files=200)
+    context = _help_context(files, ticket, help_responses)
+    return hashlib.sha1(json.dumps(context, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _help_request_from(decision: HelpDecision, files: list[str], ticket: TicketSpec, attempt: int) -> HelpRequest | None:
+    if not decision.need_help:
         return None
 
     domain = pick_domain_from_ticket_text(ticket.problem_statement + " " + " ".join(ticket.domain_tags))
-    question = (data.get("question") or "").strip() or "What is the expected tech stack / key entrypoint files for this repo?"
-    why = (data.get("why") or "Need more context").strip()
+    question = decision.question.strip() or "What is the expected tech stack / key entrypoint files for this repo?"
+    why = decision.why.strip() or "Need more context"
 
-    context = f"WHY: {why}\n\nTICKET:\n{ticket_text}\n\nREPO_FILES:\n{files}"
+    context = f"WHY: {why}\n\nTICKET:\n{_ticket_text(ticket)}\n\nREPO_FILES:\n{files}"
 
     return HelpRequest(
         request_id=f"help_{attempt}",
@@ -103,10 +186,59 @@ def maybe_request_help(repo_path: str, ticket: TicketSpec, attempt: int) -> Help
     )
 
 
-def make_plan(ticket: TicketSpec) -> list[str]:
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    llm = ChatOpenAI(model=model, temperature=0)
+def maybe_request_help(
+    repo_path: str, ticket: TicketSpec, attempt: int, help_responses: list[HelpResponse] | None = None
+) -> HelpRequest | None:
+    """Week 2: Ask whether we should request specialist help before writing a patch.
+
+    Goal: avoid 'guessing under pressure'. If we are missing repo context, we ask a specialist.
+    Advice already received (help_responses) is part of the question.
+    """
+    files = list_tree(repo_path, max_files=200)
+    with span("llm.help_decider", kind="llm") as s:
+        decision = invoke_structured(_llm(), _help_decider_messages(files, ticket, help_responses), HelpDecision, s)
+    return _help_request_from(decision, files, ticket, attempt)
 
+
+async def amaybe_request_help(
+    repo_path: str, ticket: TicketSpec, attempt: int, help_responses: list[HelpResponse] | None = None
+) -> HelpRequest | None:
+    """Async variant of maybe_request_help()."""
+    files = list_tree(repo_path, max_files=200)
+    with span("llm.help_decider", kind="llm") as s:
+        decision = await ainvoke_structured(_llm(), _help_decider_messages(files, ticket, help_responses), HelpDecision, s)
+    return _help_request_from(decision, files, ticket, attempt)
+
+
+def _assess_messages(files: list[str], ticket: TicketSpec) -> list:
+    import json
+
+    return [("system", ASSESS_SYSTEM), ("user", json.dumps(_help_context(files, ticket)))]
+
+
+def assess(repo_path: str, ticket: TicketSpec, attempt: int = 1) -> tuple[list[str], HelpRequest | None]:
+    """Plan the ticket and decide on specialist help in a single LLM call.
+
+    Replaces make_plan() followed by maybe_request_help() for the first attempt.
+
+    Returns:
+        (plan steps, help request or None)
+    """
+    files = list_tree(repo_path, max_files=200)
+    with span("llm.assess", kind="llm") as s:
+        out = invoke_structured(_llm(), _assess_messages(files, ticket), AssessOutput, s)
+    return out.plan, _help_request_from(out, files, ticket, attempt)
+
+
+async def aassess(repo_path: str, ticket: TicketSpec, attempt: int = 1) -> tuple[list[str], HelpRequest | None]:
+    """Async variant of assess()."""
+    files = list_tree(repo_path, max_files=200)
+    with span("llm.assess", kind="llm") as s:
+        out = await ainvoke_structured(_llm(), _assess_messages(files, ticket), AssessOutput, s)
+    return out.plan, _help_request_from(out, files, ticket, attempt)
+
+
+def _plan_messages(ticket: TicketSpec) -> list:
     payload = {
         "title": ticket.title,
         "problem_statement": ticket.problem_statement,
@@ -114,75 +246,276 @@ def make_plan(ticket: TicketSpec) -> list[str]:
         "constraints": ticket.constraints,
         "out_of_scope": ticket.out_of_scope,
     }
-    resp = llm.invoke([("system", PLAN_SYSTEM), ("user", str(payload))])
+    return [("system", PLAN_SYSTEM), ("user", str(payload))]
 
-    import json
-    return json.loads(resp.content)["plan"]
 
+def make_plan(ticket: TicketSpec) -> list[str]:
+    with span("llm.plan", kind="llm") as s:
+        return invoke_structured(_llm(), _plan_messages(ticket), PlanOutput, s).plan
 
-def generate_patch(repo_path: str, ticket: TicketSpec) -> str:
-    import json
-    import subprocess
-    import tempfile
-    from pathlib import Path
 
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    llm = ChatOpenAI(model=model, temperature=0)
+async def amake_plan(ticket: TicketSpec) -> list[str]:
+    with span("llm.plan", kind="llm") as s:
+        return (await ainvoke_structured(_llm(), _plan_messages(ticket), PlanOutput, s)).plan
+
 
+def _patch_messages(repo_path: str, ticket: TicketSpec, system: str = PATCH_SYSTEM) -> list:
     files = list_tree(repo_path, max_files=200)
 
-    # Provide key file contents if they exist (Week 1-style: keep small)
-    context_parts = []
-    for rel in files:
-        if rel in ("app.py", "tests/test_app.py"):
-            context_parts.append(f"FILE: {rel}\n---\n{read_text(repo_path, rel)}\n---\n")
+    # Contents of the files most relevant to the ticket, picked with the repo's code index
+    chosen, related = select_context(repo_path, _ticket_text(ticket))
+    context_parts = [f"FILE: {rel}\n---\n{read_text(repo_path, rel)}\n---\n" for rel in chosen]
 
     ctx = "\n".join(context_parts) if context_parts else "No file contents provided."
+    outline = "\n".join(related)
+
+    ask = "Return JSON with search/replace edits." if system == EDIT_SYSTEM else "Return JSON with modified files."
+    user_msg = f"{_ticket_text(ticket)}\n\nREPO_FILES:\n{files}\n\n"
+    if outline:
+        user_msg += f"RELATED_FILES (not shown; path - summary [definitions]):\n{outline}\n\n"
+    user_msg += f"CONTEXT:\n{ctx}\n\n{ask}"
+    return [("system", system), ("user", user_msg)]
+
+
+def _patch_from(repo_path: str, answer: PatchEdits | PatchFiles) -> str:
+    """Diff for a validated answer, all files in one pass; raises EditError when an edit doesn't apply."""
+    if isinstance(answer, PatchEdits):
+        diff = edits_to_diff(repo_path, [e.model_dump() for e in answer.edits])
+    else:
+        diff = files_to_diff(repo_path, [f.model_dump() for f in answer.files])
+    return diff or "No changes detected"
+
+
+def _fallback(fmt: str, s: dict, error: Exception) -> None:
+    """Record why an edit-format answer is unusable (the caller falls back to full files); re-raise otherwise."""
+    if fmt != "edits":
+        raise error
+    s["fallback"] = str(error)[:200]
+
+
+_ANSWER_SCHEMAS = {"edits": PatchEdits, "full": PatchFiles}
+
+
+class _PatchStream:
+    """Diffs each entry of a streamed patch answer as soon as it is complete.
+
+    Every finished file diff goes through the secrets scan right away; a leak
+    stops the stream, since the detect_secrets gate would reject the patch
+    anyway. In the edit format an edit that doesn't apply stops it too, so
+    the full-file fallback starts without waiting for the rest.
+    """
+
+    def __init__(self, repo_path: str, fmt: str):
+        import time
+
+        self.repo_path = repo_path
+        self.fmt = fmt
+        self.parser = JSONArrayStream("edits" if fmt == "edits" else "files")
+        self.started = time.perf_counter()
+        # Changed files so far and the current diff of each
+        self.files: dict = {}
+        self.diffs: dict[str, str] = {}
+        self.entries = 0
+        self.first_entry_ms: float | None = None
+        self.aborted: str | None = None
+        self.error: Exception | None = None
+
+    def _parse(self, text: str) -> list:
+        # Once the answer is known to be malformed the rest is only collected,
+        # so it can be repaired or re-asked in part when the stream ends.
+        if self.error is not None:
+            return []
+        try:
+            return self.parser.feed(text)
+        except ValueError as e:
+            self.error = e
+            return []
+
+    def _check(self, entries: list) -> bool:
+        import time
+
+        for entry in entries:
+            try:
+                if self.fmt == "edits":
+                    rel = apply_edit(self.repo_path, self.files, FileEdit.model_validate(entry).model_dump())
+                else:
+                    rel = apply_file(self.repo_path, self.files, FileChange.model_validate(entry).model_dump())
+                diff = file_diff(self.repo_path, rel, *self.files[rel])
+            except EditError as e:
+                self.error = e
+                return True
+            except ValueError as e:
+                # An entry that doesn't match the schema
+                self.error = e
+                return False
+            self.entries += 1
+            if self.first_entry_ms is None:
+                self.first_entry_ms = round((time.perf_counter() - self.started) * 1000, 3)
+            self.diffs[rel] = diff
+            scan = detect_secrets(diff)
+            if not scan.passed:
+                self.aborted = f"{rel}: {scan.findings[0].description}"
+                return True
+        return False
+
+    def feed(self, text: str) -> bool:
+        """on_text callback for invoke_streaming(); True stops the stream."""
+        entries = self._parse(text)
+        return self._check(entries) if entries else False
+
+    async def afeed(self, text: str) -> bool:
+        """on_text callback for ainvoke_streaming(); diffs run in a worker thread."""
+        import asyncio
+
+        entries = self._parse(text)
+        return await asyncio.to_thread(self._check, entries) if entries else False
+
+    @property
+    def malformed(self) -> bool:
+        """The answer itself is broken (not just an edit that doesn't apply): repair or re-ask it."""
+        if self.error is not None:
+            return not isinstance(self.error, EditError)
+        return self.aborted is None and not self.parser.done
+
+    def patch(self, s: dict) -> str:
+        """The combined diff once the stream ended; raises EditError for an edit that doesn't apply."""
+        s["entries"] = self.entries
+        s["first_entry_ms"] = self.first_entry_ms
+        if self.error is not None:
+            raise self.error
+        if self.aborted is not None:
+            # Returned as far as it got so the gates reject it with the usual findings
+            s["aborted"] = self.aborted[:200]
+        return "".join(self.diffs.values()) or "No changes detected"
+
+
+def _stream_patch(repo_path: str, ticket: TicketSpec, temperature: float, fmt: str) -> str | None:
+    llm = _llm(temperature)
+    messages = _patch_messages(repo_path, ticket, EDIT_SYSTEM if fmt == "edits" else PATCH_SYSTEM)
+    stream = _PatchStream(repo_path, fmt)
+    with span("llm.patch", kind="llm", format=fmt, stream=True) as s:
+        resp = llm.invoke_streaming(messages, stream.feed)
+        try:
+            if not stream.malformed:
+                return stream.patch(s)
+            s["entries"] = stream.entries
+            answer = resolve_structured(llm, messages, resp.content, _ANSWER_SCHEMAS[fmt], s, allow_truncated=False)
+            return _patch_from(repo_path, answer)
+        except (EditError, StructuredOutputError) as e:
+            _fallback(fmt, s, e)
+    return None
+
+
+async def _astream_patch(repo_path: str, ticket: TicketSpec, temperature: float, fmt: str) -> str | None:
+    import asyncio
+
+    llm = _llm(temperature)
+    # Reading the code index runs git; keep it off the event loop
+    messages = await asyncio.to_thread(_patch_messages, repo_path, ticket, EDIT_SYSTEM if fmt == "edits" else PATCH_SYSTEM)
+    stream = _PatchStream(repo_path, fmt)
+    with span("llm.patch", kind="llm", format=fmt, stream=True) as s:
+        resp = await llm.ainvoke_streaming(messages, stream.afeed)
+        try:
+            if not stream.malformed:
+                return stream.patch(s)
+            s["entries"] = stream.entries
+            answer = await aresolve_structured(llm, messages, resp.content, _ANSWER_SCHEMAS[fmt], s, allow_truncated=False)
+            return _patch_from(repo_path, answer)
+        except (EditError, StructuredOutputError) as e:
+            _fallback(fmt, s, e)
+    return None
+
+
+def _request_patch(repo_path: str, ticket: TicketSpec, temperature: float, fmt: str) -> str | None:
+    llm = _llm(temperature)
+    messages = _patch_messages(repo_path, ticket, EDIT_SYSTEM if fmt == "edits" else PATCH_SYSTEM)
+    with span("llm.patch", kind="llm", format=fmt) as s:
+        try:
+            answer = invoke_structured(llm, messages, _ANSWER_SCHEMAS[fmt], s, allow_truncated=False)
+            return _patch_from(repo_path, answer)
+        except (EditError, StructuredOutputError) as e:
+            _fallback(fmt, s, e)
+    return None
+
+
+async def _arequest_patch(repo_path: str, ticket: TicketSpec, temperature: float, fmt: str) -> str | None:
+    import asyncio
+
+    llm = _llm(temperature)
+    # Reading the code index runs git; keep it off the event loop
+    messages = await asyncio.to_thread(_patch_messages, repo_path, ticket, EDIT_SYSTEM if fmt == "edits" else PATCH_SYSTEM)
+    with span("llm.patch", kind="llm", format=fmt) as s:
+        try:
+            answer = await ainvoke_structured(llm, messages, _ANSWER_SCHEMAS[fmt], s, allow_truncated=False)
+            return _patch_from(repo_path, answer)
+        except (EditError, StructuredOutputError) as e:
+            _fallback(fmt, s, e)
+    return None
+
+
+def generate_patch(repo_path: str, ticket: TicketSpec, temperature: float = 0) -> str:
+    """Ask for the change and return it as a unified diff.
+
+    In the edit format the model only writes the changed snippets; an answer
+    whose edits don't apply falls back to one full-file request. When
+    streaming (see stream_enabled()) each file is diffed and scanned as soon
+    as the model has written it. Malformed answers are repaired or re-asked
+    in part (see llm.structured).
+    """
+    request = _stream_patch if stream_enabled() else _request_patch
+    if patch_format() == "edits":
+        patch = request(repo_path, ticket, temperature, "edits")
+        if patch is not None:
+            return patch
+    return request(repo_path, ticket, temperature, "full")
+
+
+async def agenerate_patch(repo_path: str, ticket: TicketSpec, temperature: float = 0) -> str:
+    """Async variant of generate_patch()."""
+    request = _astream_patch if stream_enabled() else _arequest_patch
+    if patch_format() == "edits":
+        patch = await request(repo_path, ticket, temperature, "edits")
+        if patch is not None:
+            return patch
+    return await request(repo_path, ticket, temperature, "full")
 
-    ticket_text = (
-        f"TITLE: {ticket.title}\n"
-        f"PROBLEM: {ticket.problem_statement}\n"
-        f"ACCEPTANCE: {ticket.acceptance_criteria}\n"
-        f"CONSTRAINTS: {ticket.constraints}\n"
-        f"OUT_OF_SCOPE: {ticket.out_of_scope}\n"
-    )
 
-    user_msg = f"{ticket_text}\n\nREPO_FILES:\n{files}\n\nCONTEXT:\n{ctx}\n\nReturn JSON with modified files."
-    resp = llm.invoke([("system", PATCH_SYSTEM), ("user", user_msg)])
-    content = _strip_code_fences(resp.content)
-
-    data = json.loads(content)
-
-    # Generate unified diffs using git diff --no-index for each file
-    all_diffs = []
-    with tempfile.TemporaryDirectory() as tmpdir:
-        for file_mod in data["files"]:
-            file_path = file_mod["path"]
-            file_content = file_mod["content"]
-
-            temp_file = Path(tmpdir) / "new"
-            temp_file.write_text(file_content, encoding="utf-8")
-
-            orig_file = Path(repo_path) / file_path
-
-            result = subprocess.run(
-                ["git", "diff", "--no-index", str(orig_file), str(temp_file)],
-                capture_output=True,
-                text=True,
-            )
-
-            if result.stdout:
-                diff_lines = result.stdout.split("\n")
-                fixed = []
-                for line in diff_lines:
-                    if line.startswith("diff --git"):
-                        fixed.append(f"diff --git a/{file_path} b/{file_path}")
-                    elif line.startswith("--- "):
-                        fixed.append(f"--- a/{file_path}")
-                    elif line.startswith("+++ "):
-                        fixed.append(f"+++ b/{file_path}")
-                    else:
-                        fixed.append(line)
-                all_diffs.append("\n".join(fixed))
-
-    return "\n".join(all_diffs) if all_diffs else "No changes detected"
+def _candidate_temperatures(n: int) -> list[float]:
+    return [0] + [CANDIDATE_TEMPERATURE] * (n - 1)
+
+
+def _unique_candidates(patches: list[str]) -> list[str]:
+    # Identical samples would only re-run the same tests; keep the first of each.
+    seen = []
+    for p in patches:
+        if p not in seen:
+            seen.append(p)
+    return seen
+
+
+def generate_patch_candidates(repo_path: str, ticket: TicketSpec, n: int) -> list[str]:
+    """Speculatively generate up to n distinct patches with concurrent LLM calls.
+
+    The first candidate is the greedy (temperature 0) patch, so n=1 behaves
+    exactly like generate_patch().
+    """
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        # Each call runs in a copy of this context so its spans land on the node's trace.
+        futures = [
+            pool.submit(contextvars.copy_context().run, generate_patch, repo_path, ticket, t)
+            for t in _candidate_temperatures(n)
+        ]
+        return _unique_candidates([f.result() for f in futures])
+
+
+async def agenerate_patch_candidates(repo_path: str, ticket: TicketSpec, n: int) -> list[str]:
+    """Async variant of generate_patch_candidates()."""
+    import asyncio
+
+    patches = await asyncio.gather(*(
+        agenerate_patch(repo_path, ticket, t) for t in _candidate_temperatures(n)
+    ))
+    return _unique_candidates(list(patches))
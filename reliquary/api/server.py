@@ -1,10 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 import os
 
 from reliquary.memory.store import query_runs, get_stats
-from reliquary.human.interaction_handler import process_info_provision, process_approval
+from reliquary.human.interaction_handler import NotAwaitingApproval, process_info_provision, process_approval
+from reliquary.graph.workflow import resume_run, RUNS_DIR
+from reliquary.tools.exec_tools import live_command
+from reliquary.llm.client import client_stats
+from reliquary.llm.scheduler import scheduler_stats
 
 app = FastAPI(title="Reliquary of Truth API")
 
@@ -41,6 +45,24 @@ def list_runs(
     }
 
 
+def _live_run_dir(work_item_id: str) -> Optional[str]:
+    # Every work item records into runs/{work_item_id}/, indexed or not.
+    run_dir = os.path.join(RUNS_DIR, work_item_id)
+    return run_dir if os.path.isdir(run_dir) else None
+
+
+def _run_dir(work_item_id: str) -> str:
+    """Resolve a work item's run directory (indexed runs first, then in-flight ones) or 404."""
+    runs = query_runs(limit=1000)
+    run = next((r for r in runs if r.work_item_id == work_item_id), None)
+    run_dir = run.run_dir if run else _live_run_dir(work_item_id)
+
+    if not run_dir:
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    return run_dir
+
+
 @app.get("/runs/{work_item_id}")
 def get_run(work_item_id: str):
     """Get details for a specific run."""
@@ -56,13 +78,8 @@ def get_run(work_item_id: str):
 @app.get("/runs/{work_item_id}/evidence")
 def get_evidence(work_item_id: str):
     """Get evidence for a specific run."""
-    runs = query_runs(limit=1000)
-    run = next((r for r in runs if r.work_item_id == work_item_id), None)
-
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
-
-    evidence_file = os.path.join(run.run_dir, "evidence.json")
+    run_dir = _run_dir(work_item_id)
+    evidence_file = os.path.join(run_dir, "evidence.json")
     if not os.path.exists(evidence_file):
         raise HTTPException(status_code=404, detail="Evidence not found")
 
@@ -74,13 +91,8 @@ def get_evidence(work_item_id: str):
 @app.get("/runs/{work_item_id}/decision_log")
 def get_decision_log(work_item_id: str):
     """Get decision log for a specific run."""
-    runs = query_runs(limit=1000)
-    run = next((r for r in runs if r.work_item_id == work_item_id), None)
-
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
-
-    log_file = os.path.join(run.run_dir, "decision_log.json")
+    run_dir = _run_dir(work_item_id)
+    log_file = os.path.join(run_dir, "decision_log.json")
     if not os.path.exists(log_file):
         raise HTTPException(status_code=404, detail="Decision log not found")
 
@@ -89,30 +101,48 @@ def get_decision_log(work_item_id: str):
         return json.load(f)
 
 
-@app.post("/runs/{work_item_id}/provide_info")
-def provide_info(work_item_id: str, answer: str):
-    """Provide information for a run awaiting human input."""
+@app.get("/runs/{work_item_id}/live")
+def get_live_output(work_item_id: str, lines: int = 50):
+    """Tail of the run's most recent command output, readable while it is still running."""
+    run_dir = _live_run_dir(work_item_id)
+    live = live_command(run_dir, lines=lines) if run_dir else None
+    if not live:
+        raise HTTPException(status_code=404, detail="No command output yet")
+    return live
+
+
+def _paused_run_dir(work_item_id: str) -> Optional[str]:
+    # Paused runs usually have no run summary yet; the checkpoint is the source of truth.
     runs = query_runs(limit=1000)
     run = next((r for r in runs if r.work_item_id == work_item_id), None)
+    return run.run_dir if run else _live_run_dir(work_item_id)
 
-    if not run:
+
+@app.post("/runs/{work_item_id}/provide_info")
+def provide_info(work_item_id: str, answer: str, background_tasks: BackgroundTasks):
+    """Provide information for a run awaiting human input, then continue it from planning."""
+    try:
+        state = process_info_provision(work_item_id, answer, _paused_run_dir(work_item_id))
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Run not found")
 
-    state = process_info_provision(work_item_id, answer, run.run_dir)
-    return {"status": "success", "new_status": state.status}
+    background_tasks.add_task(resume_run, work_item_id)
+    return {"status": "success", "new_status": state.status, "resumed": True}
 
 
 @app.post("/runs/{work_item_id}/approve")
-def approve_run(work_item_id: str, approved: bool, reason: str = ""):
-    """Approve or reject a run."""
-    runs = query_runs(limit=1000)
-    run = next((r for r in runs if r.work_item_id == work_item_id), None)
-
-    if not run:
+def approve_run(work_item_id: str, approved: bool, background_tasks: BackgroundTasks, reason: str = ""):
+    """Approve or reject a run held by the policy gate after its tests passed; an approved run continues to delivery."""
+    try:
+        state = process_approval(work_item_id, approved, reason, _paused_run_dir(work_item_id))
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Run not found")
+    except NotAwaitingApproval as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-    state = process_approval(work_item_id, approved, reason, run.run_dir)
-    return {"status": "success", "new_status": state.status}
+    if approved:
+        background_tasks.add_task(resume_run, work_item_id)
+    return {"status": "success", "new_status": state.status, "resumed": approved}
 
 
 @app.get("/stats")
@@ -121,6 +151,12 @@ def api_stats():
     return get_stats()
 
 
+@app.get("/llm/stats")
+def llm_stats():
+    """LLM call latency per model, and the scheduler's queue depth, wait times and throttling."""
+    return {"models": client_stats(), "scheduler": scheduler_stats()}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
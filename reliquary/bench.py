@@ -0,0 +1,477 @@
+"""
+End-to-end pipeline benchmark: the framework's own overhead, without model latency.
+
+Drives build_graph() against generated sample repos with a scripted,
+deterministic stand-in chat model, so every measured millisecond is state
+validation, run-dir and audit writes, gates, git worktrees, pytest, zipping
+and SQLite. Each scenario exercises one path through the workflow:
+
+  success  - first patch passes its tests
+  retry    - first patch fails its tests, the second passes
+  help     - the owner asks a specialist first, then delivers
+  blocked  - every patch fails until the attempt budget runs out
+
+A micro-benchmark compares the in-process diff builder that turns model
+answers into patches with the former path (a temp file and a
+`git diff --no-index` subprocess per file).
+
+Runs happen in a throwaway working directory (runs/, memory.db and caches
+included), so your own history is untouched. Results are JSON so releases can
+be compared:
+
+    python -m reliquary bench --runs 10 --output bench.json
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from reliquary.agents.helpers import HELPER_SYSTEM
+from reliquary.agents.owner import ASSESS_SYSTEM, EDIT_SYSTEM, HELP_DECIDER_SYSTEM, PATCH_SYSTEM, PLAN_SYSTEM
+from reliquary.llm.client import set_chat_model_factory
+from reliquary.tools.edit_tools import files_to_diff
+from reliquary.tools.git_tools import close_worktree_pool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Bump when the scenarios or the measured quantities change, so results stay comparable.
+BENCH_VERSION = 2
+
+TASK = "Add a health() function to app.py that returns 'ok', with a test."
+
+# name -> (script, expected final status)
+SCENARIOS: Dict[str, tuple] = {
+    "success": ({"ask_help": False, "bad_patches": 0}, "DELIVERED"),
+    "retry": ({"ask_help": False, "bad_patches": 1}, "DELIVERED"),
+    "help": ({"ask_help": True, "bad_patches": 0}, "DELIVERED"),
+    "blocked": ({"ask_help": False, "bad_patches": 1_000}, "BLOCKED"),
+}
+
+_APP = "def add(a, b):\n    return a + b\n"
+_APP_TEST = "from app import add\n\n\ndef test_add():\n    assert add(2, 3) == 5\n"
+
+
+def _patched_app(health: str) -> str:
+    return _APP + f"\n\ndef health():\n    return {health!r}\n"
+
+
+_PLAN = ["Add health() to app.py", "Add a test for it", "Run the tests"]
+
+_PATCHED_TEST = _APP_TEST + "\n\ndef test_health():\n    from app import health\n    assert health() == 'ok'\n"
+
+
+class _Script:
+    """What the stand-in model answers in one scenario; reset before every run."""
+
+    def __init__(self, ask_help: bool, bad_patches: int):
+        self.ask_help = ask_help
+        self.bad_patches = bad_patches
+        self.reset()
+
+    def reset(self) -> None:
+        self.help_decisions = 0
+        self.patches = 0
+        self.calls = 0
+
+    def _help_decision(self) -> Dict[str, Any]:
+        self.help_decisions += 1
+        if self.ask_help and self.help_decisions == 1:
+            return {"need_help": True, "question": "Where do module-level helpers live?", "why": "No docs in the repo"}
+        return {"need_help": False}
+
+    def respond(self, messages: Any) -> str:
+        self.calls += 1
+        if isinstance(messages, str):
+            system = ""
+        else:
+            system = messages[0][1]
+
+        if system == PLAN_SYSTEM:
+            return json.dumps({"plan": _PLAN})
+        if system == HELP_DECIDER_SYSTEM:
+            return json.dumps(self._help_decision())
+        if system == ASSESS_SYSTEM:
+            return json.dumps({"plan": _PLAN, **self._help_decision()})
+        if system == HELPER_SYSTEM:
+            return json.dumps({"advice": ["Put it in app.py next to add()"], "checks": ["pytest -q"],
+                               "risks": [], "needs_more_info": [], "confidence": "high"})
+        if system in (PATCH_SYSTEM, EDIT_SYSTEM):
+            self.patches += 1
+            health = "down" if self.patches <= self.bad_patches else "ok"
+            if system == EDIT_SYSTEM:
+                return json.dumps({"edits": [
+                    {"path": "app.py", "search": _APP, "replace": _patched_app(health)},
+                    {"path": "tests/test_app.py", "search": _APP_TEST, "replace": _PATCHED_TEST},
+                ]})
+            return json.dumps({"files": [
+                {"path": "app.py", "content": _patched_app(health)},
+                {"path": "tests/test_app.py", "content": _PATCHED_TEST},
+            ]})
+        # Intake
+        return json.dumps({
+            "ticket": {
+                "title": "Add health()",
+                "problem_statement": TASK,
+                "acceptance_criteria": ["health() returns 'ok'", "A test covers health()"],
+                "risk_level": "low",
+            },
+            "needs_info": False,
+            "clarification_questions": [],
+        })
+
+
+# Size of the pieces ScriptedChatModel streams answers in (a few tokens each)
+STREAM_CHUNK_CHARS = 16
+
+
+class ScriptedChatModel:
+    """Deterministic stand-in for ChatOpenAI, answering each agent's prompt from a _Script."""
+
+    def __init__(self, script: _Script, **params: Any):
+        self.script = script
+        self.params = params
+
+    def invoke(self, messages: Any, **kwargs: Any) -> AIMessage:
+        return AIMessage(content=self.script.respond(messages))
+
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> AIMessage:
+        return self.invoke(messages, **kwargs)
+
+    def stream(self, messages: Any, **kwargs: Any) -> Iterator[AIMessageChunk]:
+        content = self.script.respond(messages)
+        for i in range(0, len(content), STREAM_CHUNK_CHARS):
+            yield AIMessageChunk(content=content[i:i + STREAM_CHUNK_CHARS])
+
+    async def astream(self, messages: Any, **kwargs: Any) -> AsyncIterator[AIMessageChunk]:
+        for chunk in self.stream(messages, **kwargs):
+            yield chunk
+
+
+def _git(repo: str, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+        cwd=repo, check=True, capture_output=True,
+    )
+
+
+def make_sample_repo(root: str, modules: int = 20) -> str:
+    """
+    Generate a small git repo with a test suite and a .venv pointing at this interpreter.
+
+    Args:
+        root: Directory to create the repo in
+        modules: Extra package modules, each importing the previous one and with its own test file
+
+    Returns:
+        Path to the repo
+    """
+    os.makedirs(os.path.join(root, "tests"), exist_ok=True)
+    os.makedirs(os.path.join(root, "pkg"), exist_ok=True)
+    files = {
+        "app.py": _APP,
+        "tests/test_app.py": _APP_TEST,
+        # Puts the repo root on sys.path for the tests
+        "conftest.py": "",
+        ".gitignore": ".venv/\n__pycache__/\n",
+        "pkg/__init__.py": "",
+    }
+    for i in range(modules):
+        dep = f"from pkg.mod_{i - 1} import f_{i - 1}\n\n\n" if i else ""
+        call = f"f_{i - 1}(x) + 1" if i else "x"
+        files[f"pkg/mod_{i}.py"] = f"{dep}def f_{i}(x):\n    return {call}\n"
+        files[f"tests/test_mod_{i}.py"] = f"from pkg.mod_{i} import f_{i}\n\n\ndef test_f_{i}():\n    assert f_{i}(0) == {i}\n"
+    for rel, content in files.items():
+        with open(os.path.join(root, rel), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    # Verification runs pytest under the repo's .venv interpreter.
+    bindir = os.path.join(root, ".venv", "Scripts" if os.name == "nt" else "bin")
+    os.makedirs(bindir, exist_ok=True)
+    try:
+        os.symlink(sys.executable, os.path.join(bindir, "python.exe" if os.name == "nt" else "python"))
+    except OSError:
+        # No symlink privilege (Windows): the spawn fails and the run reports it.
+        pass
+
+    _git(root, "init", "-q")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "Initial commit")
+    return root
+
+
+@contextmanager
+def _isolated(workdir: str) -> Iterator[None]:
+    # runs/, memory.db and caches live in the throwaway workdir; the LLM cache stays off.
+    overrides = {
+        "RELIQUARY_DB_PATH": os.path.join(workdir, "memory.db"),
+        "RELIQUARY_CACHE_DIR": os.path.join(workdir, ".reliquary_cache"),
+        "RELIQUARY_LLM_CACHE": "off",
+    }
+    saved = {k: os.environ.get(k) for k in overrides}
+    cwd = os.getcwd()
+    os.environ.update(overrides)
+    os.chdir(workdir)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 3)
+
+
+def _latency(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "p50_ms": _percentile(ordered, 50),
+        "p95_ms": _percentile(ordered, 95),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+    }
+
+
+def _stage_timings(spans: List[Dict[str, Any]], runs: int) -> List[Dict[str, Any]]:
+    """Per (kind, name) latency over all timed runs, slowest total first."""
+    groups: Dict[tuple, List[float]] = {}
+    for s in spans:
+        groups.setdefault((s["kind"], s["name"]), []).append(s["duration_ms"])
+    rows = [
+        {"kind": kind, "name": name, "count": len(values), **_latency(values),
+         "ms_per_run": round(sum(values) / runs, 3)}
+        for (kind, name), values in groups.items()
+    ]
+    return sorted(rows, key=lambda r: (r["kind"] != "node", -r["ms_per_run"]))
+
+
+def run_scenario(name: str, runs: int = 5, warmup: int = 1, modules: int = 20) -> Dict[str, Any]:
+    """
+    Benchmark one scenario in its own throwaway directory.
+
+    Args:
+        name: Key of SCENARIOS
+        runs: Timed runs
+        warmup: Untimed runs first (starts the pytest worker, fills the worktree pool)
+        modules: Size of the generated sample repo
+
+    Returns:
+        Results for the scenario (statuses, run latency, runs/s, per-stage timings, memory peaks)
+    """
+    from reliquary.graph.workflow import RUNS_DIR, build_graph, new_state
+    from reliquary.storage.run_store import work_item_dir
+    from reliquary.storage.trace_store import read_trace
+
+    script_args, expected = SCENARIOS[name]
+    script = _Script(**script_args)
+    workdir = tempfile.mkdtemp(prefix=f"reliquary_bench_{name}_")
+    repo = os.path.join(workdir, "repo")
+    set_chat_model_factory(lambda **params: ScriptedChatModel(script, **params))
+    try:
+        with _isolated(workdir):
+            make_sample_repo(repo, modules=modules)
+            graph = build_graph()
+
+            def one_run() -> Dict[str, Any]:
+                script.reset()
+                state = new_state(repo, TASK)
+                started = time.perf_counter()
+                final = graph.invoke(state)
+                return {
+                    "status": final["status"],
+                    "ms": (time.perf_counter() - started) * 1000,
+                    "llm_calls": script.calls,
+                    "spans": read_trace(work_item_dir(RUNS_DIR, state.work_item_id)),
+                }
+
+            for _ in range(warmup):
+                one_run()
+
+            timed = []
+            started = time.perf_counter()
+            for _ in range(runs):
+                timed.append(one_run())
+            wall_s = time.perf_counter() - started
+
+            # One extra, untimed run under tracemalloc: tracing slows everything down.
+            tracemalloc.start()
+            try:
+                one_run()
+                _, heap_peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    finally:
+        set_chat_model_factory(None)
+        close_worktree_pool(repo)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    statuses: Dict[str, int] = {}
+    for r in timed:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    return {
+        "name": name,
+        "expected_status": expected,
+        "ok": statuses == {expected: runs},
+        "statuses": statuses,
+        "runs": runs,
+        "wall_s": round(wall_s, 3),
+        "runs_per_s": round(runs / wall_s, 3) if wall_s else None,
+        "run": _latency([r["ms"] for r in timed]),
+        "llm_calls_per_run": timed[0]["llm_calls"] if timed else 0,
+        "heap_peak_mb": round(heap_peak / (1024 * 1024), 2),
+        "stages": _stage_timings([s for r in timed for s in r["spans"]], runs),
+    }
+
+
+def _git_diff_no_index(repo_path: str, files: List[Dict[str, str]]) -> str:
+    """The former full-file path, kept as the baseline: one git subprocess per file, headers rewritten."""
+    diffs = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        new = os.path.join(tmpdir, "new")
+        for f in files:
+            with open(new, "w", encoding="utf-8") as out:
+                out.write(f["content"])
+            result = subprocess.run(
+                ["git", "diff", "--no-index", os.path.join(repo_path, f["path"]), new],
+                capture_output=True, text=True,
+            )
+            if result.stdout:
+                header = {"diff --git": f"diff --git a/{f['path']} b/{f['path']}",
+                          "--- ": f"--- a/{f['path']}", "+++ ": f"+++ b/{f['path']}"}
+                diffs.append("\n".join(
+                    next((v for k, v in header.items() if line.startswith(k)), line)
+                    for line in result.stdout.split("\n")
+                ))
+    return "\n".join(diffs)
+
+
+def _applies(repo: str, patch: str, files: List[Dict[str, str]]) -> bool:
+    """Whether `git apply` takes the patch and leaves exactly the new contents."""
+    result = subprocess.run(["git", "apply", "-"], cwd=repo, input=patch, text=True, capture_output=True)
+    try:
+        if result.returncode != 0:
+            return False
+        for f in files:
+            with open(os.path.join(repo, f["path"]), encoding="utf-8", newline="") as fh:
+                if fh.read() != f["content"]:
+                    return False
+        return True
+    finally:
+        _git(repo, "checkout", "--", ".")
+
+
+def run_diff_bench(files: int = 20, lines: int = 200, runs: int = 20) -> Dict[str, Any]:
+    """
+    Time building a full-file patch in process against the subprocess baseline.
+
+    Args:
+        files: Files changed by the patch
+        lines: Lines per file (every 10th line changes)
+        runs: Timed builds per path
+
+    Returns:
+        {files, lines, runs, in_process, subprocess, speedup, applies}
+    """
+    workdir = tempfile.mkdtemp(prefix="reliquary_bench_diff_")
+    try:
+        repo = os.path.join(workdir, "repo")
+        os.makedirs(repo)
+        answer = []
+        for i in range(files):
+            path = f"mod_{i}.py"
+            old = [f"value_{n} = {n}\n" for n in range(lines)]
+            with open(os.path.join(repo, path), "w", encoding="utf-8") as f:
+                f.write("".join(old))
+            new = [f"value_{n} = {n * 2}\n" if n % 10 == 0 else line for n, line in enumerate(old)]
+            answer.append({"path": path, "content": "".join(new)})
+        _git(repo, "init", "-q")
+        _git(repo, "add", "-A")
+        _git(repo, "commit", "-qm", "init")
+
+        timings: Dict[str, List[float]] = {"in_process": [], "subprocess": []}
+        builders = {"in_process": files_to_diff, "subprocess": _git_diff_no_index}
+        for _ in range(runs):
+            for name, build in builders.items():
+                started = time.perf_counter()
+                build(repo, answer)
+                timings[name].append((time.perf_counter() - started) * 1000)
+
+        in_process, baseline = _latency(timings["in_process"]), _latency(timings["subprocess"])
+        return {
+            "files": files,
+            "lines": lines,
+            "runs": runs,
+            "in_process": in_process,
+            "subprocess": baseline,
+            "speedup": round(baseline["p50_ms"] / in_process["p50_ms"], 1) if in_process["p50_ms"] else None,
+            "applies": _applies(repo, files_to_diff(repo, answer), answer),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def run_bench(scenarios: Optional[List[str]] = None, runs: int = 5, warmup: int = 1, modules: int = 20,
+              on_scenario=None, diff_files: int = 20) -> Dict[str, Any]:
+    """
+    Run the benchmark suite.
+
+    Args:
+        scenarios: SCENARIOS keys to run (default all)
+        runs: Timed runs per scenario
+        warmup: Untimed runs per scenario first
+        modules: Size of each generated sample repo
+        on_scenario: Called with each scenario's results as it finishes
+        diff_files: Files in the diff micro-benchmark (0 skips it)
+
+    Returns:
+        {version, started_at, environment, config, scenarios: [...], diff, peak_rss_mb}
+    """
+    names = scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    report = {
+        "version": BENCH_VERSION,
+        "started_at": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {"runs": runs, "warmup": warmup, "modules": modules, "diff_files": diff_files},
+        "scenarios": [],
+    }
+    for name in names:
+        result = run_scenario(name, runs=runs, warmup=warmup, modules=modules)
+        report["scenarios"].append(result)
+        if on_scenario:
+            on_scenario(result)
+    report["diff"] = run_diff_bench(files=diff_files) if diff_files else None
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
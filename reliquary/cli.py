@@ -1,16 +1,30 @@
+import asyncio
 import os
+from datetime import datetime
 from pathlib import Path
 import typer
 from dotenv import load_dotenv
 from rich import print
 
-from reliquary.graph.workflow import build_graph, new_state
-from reliquary.storage.run_store import write_json
+from reliquary.graph.workflow import build_graph, build_async_graph, new_state
+from reliquary.storage.run_store import work_item_dir, write_json
 from reliquary.schemas.state import WorkItemState
 from reliquary.schemas.delivery import DeliveryConfig
+from reliquary.storage.checkpoint_store import open_checkpointer, open_async_checkpointer, thread_config
+from reliquary.llm.cache import MODES
 
 app = typer.Typer(add_completion=False)
 
+
+def _use_llm_cache(mode: str):
+    """Apply --llm-cache for this process (every LLM call reads RELIQUARY_LLM_CACHE)."""
+    if mode is None:
+        return
+    if mode not in MODES:
+        raise typer.BadParameter(f"--llm-cache must be one of {', '.join(MODES)}")
+    os.environ["RELIQUARY_LLM_CACHE"] = mode
+
+
 @app.command()
 def run(
     repo: str = typer.Option(..., help="Path to target repo (e.g., ..\\reliquary-demo-repo)"),
@@ -18,14 +32,23 @@ def run(
     delivery_mode: str = typer.Option("local_patch", help="Delivery mode: local_patch, github_pr, direct_push"),
     target_branch: str = typer.Option("main", help="Target branch for delivery"),
     github_token: str = typer.Option(None, help="GitHub token for PR creation (or set GITHUB_TOKEN env var)"),
+    async_mode: bool = typer.Option(False, "--async", help="Run the async graph (non-blocking LLM/git/pytest calls)"),
+    checkpoint: bool = typer.Option(True, help="Checkpoint after every node so the run can be resumed"),
+    candidates: int = typer.Option(1, help="Speculative patch candidates per attempt, verified in parallel worktrees"),
+    tests: str = typer.Option("affected_then_full", help="Test scope per attempt: affected_then_full, affected, full"),
+    llm_cache: str = typer.Option(None, "--llm-cache", help="LLM response cache: record, replay (no network) or off (default: RELIQUARY_LLM_CACHE)"),
 ):
     load_dotenv()
+    _use_llm_cache(llm_cache)
 
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and os.getenv("RELIQUARY_LLM_CACHE") != "replay":
         raise typer.BadParameter("OPENAI_API_KEY missing. Put it in reliquary-engine/.env")
 
     repo_path = str(Path(repo).resolve())
 
+    if tests not in ("affected_then_full", "affected", "full"):
+        raise typer.BadParameter("--tests must be affected_then_full, affected or full")
+
     # Setup delivery config
     token = github_token or os.getenv("GITHUB_TOKEN")
     delivery_config = DeliveryConfig(
@@ -36,11 +59,28 @@ def run(
 
     state = new_state(repo_path=repo_path, task_raw=task)
     state.delivery_config = delivery_config
+    state.speculative_candidates = max(1, candidates)
+    state.test_selection = tests
+
+    if async_mode:
+        final_dict = asyncio.run(_ainvoke(state, checkpoint))
+    elif checkpoint:
+        with open_checkpointer() as saver:
+            final_dict = build_graph(checkpointer=saver).invoke(state, thread_config(state.work_item_id))
+    else:
+        final_dict = build_graph().invoke(state)
+
+    _print_final(WorkItemState.model_validate(final_dict))
 
-    graph = build_graph()
-    final_dict = graph.invoke(state)
-    final = WorkItemState.model_validate(final_dict)
 
+async def _ainvoke(state: WorkItemState, checkpoint: bool) -> dict:
+    if not checkpoint:
+        return await build_async_graph().ainvoke(state)
+    async with open_async_checkpointer() as saver:
+        return await build_async_graph(checkpointer=saver).ainvoke(state, thread_config(state.work_item_id))
+
+
+def _print_final(final: WorkItemState):
     print("\n[bold cyan]Reliquary of Truth — Run Complete[/bold cyan]")
     print(f"[bold]Work Item:[/bold] {final.work_item_id}")
     print(f"[bold]Status:[/bold] {final.status}")
@@ -77,8 +117,106 @@ def run(
             if final.delivery_result.error_message:
                 print(f"- Error: {final.delivery_result.error_message}")
 
-    Path("runs").mkdir(exist_ok=True)
-    write_json(f"runs\\final_state_{final.work_item_id}.json", final.model_dump())
+    write_json(os.path.join(work_item_dir("runs", final.work_item_id), "final_state.json"), final.model_dump())
+
+
+@app.command()
+def resume(
+    work_item_id: str = typer.Option(..., help="Work item to continue from its last checkpoint"),
+    answer: str = typer.Option(None, help="Answer to the run's clarification questions (NEEDS_INFO runs)"),
+    llm_cache: str = typer.Option(None, "--llm-cache", help="LLM response cache: record, replay (no network) or off (default: RELIQUARY_LLM_CACHE)"),
+):
+    """Resume a paused or interrupted run from its last completed node."""
+    from reliquary.graph.workflow import resume_run
+    from reliquary.human.interaction_handler import process_info_provision
+
+    load_dotenv()
+    _use_llm_cache(llm_cache)
+
+    if answer:
+        try:
+            process_info_provision(work_item_id, answer)
+        except FileNotFoundError as e:
+            raise typer.BadParameter(str(e))
+
+    final = resume_run(work_item_id)
+    if final is None:
+        raise typer.BadParameter(f"No checkpoint found for work item {work_item_id}")
+
+    _print_final(final)
+
+
+@app.command()
+def batch(
+    file: str = typer.Option(..., help="JSONL file with one task per line (task or title/body, optional repo/id)"),
+    repo: str = typer.Option(None, help="Default target repo for lines without a 'repo' field"),
+    workers: int = typer.Option(4, help="Maximum number of work items run concurrently"),
+    delivery_mode: str = typer.Option("local_patch", help="Delivery mode: local_patch, github_pr, direct_push"),
+    target_branch: str = typer.Option("main", help="Target branch for delivery"),
+    github_token: str = typer.Option(None, help="GitHub token for PR creation (or set GITHUB_TOKEN env var)"),
+    async_mode: bool = typer.Option(False, "--async", help="Drive all items from one event loop; --workers bounds in-flight items"),
+    checkpoint: bool = typer.Option(True, help="Checkpoint every item so interrupted items can be resumed"),
+    llm_cache: str = typer.Option(None, "--llm-cache", help="LLM response cache: record, replay (no network) or off (default: RELIQUARY_LLM_CACHE)"),
+):
+    """Run many tasks from a JSONL queue concurrently."""
+    from reliquary.graph.batch import load_batch_items, run_batch, arun_batch
+
+    load_dotenv()
+    _use_llm_cache(llm_cache)
+
+    if not os.getenv("OPENAI_API_KEY") and os.getenv("RELIQUARY_LLM_CACHE") != "replay":
+        raise typer.BadParameter("OPENAI_API_KEY missing. Put it in reliquary-engine/.env")
+
+    try:
+        items = load_batch_items(file, default_repo=repo)
+    except (OSError, ValueError) as e:
+        raise typer.BadParameter(str(e))
+
+    if not items:
+        print("[yellow]No tasks found in batch file[/yellow]")
+        return
+
+    token = github_token or os.getenv("GITHUB_TOKEN")
+    delivery_config = DeliveryConfig(
+        mode=delivery_mode,
+        target_branch=target_branch,
+        github_token=token
+    )
+
+    print(f"\n[bold cyan]Running {len(items)} tasks with {workers} workers[/bold cyan]\n")
+
+    def report(result):
+        status_color = "green" if result.status == "DELIVERED" else "red"
+        print(f"[{status_color}]{result.status}[/{status_color}] {result.item_id} "
+              f"({result.work_item_id}) in {result.duration_s:.1f}s")
+        if result.error:
+            print(f"  {result.error}")
+
+    if async_mode:
+        batch_report = asyncio.run(arun_batch(items, concurrency=workers, delivery_config=delivery_config,
+                                              on_result=report, checkpoint=checkpoint))
+    else:
+        batch_report = run_batch(items, workers=workers, delivery_config=delivery_config,
+                                 on_result=report, checkpoint=checkpoint)
+
+    print("\n[bold cyan]Reliquary of Truth — Batch Complete[/bold cyan]")
+    print(f"Items: {batch_report.total_items}")
+    for status_name, count in batch_report.status_counts.items():
+        print(f"  {status_name}: {count}")
+    print(f"Wall clock: {batch_report.wall_clock_s:.1f}s")
+    print(f"Throughput: {batch_report.items_per_minute:.2f} items/min")
+    sched = batch_report.llm_scheduler
+    if sched:
+        print(f"LLM queue: {sched['throttled']} throttled, {sched['rate_limited']} rate-limited (429), "
+              f"{sched['retries']} retries")
+        for p in sched["by_priority"]:
+            if p["calls"]:
+                print(f"  {p['priority']:<12} {p['calls']:>6} calls | wait p50 {p['p50_wait_ms']:.1f} ms "
+                      f"| p95 {p['p95_wait_ms']:.1f} ms | max {p['max_wait_ms']:.1f} ms")
+
+    report_path = Path("runs") / f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    write_json(str(report_path), batch_report.model_dump())
+    print(f"Report: {report_path}")
 
 
 @app.command()
@@ -125,6 +263,66 @@ def stats():
         for mode, count in stats_data['failure_modes'].items():
             print(f"  {mode}: {count}")
 
+    if stats_data['stage_latency']:
+        print("\n[bold]Stage Latency (ms):[/bold]")
+        print(f"  {'stage':<28} {'count':>6} {'p50':>10} {'p95':>10} {'p99':>10}")
+        for st in stats_data['stage_latency']:
+            label = f"{st['kind']}:{st['name']}"
+            print(f"  {label:<28} {st['count']:>6} {st['p50_ms']:>10.1f} {st['p95_ms']:>10.1f} {st['p99_ms']:>10.1f}")
+
+    usage = stats_data['token_usage']
+    if usage['totals']['calls']:
+        totals = usage['totals']
+        print("\n[bold]LLM Token Usage:[/bold]")
+        print(f"  Calls: {totals['calls']} ({totals['cached_calls']} cached)")
+        print(f"  Tokens: {totals['prompt_tokens']} prompt + {totals['completion_tokens']} completion")
+        print(f"  Cost: ${totals['cost_usd']:.4f}")
+        for group, column in (("by_node", "node"), ("by_stage", "stage"), ("by_model", "model"), ("top_work_items", "work_item_id")):
+            print(f"\n  {column:<28} {'calls':>6} {'prompt':>10} {'completion':>10} {'cost $':>10}")
+            for r in usage[group]:
+                print(f"  {r[column]:<28} {r['calls']:>6} {r['prompt_tokens']:>10} {r['completion_tokens']:>10} {r['cost_usd']:>10.4f}")
+
+
+@app.command()
+def bench(
+    runs: int = typer.Option(5, help="Timed runs per scenario"),
+    warmup: int = typer.Option(1, help="Untimed runs per scenario first (warm pytest worker and worktrees)"),
+    scenarios: str = typer.Option("success,retry,help,blocked", help="Comma-separated scenarios to run"),
+    modules: int = typer.Option(20, help="Extra modules (each with a test file) in the generated sample repos"),
+    diff_files: int = typer.Option(20, help="Files in the in-process vs git subprocess diff benchmark (0 skips it)"),
+    output: str = typer.Option(None, help="Results JSON (default runs/bench_<timestamp>.json)"),
+):
+    """Benchmark the pipeline's own overhead with a scripted stand-in LLM."""
+    from reliquary.bench import run_bench
+
+    report_path = Path(output) if output else Path("runs") / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+    def report(result):
+        color = "green" if result["ok"] else "red"
+        print(f"\n[{color}]{result['name']}[/{color}] {result['statuses']} "
+              f"| {result['runs_per_s']:.2f} runs/s | p50 {result['run']['p50_ms']:.1f} ms "
+              f"| p95 {result['run']['p95_ms']:.1f} ms | heap peak {result['heap_peak_mb']:.1f} MB")
+        for st in result["stages"]:
+            if st["kind"] == "node":
+                print(f"  {st['name']:<16} {st['count']:>4}x {st['p50_ms']:>10.1f} ms p50 {st['ms_per_run']:>10.1f} ms/run")
+
+    names = [n.strip() for n in scenarios.split(",") if n.strip()]
+    try:
+        bench_report = run_bench(names, runs=runs, warmup=warmup, modules=modules, on_scenario=report,
+                                 diff_files=diff_files)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    write_json(str(report_path), bench_report)
+    diff = bench_report["diff"]
+    if diff:
+        print(f"\n[bold]diff[/bold] {diff['files']} files: in-process {diff['in_process']['p50_ms']:.2f} ms p50 "
+              f"| git subprocess {diff['subprocess']['p50_ms']:.2f} ms p50 | {diff['speedup']}x "
+              f"| applies: {diff['applies']}")
+    print(f"\nPeak RSS: {bench_report['peak_rss_mb']} MB")
+    print(f"Results: {report_path}")
+
 
 if __name__ == "__main__":
     app()
@@ -6,14 +6,29 @@ import uuid
 
 from reliquary.schemas.state import WorkItemState
 from reliquary.schemas.delivery import DeliveryConfig, DeliveryResult
+from reliquary.storage.run_store import latest_passing_attempt
+
+
+BUNDLE_ROOT_FILES = [
+    "manifest.json",
+    "evidence.json",
+    "decision_log.json",
+    "help_requests.json",
+    "help_responses.json",
+    "audit_events.jsonl",
+    "trace.jsonl",
+]
 
 
 def prepare_proof_bundle(run_dir: str) -> str:
     """
     Creates a ZIP file containing all proof artifacts.
 
+    Bundles the work item's root records plus every attempt's artifacts,
+    keeping paths relative to the run directory.
+
     Args:
-        run_dir: Path to the run directory
+        run_dir: Path to the work item's run directory
 
     Returns:
         Path to the created proof bundle ZIP file
@@ -21,37 +36,33 @@ def prepare_proof_bundle(run_dir: str) -> str:
     bundle_path = os.path.join(run_dir, "proof_bundle.zip")
 
     with zipfile.ZipFile(bundle_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # Add evidence.json
-        evidence_path = os.path.join(run_dir, "evidence.json")
-        if os.path.exists(evidence_path):
-            zipf.write(evidence_path, "evidence.json")
-
-        # Add decision_log.json
-        decision_log_path = os.path.join(run_dir, "decision_log.json")
-        if os.path.exists(decision_log_path):
-            zipf.write(decision_log_path, "decision_log.json")
-
-        # Add help_requests.json
-        help_requests_path = os.path.join(run_dir, "help_requests.json")
-        if os.path.exists(help_requests_path):
-            zipf.write(help_requests_path, "help_requests.json")
-
-        # Add help_responses.json
-        help_responses_path = os.path.join(run_dir, "help_responses.json")
-        if os.path.exists(help_responses_path):
-            zipf.write(help_responses_path, "help_responses.json")
-
-        # Add all test outputs from artifacts directory
-        artifacts_dir = os.path.join(run_dir, "artifacts")
-        if os.path.exists(artifacts_dir):
-            for filename in os.listdir(artifacts_dir):
-                file_path = os.path.join(artifacts_dir, filename)
-                if os.path.isfile(file_path):
-                    zipf.write(file_path, f"artifacts/{filename}")
+        # Add the work item's root records (manifest, evidence, decision log, ...)
+        for filename in BUNDLE_ROOT_FILES:
+            file_path = os.path.join(run_dir, filename)
+            if os.path.exists(file_path):
+                zipf.write(file_path, filename)
+
+        # Add every attempt's snapshot, patch and test outputs
+        attempts_dir = os.path.join(run_dir, "attempts")
+        if os.path.exists(attempts_dir):
+            for root, _, files in os.walk(attempts_dir):
+                for filename in sorted(files):
+                    file_path = os.path.join(root, filename)
+                    zipf.write(file_path, Path(os.path.relpath(file_path, run_dir)).as_posix())
 
     return bundle_path
 
 
+def _delivered_patch_path(run_dir: str) -> str:
+    # The delivered patch is the one from the last attempt whose tests passed
+    attempt = latest_passing_attempt(run_dir)
+    return os.path.join(run_dir, attempt["patch"]) if attempt and attempt.get("patch") else ""
+
+
+def _commit_message(state: WorkItemState) -> str:
+    return f"[Reliquary] {state.ticket.title if state.ticket else state.task_raw[:50]}\n\nWork Item: {state.work_item_id}"
+
+
 def deliver_local_patch(state: WorkItemState, run_dir: str, config: DeliveryConfig) -> DeliveryResult:
     """
     Delivers changes as a local patch file with proof bundle.
@@ -68,10 +79,9 @@ def deliver_local_patch(state: WorkItemState, run_dir: str, config: DeliveryConf
         # Prepare proof bundle
         proof_bundle_path = prepare_proof_bundle(run_dir)
 
-        # Patch file should already exist in artifacts
-        patch_path = os.path.join(run_dir, "artifacts", "change.patch")
+        patch_path = _delivered_patch_path(run_dir)
 
-        if not os.path.exists(patch_path):
+        if not patch_path or not os.path.exists(patch_path):
             return DeliveryResult(
                 delivery_id=str(uuid.uuid4())[:8],
                 mode="local_patch",
@@ -114,7 +124,8 @@ def deliver_github_pr(state: WorkItemState, run_dir: str, config: DeliveryConfig
         DeliveryResult with PR details
     """
     try:
-        from reliquary.tools.github_tools import create_github_pr, upload_proof_gist
+        from reliquary.tools.github_tools import create_github_pr, push_to_branch, upload_proof_gist
+        from reliquary.tools.git_tools import apply_patch
         from reliquary.delivery.pr_builder import create_pr_description
 
         # Prepare proof bundle
@@ -135,6 +146,14 @@ def deliver_github_pr(state: WorkItemState, run_dir: str, config: DeliveryConfig
         # Create branch name from work_item_id
         branch_name = f"reliquary/{state.work_item_id}"
 
+        # Verification ran in a pooled worktree; commit the verified patch on the PR branch
+        apply_patch(state.repo_path, _delivered_patch_path(run_dir))
+        push_to_branch(
+            repo_path=state.repo_path,
+            branch_name=branch_name,
+            commit_message=_commit_message(state)
+        )
+
         pr_data = create_github_pr(
             repo_url=repo_url,
             branch=branch_name,
@@ -178,18 +197,19 @@ def deliver_direct_push(state: WorkItemState, run_dir: str, config: DeliveryConf
     """
     try:
         from reliquary.tools.github_tools import push_to_branch
+        from reliquary.tools.git_tools import apply_patch
 
         # Prepare proof bundle
         proof_bundle_path = prepare_proof_bundle(run_dir)
 
-        # Create commit message
-        commit_message = f"[Reliquary] {state.ticket.title if state.ticket else state.task_raw[:50]}\n\nWork Item: {state.work_item_id}"
+        # Verification ran in a pooled worktree; bring the verified patch into the repo
+        apply_patch(state.repo_path, _delivered_patch_path(run_dir))
 
         # Push to branch
         push_to_branch(
             repo_path=state.repo_path,
             branch_name=config.target_branch,
-            commit_message=commit_message
+            commit_message=_commit_message(state)
         )
 
         return DeliveryResult(
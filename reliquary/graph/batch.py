@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from reliquary.graph.workflow import build_graph, build_async_graph, new_state
+from reliquary.llm.scheduler import llm_scheduling, scheduler_stats
+from reliquary.schemas.batch import BatchItem, BatchItemResult, BatchReport
+from reliquary.schemas.delivery import DeliveryConfig
+from reliquary.schemas.state import WorkItemState
+from reliquary.storage.checkpoint_store import open_checkpointer, open_async_checkpointer, thread_config
+from reliquary.storage.run_store import work_item_dir, write_json
+
+
+def load_batch_items(path: str, default_repo: Optional[str] = None) -> List[BatchItem]:
+    """
+    Load work items from a JSONL queue file.
+
+    Each line is a JSON object. The task text is taken from "task", or built
+    from "title" + "body" (the requests.jsonl layout). "repo" overrides the
+    default repo, and "id"/"request_id" names the item.
+
+    Args:
+        path: Path to the JSONL file
+        default_repo: Repo path used when a line has no "repo" field
+
+    Returns:
+        List of BatchItem objects in file order
+    """
+    items = []
+    with open(path, 'r', encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+
+            task = data.get("task")
+            if not task:
+                parts = [data.get("title", ""), data.get("body", "")]
+                task = "\n\n".join(p for p in parts if p)
+            if not task:
+                raise ValueError(f"{path}:{line_no}: no 'task' or 'title'/'body' field")
+
+            repo = data.get("repo") or default_repo
+            if not repo:
+                raise ValueError(f"{path}:{line_no}: no 'repo' field and no default repo given")
+
+            items.append(BatchItem(
+                item_id=str(data.get("id") or data.get("request_id") or f"line_{line_no}"),
+                repo_path=str(Path(repo).resolve()),
+                task_raw=task,
+            ))
+
+    return items
+
+
+def _error_result(item: BatchItem, work_item_id: str, started: float, e: Exception) -> BatchItemResult:
+    return BatchItemResult(
+        item_id=item.item_id,
+        work_item_id=work_item_id,
+        status="ERROR",
+        duration_s=round(time.perf_counter() - started, 3),
+        error=f"{type(e).__name__}: {e}",
+    )
+
+
+def _final_result(item: BatchItem, final_dict: dict, started: float, out_dir: str) -> BatchItemResult:
+    final = WorkItemState.model_validate(final_dict)
+    write_json(os.path.join(work_item_dir(out_dir, final.work_item_id), "final_state.json"), final.model_dump())
+
+    return BatchItemResult(
+        item_id=item.item_id,
+        work_item_id=final.work_item_id,
+        status=final.status,
+        implement_attempts=final.implement_attempts,
+        duration_s=round(time.perf_counter() - started, 3),
+        error=final.blocked_reason if final.status == "BLOCKED" else None,
+    )
+
+
+def _run_item(graph, item: BatchItem, delivery_config: DeliveryConfig, out_dir: str) -> BatchItemResult:
+    started = time.perf_counter()
+    state = new_state(repo_path=item.repo_path, task_raw=item.task_raw)
+    state.delivery_config = delivery_config
+
+    try:
+        with llm_scheduling(bulk=True):
+            final = graph.invoke(state, thread_config(state.work_item_id))
+        return _final_result(item, final, started, out_dir)
+    except Exception as e:
+        return _error_result(item, state.work_item_id, started, e)
+
+
+async def _arun_item(graph, item: BatchItem, delivery_config: DeliveryConfig, out_dir: str) -> BatchItemResult:
+    started = time.perf_counter()
+    state = new_state(repo_path=item.repo_path, task_raw=item.task_raw)
+    state.delivery_config = delivery_config
+
+    try:
+        with llm_scheduling(bulk=True):
+            final = await graph.ainvoke(state, thread_config(state.work_item_id))
+        return _final_result(item, final, started, out_dir)
+    except Exception as e:
+        return _error_result(item, state.work_item_id, started, e)
+
+
+def _report(items: List[BatchItem], results: List[BatchItemResult], workers: int, started_at: str, wall_clock: float) -> BatchReport:
+    status_counts = {}
+    for r in results:
+        status_counts[r.status] = status_counts.get(r.status, 0) + 1
+
+    return BatchReport(
+        started_at=started_at,
+        finished_at=datetime.utcnow().isoformat(),
+        workers=workers,
+        total_items=len(items),
+        status_counts=status_counts,
+        wall_clock_s=round(wall_clock, 3),
+        items_per_minute=round(len(items) / wall_clock * 60, 2) if wall_clock > 0 else 0.0,
+        results=results,
+        llm_scheduler=scheduler_stats(),
+    )
+
+
+def run_batch(
+    items: List[BatchItem],
+    workers: int = 4,
+    delivery_config: Optional[DeliveryConfig] = None,
+    out_dir: str = "runs",
+    on_result: Optional[Callable[[BatchItemResult], None]] = None,
+    checkpoint: bool = True,
+) -> BatchReport:
+    """
+    Run the workflow graph for many work items on a bounded thread pool.
+
+    Nodes spend nearly all their time waiting on LLM calls and subprocesses,
+    so threads give real overlap. The compiled graph is built once and shared.
+    Batch LLM calls are bulk work for the scheduler (see llm.scheduler): they
+    yield to interactive runs in the same process.
+
+    Args:
+        items: Work items to run
+        workers: Maximum number of work items in flight
+        delivery_config: Delivery config applied to every item
+        out_dir: Base runs directory; final states go to {out_dir}/{work_item_id}/
+        on_result: Optional callback invoked as each item finishes
+        checkpoint: Checkpoint every item (thread_id = work_item_id) so
+            interrupted items can be resumed with `reliquary resume`
+
+    Returns:
+        BatchReport with per-item results (in input order) and throughput
+    """
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    config = delivery_config or DeliveryConfig()
+
+    started_at = datetime.utcnow().isoformat()
+    started = time.perf_counter()
+
+    ordered: List[Optional[BatchItemResult]] = [None] * len(items)
+    with (open_checkpointer() if checkpoint else nullcontext()) as saver:
+        graph = build_graph(checkpointer=saver)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(_run_item, graph, item, config, out_dir): i for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                result = future.result()
+                ordered[futures[future]] = result
+                if on_result:
+                    on_result(result)
+
+    wall_clock = time.perf_counter() - started
+    return _report(items, ordered, workers, started_at, wall_clock)
+
+
+async def arun_batch(
+    items: List[BatchItem],
+    concurrency: int = 16,
+    delivery_config: Optional[DeliveryConfig] = None,
+    out_dir: str = "runs",
+    on_result: Optional[Callable[[BatchItemResult], None]] = None,
+    checkpoint: bool = True,
+) -> BatchReport:
+    """
+    Run the async workflow graph for many work items on a single event loop.
+
+    Same contract as run_batch(), but items are coroutines bounded by a
+    semaphore instead of threads, so far more can be in flight at once.
+    """
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    config = delivery_config or DeliveryConfig()
+    gate = asyncio.Semaphore(max(1, concurrency))
+
+    started_at = datetime.utcnow().isoformat()
+    started = time.perf_counter()
+
+    async with (open_async_checkpointer() if checkpoint else nullcontext()) as saver:
+        graph = build_async_graph(checkpointer=saver)
+
+        async def bounded(item: BatchItem) -> BatchItemResult:
+            async with gate:
+                result = await _arun_item(graph, item, config, out_dir)
+            if on_result:
+                on_result(result)
+            return result
+
+        results = await asyncio.gather(*(bounded(item) for item in items))
+
+    wall_clock = time.perf_counter() - started
+    return _report(items, list(results), concurrency, started_at, wall_clock)
@@ -0,0 +1,247 @@
+"""
+Pre-verification gates: independent checks of the proposed patch (every
+speculative candidate, since any of them may win), run concurrently with
+per-gate timeouts.
+
+The first blocking gate to fail short-circuits the stage; gates still running
+are abandoned and recorded as skipped.
+"""
+import asyncio
+import contextvars
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from reliquary.agents.review import quick_requirements_review
+from reliquary.policy.engine import evaluate_policy
+from reliquary.schemas.gates import GateResult
+from reliquary.schemas.security import SecurityScanResult, SecurityFinding
+from reliquary.schemas.state import WorkItemState
+from reliquary.security.scanners import detect_secrets, run_bandit
+from reliquary.storage.trace_store import span
+from reliquary.tools.git_tools import apply_patch, create_patch_file, worktree
+from reliquary.tools.impact import added_lines
+
+# Wall-clock limit per gate; bandit has its own 60s scanner timeout inside this
+GATE_TIMEOUTS_S = {
+    "detect_secrets": 10.0,
+    "bandit": 90.0,
+    "policy": 10.0,
+    "requirements_review": 10.0,
+}
+
+
+class GateOutcome(NamedTuple):
+    passed: bool
+    findings: List[str]
+    # SecurityScanResult, PolicyEvaluation or the candidates that passed review
+    data: Any = None
+
+
+class GateReport(NamedTuple):
+    results: List[GateResult]
+    outcomes: Dict[str, GateOutcome]
+    # Name of the blocking gate that failed (or timed out / errored), if any
+    failed: Optional[str]
+
+
+def _patches(state: WorkItemState) -> List[str]:
+    return state.patch_candidates or [state.patch_unified_diff or ""]
+
+
+def secrets_gate(state: WorkItemState) -> GateOutcome:
+    scan = detect_secrets("\n".join(_patches(state)))
+    return GateOutcome(scan.passed, [f.description for f in scan.findings], scan)
+
+
+def _bandit_patch(state: WorkItemState, patch: str) -> List[SecurityFinding]:
+    # bandit needs the patched files, so scan them in a pooled worktree with the patch applied.
+    added = {os.path.normpath(f): lines for f, lines in added_lines(patch).items() if f.endswith(".py") and lines}
+    if not added:
+        return []
+    fd, patch_path = tempfile.mkstemp(suffix=".patch", prefix="reliquary_gate_")
+    os.close(fd)
+    try:
+        create_patch_file(patch_path, patch)
+        with worktree(state.repo_path) as wt:
+            try:
+                apply_patch(wt, patch_path)
+            except Exception:
+                # Verification reports patches that don't apply.
+                return []
+            present = [f for f in added if os.path.exists(os.path.join(wt, f))]
+            findings = run_bandit(wt, present).findings if present else []
+    finally:
+        os.unlink(patch_path)
+    # Only what the patch introduced counts; issues already on untouched lines
+    # would otherwise block every later fix to the same file. Findings without
+    # a location (scanner errors) are kept as reported.
+    return [
+        f for f in findings
+        if not f.file_path or f.line_number in added.get(os.path.normpath(f.file_path), ())
+    ]
+
+
+def bandit_gate(state: WorkItemState) -> GateOutcome:
+    if shutil.which("bandit") is None:
+        # run_bandit reports the missing tool as a low-severity finding without a checkout.
+        scan = run_bandit(state.repo_path, [])
+        return GateOutcome(scan.passed, [f.description for f in scan.findings], scan)
+
+    # Candidates are scanned side by side, each in its own checkout, so the
+    # gate's wall-clock limit does not shrink with the number of candidates.
+    patches = _patches(state)
+    with ThreadPoolExecutor(max_workers=len(patches)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _bandit_patch, state, p) for p in patches]
+        findings: List[SecurityFinding] = [f for fut in futures for f in fut.result()]
+
+    passed = not any(f.severity in ("critical", "high") for f in findings)
+    scan = SecurityScanResult(scan_type="bandit", findings=findings, passed=passed)
+    return GateOutcome(passed, [f"{f.file_path}:{f.line_number}: {f.description}" for f in findings], scan)
+
+
+def policy_gate(state: WorkItemState) -> GateOutcome:
+    evaluation = evaluate_policy(state.ticket, "\n".join(_patches(state)), state)
+    findings = [f"{v['rule_name']} ({v['action']}): {v['details']}" for v in evaluation.violations]
+    return GateOutcome(evaluation.passed, findings, evaluation)
+
+
+def review_gate(state: WorkItemState) -> GateOutcome:
+    patches = _patches(state)
+    surviving, findings = [], []
+    for i, patch in enumerate(patches, start=1):
+        problems = quick_requirements_review(state.ticket, patch)
+        if not problems:
+            surviving.append(patch)
+        elif len(patches) > 1:
+            findings.extend(f"Candidate {i}: {p}" for p in problems)
+        else:
+            findings.extend(problems)
+    return GateOutcome(bool(surviving), findings, surviving)
+
+
+# (name, check, blocking). Policy rules may depend on verification evidence
+# (e.g. "auth changes require tests"), so the policy gate only records its
+# evaluation here; its block rules are enforced once the tests have run.
+GATES: List[tuple] = [
+    ("detect_secrets", secrets_gate, True),
+    ("bandit", bandit_gate, True),
+    ("policy", policy_gate, False),
+    ("requirements_review", review_gate, True),
+]
+
+
+def _run_gate(name: str, check: Callable[[WorkItemState], GateOutcome], state: WorkItemState):
+    started = time.monotonic()
+    with span("gate", gate=name) as s:
+        outcome = check(state)
+        s["passed"] = outcome.passed
+    return outcome, time.monotonic() - started
+
+
+class _Collector:
+    """Turns gate completions into GateResults and spots the first blocking failure."""
+
+    def __init__(self, state: WorkItemState):
+        self.attempt = state.implement_attempts
+        self.results: Dict[str, GateResult] = {}
+        self.outcomes: Dict[str, GateOutcome] = {}
+        self.failed: Optional[str] = None
+
+    def add(self, name: str, blocking: bool, status: str, outcome: Optional[GateOutcome] = None,
+            duration: Optional[float] = None, error: str = "") -> None:
+        if outcome is not None:
+            self.outcomes[name] = outcome
+            status = "passed" if outcome.passed else "failed"
+        findings = outcome.findings if outcome is not None else ([error] if error else [])
+        self.results[name] = GateResult(
+            gate=name, attempt=self.attempt, status=status, blocking=blocking, findings=findings,
+            duration_s=round(duration, 3) if duration is not None else None,
+        )
+        if blocking and status != "passed" and self.failed is None:
+            self.failed = name
+
+    def report(self) -> GateReport:
+        for name, _, blocking in GATES:
+            if name not in self.results:
+                self.results[name] = GateResult(gate=name, attempt=self.attempt, status="skipped", blocking=blocking)
+        return GateReport([self.results[name] for name, _, _ in GATES], self.outcomes, self.failed)
+
+
+def _in_gate_order(done, names: Dict[Any, tuple]) -> list:
+    # Gates that finish together are judged in GATES order, so a secret leak blocks
+    # even when the requirements review failed in the same instant.
+    order = [name for name, _, _ in GATES]
+    return sorted(done, key=lambda f: order.index(names[f][0]))
+
+
+def run_gates(state: WorkItemState) -> GateReport:
+    """
+    Run every gate on the proposed patch concurrently.
+
+    Args:
+        state: Work item with patch_unified_diff / patch_candidates set
+
+    Returns:
+        GateReport; failed names the blocking gate that stopped the stage
+    """
+    collector = _Collector(state)
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(GATES))
+    futures = {
+        pool.submit(contextvars.copy_context().run, _run_gate, name, check, state): (name, blocking)
+        for name, check, blocking in GATES
+    }
+    pending = set(futures)
+    try:
+        while pending and collector.failed is None:
+            deadline = min(started + GATE_TIMEOUTS_S[futures[f][0]] for f in pending)
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            for f in _in_gate_order(done, futures):
+                name, blocking = futures[f]
+                try:
+                    outcome, duration = f.result()
+                    collector.add(name, blocking, "", outcome, duration)
+                except Exception as e:
+                    collector.add(name, blocking, "error", error=str(e))
+            for f in list(pending):
+                name, blocking = futures[f]
+                if time.monotonic() >= started + GATE_TIMEOUTS_S[name]:
+                    pending.discard(f)
+                    collector.add(name, blocking, "timeout", duration=GATE_TIMEOUTS_S[name])
+    finally:
+        # Abandon whatever is still running; its result is no longer needed.
+        pool.shutdown(wait=False, cancel_futures=True)
+    return collector.report()
+
+
+async def arun_gates(state: WorkItemState) -> GateReport:
+    """Async variant of run_gates(); the checks run in worker threads."""
+    collector = _Collector(state)
+    tasks = {
+        asyncio.create_task(asyncio.wait_for(
+            asyncio.to_thread(_run_gate, name, check, state), GATE_TIMEOUTS_S[name],
+        )): (name, blocking)
+        for name, check, blocking in GATES
+    }
+    pending = set(tasks)
+    try:
+        while pending and collector.failed is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in _in_gate_order(done, tasks):
+                name, blocking = tasks[t]
+                try:
+                    outcome, duration = t.result()
+                    collector.add(name, blocking, "", outcome, duration)
+                except asyncio.TimeoutError:
+                    collector.add(name, blocking, "timeout", duration=GATE_TIMEOUTS_S[name])
+                except Exception as e:
+                    collector.add(name, blocking, "error", error=str(e))
+    finally:
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return collector.report()
@@ -1,380 +1,992 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from langgraph.graph import StateGraph, END
 
 from reliquary.schemas.state import WorkItemState
 from reliquary.schemas.delivery import DeliveryConfig
-from reliquary.agents.intake import intake
-from reliquary.agents.owner import make_plan, generate_patch, maybe_request_help
-from reliquary.agents.review import quick_requirements_review
-from reliquary.agents.helpers import provide_help
-from reliquary.schemas.help import DecisionLogEntry
-
-from reliquary.tools.git_tools import create_patch_file, apply_patch, get_diff
-from reliquary.tools.exec_tools import run_command
-from reliquary.storage.run_store import new_run_dir, write_json, write_text
+from reliquary.schemas.evidence import CommandRun, Evidence
+from reliquary.schemas.memory import MemoryAdvice
+from reliquary.schemas.policy import PolicyEvaluation
+from reliquary.agents.intake import intake, aintake, IntakeResult
+from reliquary.agents.owner import (
+    make_plan, generate_patch, maybe_request_help,
+    amake_plan, agenerate_patch, amaybe_request_help,
+    assess, aassess, assess_enabled, help_decision_key,
+    generate_patch_candidates, agenerate_patch_candidates,
+)
+from reliquary.agents.helpers import provide_help, aprovide_help
+from reliquary.schemas.help import DecisionLogEntry, HelpRequest, HelpResponse
+
+from reliquary.tools.git_tools import (
+    create_patch_file, apply_patch, get_diff, aapply_patch, aget_diff, worktree, aworktree,
+    tree_hash,
+)
+from reliquary.tools.exec_tools import (
+    run_pytest, arun_pytest, command_cache_enabled, env_fingerprint, venv_python,
+)
+from reliquary.tools.impact import changed_files, select_affected_tests, external_imports
+from reliquary.storage.run_store import (
+    work_item_dir, attempt_dir, record_attempt, update_manifest, write_json, write_text,
+)
+from reliquary.storage.trace_store import span, collect_spans, write_trace
 from reliquary.storage.audit_store import log_audit_event
+from reliquary.storage.checkpoint_store import open_checkpointer, thread_config
 from reliquary.policy.rules import evidence_gate_can_finalize
 from reliquary.delivery.deliverer import deliver_local_patch, deliver_github_pr, deliver_direct_push
 from reliquary.memory.indexer import index_run
-from reliquary.memory.store import save_run_summary
+from reliquary.memory.store import save_run_summary, save_node_timings, save_llm_usage
 from reliquary.memory.advisor import get_memory_advice
 from reliquary.policy.engine import evaluate_policy
-from reliquary.security.scanners import run_bandit, detect_secrets
+from reliquary.graph.gates import GateReport, run_gates, arun_gates
+from reliquary.llm.cache import cache_scope
+from reliquary.llm.scheduler import llm_scheduling
+from reliquary.llm.usage import collect_usage, usage_totals
+from reliquary.schemas.usage import LLMUsage
 
 
-def build_graph():
-    g = StateGraph(WorkItemState)
-
-    def n_intake(state: WorkItemState) -> Dict[str, Any]:
-        r = intake(state.task_raw)
-        if r.needs_info:
-            return {
-                "status": "NEEDS_INFO",
-                "ticket": r.ticket,
-                "blocked_reason": "Need clarification from user",
-                "blocked_needs": r.clarification_questions,
-            }
-        return {"ticket": r.ticket, "status": "PLANNING"}
+# Each work item records into one tree: runs/{work_item_id}/ (see storage.run_store)
+RUNS_DIR = "runs"
 
-    def n_plan(state: WorkItemState) -> Dict[str, Any]:
-        # Get memory advice
-        memory_advice = get_memory_advice(state.ticket, state.repo_path)
 
-        # Log memory consultation
-        dl = state.decision_log + [
-            DecisionLogEntry(
-                event="MEMORY_CONSULTED",
-                actor="system",
-                details={
-                    "similar_successes_count": len(memory_advice.similar_successes),
-                    "similar_failures_count": len(memory_advice.similar_failures),
-                    "recommendations": memory_advice.recommendations
-                }
-            )
-        ]
+# ---------------------------------------------------------------------------
+# State updates shared by the sync and async node implementations.
+# Each I/O-bound node is split into "gate" checks that may short-circuit, the
+# blocking call (LLM, git, pytest), and an update built from its result.
+# decision_log, help_requests, help_responses and review_findings are append
+# channels: updates carry only the new entries.
+# ---------------------------------------------------------------------------
 
-        plan = make_plan(state.ticket)
+def _intake_update(r: IntakeResult) -> Dict[str, Any]:
+    if r.needs_info:
         return {
-            "plan": plan,
-            "memory_advice": memory_advice,
-            "decision_log": dl,
-            "status": "POLICY_CHECK"
+            "status": "NEEDS_INFO",
+            "ticket": r.ticket,
+            "blocked_reason": "Need clarification from user",
+            "blocked_needs": r.clarification_questions,
         }
+    return {"ticket": r.ticket, "status": "PLANNING"}
+
+
+def _plan_update(state: WorkItemState, memory_advice: MemoryAdvice, plan: list[str]) -> Dict[str, Any]:
+    # Log memory consultation
+    dl = [
+        DecisionLogEntry(
+            event="MEMORY_CONSULTED",
+            actor="system",
+            details={
+                "similar_successes_count": len(memory_advice.similar_successes),
+                "similar_failures_count": len(memory_advice.similar_failures),
+                "recommendations": memory_advice.recommendations
+            }
+        )
+    ]
 
-    def n_policy_check(state: WorkItemState) -> Dict[str, Any]:
-        # Policy check happens before implementation
-        # For now, we'll do a basic check; full check after patch generation
-        return {"status": "IMPLEMENTING"}
-
-    def n_security_scan(state: WorkItemState) -> Dict[str, Any]:
-        # Run security scans on patch
-        secrets_scan = detect_secrets(state.patch_unified_diff or "")
+    return {
+        "plan": plan,
+        "memory_advice": memory_advice,
+        "decision_log": dl,
+        "status": "POLICY_CHECK"
+    }
 
-        scans = [secrets_scan]
 
-        # Log scan results
-        dl = state.decision_log + [
+def _implement_gate(state: WorkItemState) -> Optional[Dict[str, Any]]:
+    if state.implement_attempts >= state.max_implement_attempts:
+        dl = [
             DecisionLogEntry(
-                event="SECURITY_SCAN_COMPLETED",
+                event="BLOCKED",
                 actor="system",
-                details={
-                    "scans_run": len(scans),
-                    "all_passed": all(s.passed for s in scans),
-                    "findings_count": sum(len(s.findings) for s in scans)
-                }
+                details={"reason": "Exceeded max implementation attempts"},
             )
         ]
-
-        # Block if critical findings
-        if not secrets_scan.passed:
-            return {
-                "security_scans": scans,
-                "decision_log": dl,
-                "status": "BLOCKED",
-                "blocked_reason": "Security scans failed - potential secrets detected",
-                "blocked_needs": ["Review and remove secrets from patch"]
-            }
-
         return {
-            "security_scans": scans,
+            "status": "BLOCKED",
+            "blocked_reason": "Exceeded max implementation attempts",
+            "blocked_needs": ["Human review / adjust ticket scope"],
             "decision_log": dl,
-            "status": "VERIFYING"
         }
 
-    def n_implement(state: WorkItemState) -> Dict[str, Any]:
-        if state.implement_attempts >= state.max_implement_attempts:
-            dl = state.decision_log + [
-                DecisionLogEntry(
-                    event="BLOCKED",
-                    actor="system",
-                    details={"reason": "Exceeded max implementation attempts"},
-                )
-            ]
-            return {
-                "status": "BLOCKED",
-                "blocked_reason": "Exceeded max implementation attempts",
-                "blocked_needs": ["Human review / adjust ticket scope"],
-                "decision_log": dl,
-            }
+    # If there is a help request that hasn't been answered, route to help.
+    pending_help = len(state.help_requests) > len(state.help_responses)
+    if pending_help:
+        return {"status": "NEED_HELP"}
+
+    return None
+
+
+def _help_requested_update(state: WorkItemState, help_req: HelpRequest) -> Dict[str, Any]:
+    dl = [
+        DecisionLogEntry(
+            event="HELP_REQUESTED",
+            actor="owner",
+            details={
+                "request_id": help_req.request_id,
+                "domain": help_req.domain,
+                "question": help_req.question,
+                "attempt": help_req.attempt,
+            },
+        )
+    ]
+    return {
+        "help_requests": [help_req],
+        "decision_log": dl,
+        "status": "NEED_HELP",
+    }
+
+
+def _help_decision_due(state: WorkItemState) -> Optional[str]:
+    """
+    Key for a new help decision, or None when none is due.
+
+    None when the help cycles are used up, or when the decision would see
+    exactly what the last one saw (same ticket, repo files and specialist
+    advice), e.g. on a retry after failing tests or right after assess().
+    """
+    if state.help_cycles >= state.max_help_cycles:
+        return None
+    key = help_decision_key(state.repo_path, state.ticket, state.help_responses)
+    return None if key == state.help_decision_key else key
+
+
+def _assessed_update(state: WorkItemState, memory_advice: MemoryAdvice, plan: list[str],
+                     help_req: Optional[HelpRequest]) -> Dict[str, Any]:
+    # The plan plus the first attempt's help decision; a requested help is
+    # answered before implementing (see _implement_gate).
+    update = _plan_update(state, memory_advice, plan)
+    update["help_decision_key"] = help_decision_key(state.repo_path, state.ticket, state.help_responses)
+    if help_req is not None and state.help_cycles < state.max_help_cycles:
+        requested = _help_requested_update(state, help_req)
+        update["help_requests"] = requested["help_requests"]
+        update["decision_log"] = update["decision_log"] + requested["decision_log"]
+    return update
+
+
+def _patch_proposed_update(state: WorkItemState, patch: str, candidates: Optional[list[str]] = None,
+                           decision_key: Optional[str] = None) -> Dict[str, Any]:
+    details = {"attempt": state.implement_attempts + 1}
+    if candidates:
+        details["candidates"] = len(candidates)
+    dl = [
+        DecisionLogEntry(
+            event="PATCH_PROPOSED",
+            actor="owner",
+            details=details,
+        )
+    ]
+    update = {
+        "patch_unified_diff": patch,
+        "patch_candidates": candidates or [],
+        "implement_attempts": state.implement_attempts + 1,
+        "decision_log": dl,
+        "status": "VERIFYING",
+    }
+    if decision_key is not None:
+        update["help_decision_key"] = decision_key
+    return update
+
+
+def _help_gate(state: WorkItemState) -> Optional[Dict[str, Any]]:
+    # Find newest help request without a response.
+    if len(state.help_requests) <= len(state.help_responses):
+        return {"status": "IMPLEMENTING"}
 
-        # If there is a help request that hasn't been answered, route to help.
-        pending_help = len(state.help_requests) > len(state.help_responses)
-        if pending_help:
-            return {"status": "NEED_HELP"}
-
-        # Week 2: Ask for specialist help BEFORE guessing.
-        if state.help_cycles < state.max_help_cycles:
-            help_req = maybe_request_help(state.repo_path, state.ticket, state.implement_attempts + 1)
-            if help_req is not None:
-                dl = state.decision_log + [
-                    DecisionLogEntry(
-                        event="HELP_REQUESTED",
-                        actor="owner",
-                        details={
-                            "request_id": help_req.request_id,
-                            "domain": help_req.domain,
-                            "question": help_req.question,
-                            "attempt": help_req.attempt,
-                        },
-                    )
-                ]
-                return {
-                    "help_requests": state.help_requests + [help_req],
-                    "decision_log": dl,
-                    "status": "NEED_HELP",
-                }
-
-        # Otherwise proceed with patch generation.
-        patch = generate_patch(state.repo_path, state.ticket)
-        dl = state.decision_log + [
+    if state.help_cycles >= state.max_help_cycles:
+        dl = [
             DecisionLogEntry(
-                event="PATCH_PROPOSED",
-                actor="owner",
-                details={"attempt": state.implement_attempts + 1},
+                event="BLOCKED",
+                actor="system",
+                details={"reason": "Exceeded max help cycles"},
             )
         ]
         return {
-            "patch_unified_diff": patch,
-            "implement_attempts": state.implement_attempts + 1,
+            "status": "BLOCKED",
+            "blocked_reason": "Exceeded max help cycles",
+            "blocked_needs": ["Human input on repo stack / requirements"],
             "decision_log": dl,
-            "status": "VERIFYING",
         }
 
-    def n_help(state: WorkItemState) -> Dict[str, Any]:
-        # Find newest help request without a response.
-        if len(state.help_requests) <= len(state.help_responses):
-            return {"status": "IMPLEMENTING"}
-
-        if state.help_cycles >= state.max_help_cycles:
-            dl = state.decision_log + [
-                DecisionLogEntry(
-                    event="BLOCKED",
-                    actor="system",
-                    details={"reason": "Exceeded max help cycles"},
-                )
-            ]
-            return {
-                "status": "BLOCKED",
-                "blocked_reason": "Exceeded max help cycles",
-                "blocked_needs": ["Human input on repo stack / requirements"],
-                "decision_log": dl,
-            }
+    return None
 
-        req = state.help_requests[len(state.help_responses)]
-        resp = provide_help(req)
 
-        dl = state.decision_log + [
+def _help_received_update(state: WorkItemState, resp: HelpResponse) -> Dict[str, Any]:
+    dl = [
+        DecisionLogEntry(
+            event="HELP_RECEIVED",
+            actor=f"helper:{resp.domain}",
+            details={
+                "request_id": resp.request_id,
+                "confidence": resp.confidence,
+                "needs_more_info": resp.needs_more_info,
+            },
+        )
+    ]
+
+    return {
+        "help_responses": [resp],
+        "help_cycles": state.help_cycles + 1,
+        "decision_log": dl,
+        "status": "IMPLEMENTING",
+    }
+
+
+def _verify_prepare(state: WorkItemState) -> Tuple[str, str, str]:
+    """Snapshot state and write the patch file (the requirements review ran in the gates stage).
+
+    Everything for this attempt goes under runs/{work_item_id}/attempts/attempt_{n}.
+    Returns (run_dir, artifacts, patch_path).
+    """
+    run_dir = work_item_dir(RUNS_DIR, state.work_item_id)
+    attempt = state.implement_attempts
+    this_attempt = attempt_dir(run_dir, attempt)
+    artifacts = os.path.join(this_attempt, "artifacts")
+    write_json(os.path.join(this_attempt, "state_before_verify.json"), state.model_dump())
+
+    patch_path = os.path.abspath(os.path.join(artifacts, "change.patch"))
+    create_patch_file(patch_path, state.patch_unified_diff)
+    record_attempt(run_dir, attempt, patch=os.path.relpath(patch_path, run_dir))
+    return run_dir, artifacts, patch_path
+
+
+def _patch_apply_failed_update(state: WorkItemState, run_dir: str, e: Exception) -> Dict[str, Any]:
+    record_attempt(run_dir, state.implement_attempts, outcome="patch_apply_failed", error=str(e))
+    return {
+        "review_findings": [f"Patch apply failed: {e}"],
+        "status": "IMPLEMENTING",
+    }
+
+
+def _tests_failed_finding(test_run: CommandRun) -> str:
+    if test_run.termination == "timeout":
+        return "Tests were killed after exceeding the time limit; see evidence logs."
+    if test_run.termination == "output_limit":
+        return "Tests were killed after exceeding the output size limit; see evidence logs."
+    return "Tests failed; see evidence logs."
+
+
+# Blocked reasons for the pre-verification gates (see graph.gates)
+_GATE_BLOCKS = {
+    "detect_secrets": ("Security scans failed - potential secrets detected", "Review and remove secrets from patch"),
+    "bandit": ("Security scans failed - high severity bandit findings", "Fix the issues bandit reports in the patch"),
+}
+
+
+def _gates_update(state: WorkItemState, report: GateReport) -> Dict[str, Any]:
+    """Record the gate results; a failed blocking gate blocks or (review) sends the patch back."""
+    run_dir = work_item_dir(RUNS_DIR, state.work_item_id)
+    attempt = state.implement_attempts
+    record_attempt(run_dir, attempt, gates={r.gate: r.status for r in report.results})
+
+    update: Dict[str, Any] = {
+        "gate_results": report.results,
+        "security_scans": [report.outcomes[g].data for g in ("detect_secrets", "bandit") if g in report.outcomes],
+        "decision_log": [
             DecisionLogEntry(
-                event="HELP_RECEIVED",
-                actor=f"helper:{resp.domain}",
+                event="GATES_COMPLETED",
+                actor="system",
                 details={
-                    "request_id": resp.request_id,
-                    "confidence": resp.confidence,
-                    "needs_more_info": resp.needs_more_info,
+                    "gates": {r.gate: r.status for r in report.results},
+                    "blocked_by": report.failed,
+                    "findings_count": sum(len(r.findings) for r in report.results),
                 },
             )
+        ],
+    }
+    if "policy" in report.outcomes:
+        update["policy_evaluation"] = report.outcomes["policy"].data
+
+    failed = report.failed
+    if failed == "requirements_review":
+        outcome = report.outcomes.get(failed)
+        findings = outcome.findings if outcome else ["Requirements review did not complete"]
+        record_attempt(run_dir, attempt, outcome="review_failed", findings=findings)
+        return {**update, "review_findings": findings, "status": "IMPLEMENTING"}
+
+    if failed:
+        result = next(r for r in report.results if r.gate == failed)
+        if failed == "bandit" and result.status != "failed":
+            # A slow or crashed scan says nothing about the patch; retry it like a failed attempt.
+            findings = [f"Security scan did not complete ({result.status}); the patch was not checked."]
+            record_attempt(run_dir, attempt, outcome="gate_incomplete", gate=failed, findings=findings)
+            return {**update, "review_findings": findings, "status": "IMPLEMENTING"}
+        reason, need = _GATE_BLOCKS[failed] if result.status == "failed" else (
+            f"Gate {failed} did not complete ({result.status})", f"Check the {failed} gate, then resume the run")
+        record_attempt(run_dir, attempt, outcome="gate_blocked", gate=failed)
+        return {**update, "status": "BLOCKED", "blocked_reason": reason, "blocked_needs": [need]}
+
+    # Speculative mode: only candidates that passed the review go on to verification.
+    surviving = report.outcomes["requirements_review"].data
+    if len(state.patch_candidates) > 1 and surviving != state.patch_candidates:
+        update["patch_candidates"] = surviving
+        update["patch_unified_diff"] = surviving[0]
+    return {**update, "status": "VERIFYING"}
+
+
+def _policy_blocked_update(state: WorkItemState, evidence: Evidence, diff_text: str) -> Tuple[PolicyEvaluation, Optional[Dict[str, Any]]]:
+    """Enforce policy block rules once the verification evidence exists (delivery gate)."""
+    evaluation = evaluate_policy(state.ticket, diff_text, state.model_copy(update={"evidence": evidence}))
+    if evaluation.passed:
+        return evaluation, None
+
+    rules = [v["rule_name"] for v in evaluation.violations if v["action"] == "block"]
+    return evaluation, {
+        "status": "BLOCKED",
+        "blocked_reason": f"Policy gate failed: {', '.join(rules)}",
+        "blocked_needs": ["Satisfy or waive the blocking policy rules"],
+    }
+
+
+def _verify_update(state: WorkItemState, run_dir: str, artifacts: str, test_runs: List[CommandRun], diff_text: str) -> Dict[str, Any]:
+    """Record an attempt's test runs; the last one (the full suite, if it ran) decides."""
+    test_run = test_runs[-1]
+    new_evidence = state.evidence.model_copy(deep=True)
+    new_evidence.test_runs.extend(test_runs)
+
+    write_text(os.path.join(artifacts, "git.diff.txt"), diff_text)
+
+    # Save artifacts (latest view at the work item root; per-attempt files live under attempts/)
+    write_json(os.path.join(run_dir, "evidence.json"), new_evidence.model_dump())
+    write_json(os.path.join(run_dir, "decision_log.json"), [e.model_dump() for e in state.decision_log])
+    write_json(os.path.join(run_dir, "help_requests.json"), [r.model_dump() for r in state.help_requests])
+    write_json(os.path.join(run_dir, "help_responses.json"), [r.model_dump() for r in state.help_responses])
+
+    passed = evidence_gate_can_finalize(test_run.exit_code)
+    record_attempt(
+        run_dir,
+        state.implement_attempts,
+        outcome="tests_passed" if passed else "tests_failed",
+        test_exit_code=test_run.exit_code,
+        stdout=os.path.relpath(test_run.stdout_path, run_dir),
+        stderr=os.path.relpath(test_run.stderr_path, run_dir),
+        test_runs=[{"command": r.command, "exit_code": r.exit_code, "termination": r.termination} for r in test_runs],
+    )
+
+    if passed:
+        dl = [
+            DecisionLogEntry(
+                event="TESTS_PASSED",
+                actor="system",
+                details={"exit_code": test_run.exit_code, "cached": test_run.cached},
+            )
         ]
+        # Log audit event
+        log_audit_event(run_dir, state.work_item_id, "TESTS_PASSED", "system", {"exit_code": test_run.exit_code})
+
+        evaluation, blocked = _policy_blocked_update(state, new_evidence, diff_text)
+        if blocked is not None:
+            dl.append(DecisionLogEntry(event="BLOCKED", actor="system", details={"reason": blocked["blocked_reason"]}))
+            log_audit_event(run_dir, state.work_item_id, "BLOCKED", "system", {"reason": blocked["blocked_reason"]})
+            return {"evidence": new_evidence, "policy_evaluation": evaluation, "decision_log": dl, **blocked}
+        return {"evidence": new_evidence, "policy_evaluation": evaluation, "patch_applied": True,
+                "decision_log": dl, "status": "DELIVERING"}
+
+    dl = [
+        DecisionLogEntry(
+            event="TESTS_FAILED",
+            actor="system",
+            details={"exit_code": test_run.exit_code, "cached": test_run.cached, "termination": test_run.termination},
+        )
+    ]
+    # Log audit event
+    log_audit_event(run_dir, state.work_item_id, "TESTS_FAILED", "system", {"exit_code": test_run.exit_code})
+    return {
+        "evidence": new_evidence,
+        "decision_log": dl,
+        "review_findings": [_tests_failed_finding(test_run)],
+        "status": "IMPLEMENTING",
+    }
+
+
+# ---------------------------------------------------------------------------
+# Test selection: with state.test_selection != "full", the tests that import
+# (transitively) a changed file run first. A failure there ends the attempt
+# early; otherwise the full suite runs as the final gate unless the selection
+# is "affected". Impact that can't be bounded falls back to the full suite.
+# Each run goes through exec_tools.run_pytest: the same tree, command and
+# environment reuse a cached result, and new runs go to the warm pytest worker
+# for the repo's venv (forked per run, heavy imports done) when available.
+# ---------------------------------------------------------------------------
+
+def _affected_tests(state: WorkItemState, wt: str, patch: str) -> Optional[List[str]]:
+    if state.test_selection == "full":
+        return None
+    return select_affected_tests(wt, changed_files(patch), cache_key=state.repo_path)
+
+
+# pytest's exit code when it collected no tests
+_NO_TESTS_COLLECTED = 5
+
+
+def _needs_full_suite(state: WorkItemState, affected_run: Optional[CommandRun]) -> bool:
+    # Selected files without any test functions count as no affected tests.
+    if affected_run is None or affected_run.exit_code == _NO_TESTS_COLLECTED:
+        return True
+    if not evidence_gate_can_finalize(affected_run.exit_code):
+        return False
+    return state.test_selection != "affected"
+
+
+def _pytest_options(state: WorkItemState, wt: str) -> Dict[str, Any]:
+    """Keyword arguments for run_pytest() shared by every run in one checkout."""
+    return {
+        # Tests run in a pooled worktree (see tools.git_tools.WorktreePool), which only
+        # holds tracked files, so use the target repo's own venv by absolute path.
+        # Spawned directly, without a shell (see exec_tools.run_argv).
+        "python": venv_python(state.repo_path),
+        "tree": tree_hash(wt) if command_cache_enabled() else "",
+        "fingerprint": env_fingerprint(state.repo_path),
+        # Only evaluated when a new worker starts: its third-party imports
+        "preload": functools.partial(external_imports, wt, cache_key=state.repo_path),
+    }
+
+
+def _run_tests(state: WorkItemState, wt: str, patch: str, out_dir: str, label: str) -> List[CommandRun]:
+    tests = _affected_tests(state, wt, patch)
+    options = _pytest_options(state, wt)
+    runs = []
+    if tests:
+        runs.append(run_pytest(wt, args=["-q", *tests], out_dir=out_dir, label=f"{label}_affected", **options))
+    if _needs_full_suite(state, runs[-1] if runs else None):
+        runs.append(run_pytest(wt, args=["-q"], out_dir=out_dir, label=label, **options))
+    return runs
+
+
+async def _arun_tests(state: WorkItemState, wt: str, patch: str, out_dir: str, label: str) -> List[CommandRun]:
+    tests = await asyncio.to_thread(_affected_tests, state, wt, patch)
+    options = await asyncio.to_thread(_pytest_options, state, wt)
+    runs = []
+    if tests:
+        runs.append(await arun_pytest(wt, args=["-q", *tests], out_dir=out_dir, label=f"{label}_affected", **options))
+    if _needs_full_suite(state, runs[-1] if runs else None):
+        runs.append(await arun_pytest(wt, args=["-q"], out_dir=out_dir, label=label, **options))
+    return runs
+
+
+# ---------------------------------------------------------------------------
+# Speculative verification: every candidate patch is applied and tested in its
+# own worktree, in parallel; the first candidate whose tests pass wins.
+# Per-candidate artifacts live in attempts/attempt_{n}/candidate_{i}/artifacts.
+# ---------------------------------------------------------------------------
+
+def _candidates_prepare(state: WorkItemState) -> Tuple[str, list[Dict[str, Any]]]:
+    """_verify_prepare() for speculative mode: write each candidate's patch file.
+
+    Candidates that failed the requirements review were dropped by the gates stage.
+    """
+    run_dir = work_item_dir(RUNS_DIR, state.work_item_id)
+    attempt = state.implement_attempts
+    this_attempt = attempt_dir(run_dir, attempt)
+    write_json(os.path.join(this_attempt, "state_before_verify.json"), state.model_dump())
+
+    prepared = []
+    for i, patch in enumerate(state.patch_candidates, start=1):
+        artifacts = os.path.join(this_attempt, f"candidate_{i}", "artifacts")
+        patch_path = os.path.abspath(os.path.join(artifacts, "change.patch"))
+        create_patch_file(patch_path, patch)
+        prepared.append({"candidate": i, "patch": patch, "artifacts": artifacts, "patch_path": patch_path})
+    return run_dir, prepared
+
+
+def _candidate_passed(result: Dict[str, Any]) -> bool:
+    return bool(result.get("test_runs")) and evidence_gate_can_finalize(result["test_runs"][-1].exit_code)
+
+
+def _candidate_label(state: WorkItemState, candidate: Dict[str, Any]) -> str:
+    return f"pytest_attempt_{state.implement_attempts}_candidate_{candidate['candidate']}"
+
+
+def _verify_candidate(state: WorkItemState, candidate: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        with worktree(state.repo_path) as wt:
+            apply_patch(wt, candidate["patch_path"])
+            test_runs = _run_tests(state, wt, candidate["patch"], candidate["artifacts"], _candidate_label(state, candidate))
+            return {**candidate, "test_runs": test_runs, "diff": get_diff(wt)}
+    except Exception as e:
+        return {**candidate, "error": str(e)}
+
+
+async def _averify_candidate(state: WorkItemState, candidate: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        async with aworktree(state.repo_path) as wt:
+            await aapply_patch(wt, candidate["patch_path"])
+            test_runs = await _arun_tests(state, wt, candidate["patch"], candidate["artifacts"], _candidate_label(state, candidate))
+            return {**candidate, "test_runs": test_runs, "diff": await aget_diff(wt)}
+    except Exception as e:
+        return {**candidate, "error": str(e)}
+
+
+def _candidates_update(
+    state: WorkItemState,
+    run_dir: str,
+    prepared: list[Dict[str, Any]],
+    results: list[Dict[str, Any]],
+    winner: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    finished = {r["candidate"]: r for r in results}
+    entries = []
+    for c in prepared:
+        entry = {"candidate": c["candidate"], "patch": os.path.relpath(c["patch_path"], run_dir)}
+        r = finished.get(c["candidate"])
+        if r is None:
+            entry["outcome"] = "abandoned"
+        elif r.get("error"):
+            entry.update(outcome="patch_apply_failed", error=r["error"])
+        else:
+            entry.update(
+                outcome="tests_passed" if _candidate_passed(r) else "tests_failed",
+                test_exit_code=r["test_runs"][-1].exit_code,
+            )
+        entries.append(entry)
+    record_attempt(run_dir, state.implement_attempts, candidates=entries,
+                   winner=winner["candidate"] if winner else None)
+
+    # Evidence records the winner, or else the lowest-numbered candidate that got to run its tests.
+    tested = sorted((r for r in results if r.get("test_runs")), key=lambda r: r["candidate"])
+    reported = winner or (tested[0] if tested else None)
+    if reported is None:
+        errors = "; ".join(f"candidate {r['candidate']}: {r['error']}" for r in results)
+        return _patch_apply_failed_update(state, run_dir, RuntimeError(errors))
 
-        return {
-            "help_responses": state.help_responses + [resp],
-            "help_cycles": state.help_cycles + 1,
-            "decision_log": dl,
-            "status": "IMPLEMENTING",
-        }
+    record_attempt(run_dir, state.implement_attempts, patch=os.path.relpath(reported["patch_path"], run_dir))
+    update = _verify_update(state, run_dir, reported["artifacts"], reported["test_runs"], reported["diff"])
+    if winner:
+        update["patch_unified_diff"] = winner["patch"]
+    return update
 
-    def n_verify(state: WorkItemState) -> Dict[str, Any]:
-        from pathlib import Path
 
-        run_dir = new_run_dir("runs", state.work_item_id)
-        artifacts = f"{run_dir}\\artifacts"
-        write_json(f"{run_dir}\\state_before_verify.json", state.model_dump())
+def _verify_speculative(state: WorkItemState) -> Dict[str, Any]:
+    run_dir, prepared = _candidates_prepare(state)
+
+    results, winner = [], None
+    pool = ThreadPoolExecutor(max_workers=len(prepared))
+    futures = [pool.submit(contextvars.copy_context().run, _verify_candidate, state, c) for c in prepared]
+    try:
+        for f in as_completed(futures):
+            results.append(f.result())
+            if _candidate_passed(results[-1]):
+                winner = results[-1]
+                break
+    finally:
+        # Don't wait for the losers; each returns its worktree when its tests finish.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return _candidates_update(state, run_dir, prepared, results, winner)
+
+
+async def _averify_speculative(state: WorkItemState) -> Dict[str, Any]:
+    run_dir, prepared = _candidates_prepare(state)
+
+    results, winner = [], None
+    tasks = [asyncio.create_task(_averify_candidate(state, c)) for c in prepared]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            results.append(await next_done)
+            if _candidate_passed(results[-1]):
+                winner = results[-1]
+                break
+    finally:
+        # Cancel the losers (killing their test runs) and wait for their worktrees to go.
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return _candidates_update(state, run_dir, prepared, results, winner)
 
-        # Quick requirements sanity check
-        findings = quick_requirements_review(state.ticket, state.patch_unified_diff)
-        if findings:
-            return {
-                "review_findings": state.review_findings + findings,
-                "status": "IMPLEMENTING",
-            }
 
-        patch_path = str(Path(f"{artifacts}\\change.patch").resolve())
-        create_patch_file(patch_path, state.patch_unified_diff)
+# ---------------------------------------------------------------------------
+# Nodes without blocking LLM calls; shared by both graphs.
+# ---------------------------------------------------------------------------
+
+def n_policy_check(state: WorkItemState) -> Dict[str, Any]:
+    # Policy check happens before implementation
+    # For now, we'll do a basic check; full check after patch generation
+    return {"status": "IMPLEMENTING"}
+
+
+def n_gates(state: WorkItemState) -> Dict[str, Any]:
+    return _gates_update(state, run_gates(state))
+
+
+def n_deliver(state: WorkItemState) -> Dict[str, Any]:
+    run_dir = work_item_dir(RUNS_DIR, state.work_item_id)
+
+    # Log delivery start
+    log_audit_event(run_dir, state.work_item_id, "DELIVERY_STARTED", "system", {"mode": state.delivery_config.mode if state.delivery_config else "local_patch"})
+
+    # Determine delivery mode
+    config = state.delivery_config or DeliveryConfig()
+
+    # Execute delivery
+    if config.mode == "local_patch":
+        result = deliver_local_patch(state, run_dir, config)
+    elif config.mode == "github_pr":
+        result = deliver_github_pr(state, run_dir, config)
+    elif config.mode == "direct_push":
+        result = deliver_direct_push(state, run_dir, config)
+    else:
+        result = deliver_local_patch(state, run_dir, config)
+
+    # Save delivery result
+    write_json(os.path.join(run_dir, "delivery_result.json"), result.model_dump())
+    update_manifest(run_dir, delivery={"status": result.status, "mode": result.mode, "result": "delivery_result.json"})
+
+    # Log delivery completion
+    log_audit_event(run_dir, state.work_item_id, "DELIVERY_COMPLETED", "system", {"status": result.status, "mode": result.mode})
+
+    # Index run to memory
+    run_summary = index_run(state, run_dir)
+    save_run_summary(run_summary)
+
+    return {
+        "delivery_result": result,
+        "status": "DELIVERED" if result.status == "delivered" else "BLOCKED"
+    }
+
+
+# ---------------------------------------------------------------------------
+# Sync nodes
+# ---------------------------------------------------------------------------
+
+def n_intake(state: WorkItemState) -> Dict[str, Any]:
+    return _intake_update(intake(state.task_raw))
+
+
+def n_plan(state: WorkItemState) -> Dict[str, Any]:
+    # Get memory advice
+    memory_advice = get_memory_advice(state.ticket, state.repo_path)
+    if assess_enabled():
+        # One call for the plan and the first attempt's help decision
+        plan, help_req = assess(state.repo_path, state.ticket)
+        return _assessed_update(state, memory_advice, plan, help_req)
+    plan = make_plan(state.ticket)
+    return _plan_update(state, memory_advice, plan)
+
+
+def n_implement(state: WorkItemState) -> Dict[str, Any]:
+    gated = _implement_gate(state)
+    if gated is not None:
+        return gated
+
+    # Week 2: Ask for specialist help BEFORE guessing (unless nothing changed since the last decision).
+    decision_key = _help_decision_due(state)
+    if decision_key is not None:
+        help_req = maybe_request_help(state.repo_path, state.ticket, state.implement_attempts + 1, state.help_responses)
+        if help_req is not None:
+            return {**_help_requested_update(state, help_req), "help_decision_key": decision_key}
 
+    # Otherwise proceed with patch generation.
+    if state.speculative_candidates > 1:
+        candidates = generate_patch_candidates(state.repo_path, state.ticket, state.speculative_candidates)
+        return _patch_proposed_update(state, candidates[0], candidates, decision_key)
+
+    patch = generate_patch(state.repo_path, state.ticket)
+    return _patch_proposed_update(state, patch, decision_key=decision_key)
+
+
+def n_help(state: WorkItemState) -> Dict[str, Any]:
+    gated = _help_gate(state)
+    if gated is not None:
+        return gated
+
+    req = state.help_requests[len(state.help_responses)]
+    return _help_received_update(state, provide_help(req))
+
+
+def n_verify(state: WorkItemState) -> Dict[str, Any]:
+    if len(state.patch_candidates) > 1:
+        return _verify_speculative(state)
+
+    run_dir, artifacts, patch_path = _verify_prepare(state)
+
+    # Apply and test in a pooled copy of the working tree, never in the user's working tree itself.
+    with worktree(state.repo_path) as wt:
         try:
-            apply_patch(state.repo_path, patch_path)
+            apply_patch(wt, patch_path)
         except Exception as e:
-            return {
-                "review_findings": state.review_findings + [f"Patch apply failed: {e}"],
-                "status": "IMPLEMENTING",
-            }
+            return _patch_apply_failed_update(state, run_dir, e)
 
-        # Proof: run tests
-        test_run = run_command(
-            repo_path=state.repo_path,
-            command=".venv/Scripts/python -m pytest -q",
-            out_dir=artifacts,
-            label=f"pytest_attempt_{state.implement_attempts}",
-        )
+        # Proof: run tests (affected tests first, see _run_tests)
+        test_runs = _run_tests(state, wt, state.patch_unified_diff, artifacts, f"pytest_attempt_{state.implement_attempts}")
 
-        new_evidence = state.evidence.model_copy(deep=True)
-        new_evidence.test_runs.append(test_run)
-
-        diff_text = get_diff(state.repo_path)
-        write_text(f"{artifacts}\\git.diff.txt", diff_text)
-
-        # Save artifacts
-        write_json(f"{run_dir}\\evidence.json", new_evidence.model_dump())
-        write_json(f"{run_dir}\\decision_log.json", [e.model_dump() for e in state.decision_log])
-        write_json(f"{run_dir}\\help_requests.json", [r.model_dump() for r in state.help_requests])
-        write_json(f"{run_dir}\\help_responses.json", [r.model_dump() for r in state.help_responses])
-
-        if evidence_gate_can_finalize(test_run.exit_code):
-            dl = state.decision_log + [
-                DecisionLogEntry(
-                    event="TESTS_PASSED",
-                    actor="system",
-                    details={"exit_code": test_run.exit_code},
-                )
-            ]
-            # Log audit event
-            log_audit_event(run_dir, state.work_item_id, "TESTS_PASSED", "system", {"exit_code": test_run.exit_code})
-            return {"evidence": new_evidence, "patch_applied": True, "decision_log": dl, "status": "DELIVERING"}
-
-        dl = state.decision_log + [
-            DecisionLogEntry(
-                event="TESTS_FAILED",
-                actor="system",
-                details={"exit_code": test_run.exit_code},
-            )
-        ]
-        # Log audit event
-        log_audit_event(run_dir, state.work_item_id, "TESTS_FAILED", "system", {"exit_code": test_run.exit_code})
-        return {
-            "evidence": new_evidence,
-            "decision_log": dl,
-            "review_findings": state.review_findings + ["Tests failed; see evidence logs."],
-            "status": "IMPLEMENTING",
-        }
+        diff_text = get_diff(wt)
+    return _verify_update(state, run_dir, artifacts, test_runs, diff_text)
 
-    def n_deliver(state: WorkItemState) -> Dict[str, Any]:
-        run_dir = new_run_dir("runs", state.work_item_id)
 
-        # Log delivery start
-        log_audit_event(run_dir, state.work_item_id, "DELIVERY_STARTED", "system", {"mode": state.delivery_config.mode if state.delivery_config else "local_patch"})
+# ---------------------------------------------------------------------------
+# Async nodes: LLM calls use ainvoke, git/pytest run as asyncio subprocesses.
+# ---------------------------------------------------------------------------
 
-        # Determine delivery mode
-        config = state.delivery_config or DeliveryConfig()
+async def an_intake(state: WorkItemState) -> Dict[str, Any]:
+    return _intake_update(await aintake(state.task_raw))
 
-        # Execute delivery
-        if config.mode == "local_patch":
-            result = deliver_local_patch(state, run_dir, config)
-        elif config.mode == "github_pr":
-            result = deliver_github_pr(state, run_dir, config)
-        elif config.mode == "direct_push":
-            result = deliver_direct_push(state, run_dir, config)
-        else:
-            result = deliver_local_patch(state, run_dir, config)
 
-        # Save delivery result
-        write_json(f"{run_dir}\\delivery_result.json", result.model_dump())
+async def an_plan(state: WorkItemState) -> Dict[str, Any]:
+    memory_advice = await asyncio.to_thread(get_memory_advice, state.ticket, state.repo_path)
+    if assess_enabled():
+        plan, help_req = await aassess(state.repo_path, state.ticket)
+        return _assessed_update(state, memory_advice, plan, help_req)
+    plan = await amake_plan(state.ticket)
+    return _plan_update(state, memory_advice, plan)
 
-        # Log delivery completion
-        log_audit_event(run_dir, state.work_item_id, "DELIVERY_COMPLETED", "system", {"status": result.status, "mode": result.mode})
 
-        # Index run to memory
-        run_summary = index_run(state, run_dir)
-        save_run_summary(run_summary)
+async def an_implement(state: WorkItemState) -> Dict[str, Any]:
+    gated = _implement_gate(state)
+    if gated is not None:
+        return gated
 
-        return {
-            "delivery_result": result,
-            "status": "DELIVERED" if result.status == "delivered" else "BLOCKED"
-        }
+    decision_key = _help_decision_due(state)
+    if decision_key is not None:
+        help_req = await amaybe_request_help(state.repo_path, state.ticket, state.implement_attempts + 1, state.help_responses)
+        if help_req is not None:
+            return {**_help_requested_update(state, help_req), "help_decision_key": decision_key}
 
-    g.add_node("intake", n_intake)
-    g.add_node("plan", n_plan)
-    g.add_node("policy_check", n_policy_check)
-    g.add_node("implement", n_implement)
-    g.add_node("help", n_help)
-    g.add_node("security_scan", n_security_scan)
-    g.add_node("verify", n_verify)
-    g.add_node("deliver", n_deliver)
+    if state.speculative_candidates > 1:
+        candidates = await agenerate_patch_candidates(state.repo_path, state.ticket, state.speculative_candidates)
+        return _patch_proposed_update(state, candidates[0], candidates, decision_key)
 
-    g.set_entry_point("intake")
+    patch = await agenerate_patch(state.repo_path, state.ticket)
+    return _patch_proposed_update(state, patch, decision_key=decision_key)
 
-    def route_after_intake(state: WorkItemState):
-        if state.status == "NEEDS_INFO":
-            return END
-        return "plan"
 
-    def route_after_plan(state: WorkItemState):
-        if state.status == "POLICY_CHECK":
-            return "policy_check"
-        return "implement"
+async def an_help(state: WorkItemState) -> Dict[str, Any]:
+    gated = _help_gate(state)
+    if gated is not None:
+        return gated
 
-    def route_after_policy_check(state: WorkItemState):
-        if state.status == "BLOCKED":
-            return END
-        return "implement"
+    req = state.help_requests[len(state.help_responses)]
+    return _help_received_update(state, await aprovide_help(req))
+
+
+async def an_verify(state: WorkItemState) -> Dict[str, Any]:
+    if len(state.patch_candidates) > 1:
+        return await _averify_speculative(state)
+
+    run_dir, artifacts, patch_path = _verify_prepare(state)
+
+    async with aworktree(state.repo_path) as wt:
+        try:
+            await aapply_patch(wt, patch_path)
+        except Exception as e:
+            return _patch_apply_failed_update(state, run_dir, e)
+
+        test_runs = await _arun_tests(state, wt, state.patch_unified_diff, artifacts, f"pytest_attempt_{state.implement_attempts}")
+
+        diff_text = await aget_diff(wt)
+    return _verify_update(state, run_dir, artifacts, test_runs, diff_text)
+
+
+async def an_gates(state: WorkItemState) -> Dict[str, Any]:
+    return _gates_update(state, await arun_gates(state))
+
+
+async def an_deliver(state: WorkItemState) -> Dict[str, Any]:
+    # Delivery pushes/zips synchronously; keep it off the event loop.
+    return await asyncio.to_thread(n_deliver, state)
 
-    def route_after_implement(state: WorkItemState):
-        if state.status == "NEED_HELP":
-            return "help"
-        if state.status == "BLOCKED":
-            return END
-        return "security_scan"
-
-    def route_after_security_scan(state: WorkItemState):
-        if state.status == "BLOCKED":
-            return END
-        return "verify"
-
-    def route_after_help(state: WorkItemState):
-        if state.status in ("BLOCKED", "NEEDS_INFO"):
-            return END
-        return "implement"
 
-    def route_after_verify(state: WorkItemState):
-        if state.status == "DELIVERING":
-            return "deliver"
-        if state.status in ("BLOCKED", "NEEDS_INFO"):
-            return END
+# ---------------------------------------------------------------------------
+# Graph wiring
+# ---------------------------------------------------------------------------
+
+def route_after_intake(state: WorkItemState):
+    if state.status == "NEEDS_INFO":
+        return END
+    return "plan"
+
+
+def route_after_plan(state: WorkItemState):
+    if state.status == "POLICY_CHECK":
+        return "policy_check"
+    return "implement"
+
+
+def route_after_policy_check(state: WorkItemState):
+    if state.status == "BLOCKED":
+        return END
+    return "implement"
+
+
+def route_after_implement(state: WorkItemState):
+    if state.status == "NEED_HELP":
+        return "help"
+    if state.status == "BLOCKED":
+        return END
+    return "gates"
+
+
+def route_after_gates(state: WorkItemState):
+    if state.status == "BLOCKED":
+        return END
+    if state.status == "IMPLEMENTING":
         return "implement"
+    return "verify"
+
 
-    def route_after_deliver(state: WorkItemState):
+def route_after_help(state: WorkItemState):
+    if state.status in ("BLOCKED", "NEEDS_INFO"):
         return END
+    return "implement"
+
+
+def route_after_verify(state: WorkItemState):
+    if state.status == "DELIVERING":
+        return "deliver"
+    if state.status in ("BLOCKED", "NEEDS_INFO"):
+        return END
+    return "implement"
+
+
+def route_after_deliver(state: WorkItemState):
+    return END
+
+
+def _record_node(state: WorkItemState, spans: list, usage: List[LLMUsage]):
+    # spans already holds the tool/LLM spans; the node span was appended last.
+    repo_name = os.path.basename(state.repo_path)
+    write_trace(work_item_dir(RUNS_DIR, state.work_item_id), state.work_item_id, spans)
+    save_node_timings(state.work_item_id, repo_name, spans)
+    save_llm_usage(state.work_item_id, repo_name, usage)
+
+
+def _usage_records(name: str, state: WorkItemState, usage: List[Dict[str, Any]]) -> List[LLMUsage]:
+    return [LLMUsage(node=name, attempt=state.implement_attempts, **u) for u in usage]
+
+
+def _with_usage(update: Dict[str, Any], usage: List[LLMUsage]) -> Dict[str, Any]:
+    """Add the node's LLM usage to its update; its decision log entry carries the totals."""
+    if not usage:
+        return update
+    for entry in update.get("decision_log", [])[:1]:
+        entry.details["tokens"] = usage_totals(usage)
+    return {**update, "llm_usage": usage}
+
+
+def _traced(name: str, fn):
+    """
+    Wrap a node so it, and every span opened inside it, lands in trace.jsonl and memory.db.
+
+    Its LLM calls are counted against the work item for the response cache (see
+    llm.cache), queued under its repo by the scheduler (see llm.scheduler), and
+    their token usage is added to the state (llm_usage).
+    """
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def anode(state: WorkItemState) -> Dict[str, Any]:
+            with collect_spans() as spans, collect_usage() as usage, cache_scope(state.work_item_id), \
+                llm_scheduling(repo=state.repo_path):
+                try:
+                    with span(name, kind="node"):
+                        update = await fn(state)
+                finally:
+                    records = _usage_records(name, state, usage)
+                    _record_node(state, spans, records)
+            return _with_usage(update, records)
+        return anode
+
+    @functools.wraps(fn)
+    def node(state: WorkItemState) -> Dict[str, Any]:
+        with collect_spans() as spans, collect_usage() as usage, cache_scope(state.work_item_id), \
+                llm_scheduling(repo=state.repo_path):
+            try:
+                with span(name, kind="node"):
+                    update = fn(state)
+            finally:
+                records = _usage_records(name, state, usage)
+                _record_node(state, spans, records)
+        return _with_usage(update, records)
+    return node
+
+
+def _compile(nodes: Dict[str, Any], checkpointer=None):
+    g = StateGraph(WorkItemState)
+
+    for name, fn in nodes.items():
+        g.add_node(name, _traced(name, fn))
+
+    g.set_entry_point("intake")
 
     g.add_conditional_edges("intake", route_after_intake)
     g.add_conditional_edges("plan", route_after_plan)
     g.add_conditional_edges("policy_check", route_after_policy_check)
     g.add_conditional_edges("implement", route_after_implement)
     g.add_conditional_edges("help", route_after_help)
-    g.add_conditional_edges("security_scan", route_after_security_scan)
+    g.add_conditional_edges("gates", route_after_gates)
     g.add_conditional_edges("verify", route_after_verify)
     g.add_conditional_edges("deliver", route_after_deliver)
 
-    return g.compile()
+    return g.compile(checkpointer=checkpointer)
+
+
+def build_graph(checkpointer=None):
+    """
+    Build the sync workflow graph.
+
+    With a checkpointer (see storage.checkpoint_store), invoke with
+    thread_config(work_item_id) so the run can later be resumed.
+    """
+    return _compile({
+        "intake": n_intake,
+        "plan": n_plan,
+        "policy_check": n_policy_check,
+        "implement": n_implement,
+        "help": n_help,
+        "gates": n_gates,
+        "verify": n_verify,
+        "deliver": n_deliver,
+    }, checkpointer=checkpointer)
+
+
+def build_async_graph(checkpointer=None):
+    """
+    Same workflow as build_graph(), but every LLM/git/pytest node is a coroutine.
+
+    Drive it with `await graph.ainvoke(state)`; one event loop can then keep
+    many work items in flight without a thread per item.
+    """
+    return _compile({
+        "intake": an_intake,
+        "plan": an_plan,
+        "policy_check": n_policy_check,
+        "implement": an_implement,
+        "help": an_help,
+        "gates": an_gates,
+        "verify": an_verify,
+        "deliver": an_deliver,
+    }, checkpointer=checkpointer)
+
+
+def get_checkpointed_state(graph, work_item_id: str) -> Optional[WorkItemState]:
+    """Return the latest checkpointed state for a work item, or None if it has none."""
+    snapshot = graph.get_state(thread_config(work_item_id))
+    if not snapshot.values:
+        return None
+    return WorkItemState.model_validate(snapshot.values)
+
+
+def resume_run(work_item_id: str) -> Optional[WorkItemState]:
+    """
+    Continue a checkpointed run from its last completed node.
+
+    Returns the final state, or None if the work item has no checkpoint.
+    A run that already reached END is returned unchanged.
+    """
+    with open_checkpointer() as saver:
+        graph = build_graph(checkpointer=saver)
+        config = thread_config(work_item_id)
+
+        snapshot = graph.get_state(config)
+        if not snapshot.values:
+            return None
+        if not snapshot.next:
+            return WorkItemState.model_validate(snapshot.values)
+
+        final_dict = graph.invoke(None, config)
+        return WorkItemState.model_validate(final_dict)
 
 
 def new_state(repo_path: str, task_raw: str) -> WorkItemState:
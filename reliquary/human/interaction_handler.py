@@ -1,37 +1,111 @@
 import json
+import os
 from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 from reliquary.schemas.state import WorkItemState
 from reliquary.schemas.human_interaction import HumanAction
 from reliquary.storage.run_store import write_json
+from reliquary.storage.checkpoint_store import open_checkpointer, thread_config
+from reliquary.policy.rules import evidence_gate_can_finalize
 
 
-def process_info_provision(work_item_id: str, answer: str, run_dir: str) -> WorkItemState:
+class NotAwaitingApproval(ValueError):
+    """An approval decision for a run that isn't waiting for one."""
+
+
+def awaiting_approval(state: WorkItemState, finished: bool) -> bool:
+    """
+    Whether a human decision is what the run is waiting for.
+
+    Only a finished run whose tests passed and that the policy gate then
+    blocked qualifies; anything blocked earlier (secrets, bandit, failing
+    tests) or still in flight must not be pushed to delivery.
+
+    Args:
+        state: The run's latest state
+        finished: The run has reached the end of the graph
+
+    Returns:
+        True if approve/reject applies
+    """
+    runs = state.evidence.test_runs
+    return (
+        finished
+        and state.status == "BLOCKED"
+        and bool(runs) and evidence_gate_can_finalize(runs[-1].exit_code)
+        and state.policy_evaluation is not None and not state.policy_evaluation.passed
+    )
+
+
+def _load_paused_state(graph, work_item_id: str, run_dir: Optional[str]) -> Tuple[Optional[WorkItemState], bool]:
+    """
+    Prefer the graph checkpoint; fall back to a legacy state_paused.json.
+
+    Returns (state, from_checkpoint).
+    """
+    from reliquary.graph.workflow import get_checkpointed_state
+
+    state = get_checkpointed_state(graph, work_item_id)
+    if state is not None:
+        return state, True
+
+    if run_dir:
+        state_file = f"{run_dir}/state_paused.json"
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                return WorkItemState.model_validate(json.load(f)), False
+
+    return None, False
+
+
+def _write_checkpoint(graph, state: WorkItemState, updates: Dict[str, Any], from_checkpoint: bool, as_node: str):
+    # A legacy paused run has no checkpoint yet: seed the thread with the full state.
+    values = updates if from_checkpoint else dict(state)
+    graph.update_state(thread_config(state.work_item_id), values, as_node=as_node)
+
+
+def process_info_provision(work_item_id: str, answer: str, run_dir: Optional[str] = None) -> WorkItemState:
     """
     Process information provided by human.
 
+    The answer is folded into the ticket and written to the run's checkpoint
+    as if intake had just finished, so resume_run() continues at planning
+    without re-running intake.
+
     Args:
         work_item_id: Work item ID
         answer: Human-provided answer
-        run_dir: Run directory path
+        run_dir: Run directory path (for runs paused before checkpointing)
 
     Returns:
         Updated WorkItemState
-    """
-    # Load state
-    state_file = f"{run_dir}/state_paused.json"
-    with open(state_file, 'r') as f:
-        state_data = json.load(f)
 
-    state = WorkItemState.model_validate(state_data)
-
-    # Update ticket with provided info
-    if state.ticket:
-        state.ticket.description += f"\n\nAdditional Info: {answer}"
-
-    # Change status to resume workflow
-    state.status = "PLANNING"
-    state.blocked_reason = None
-    state.blocked_needs = []
+    Raises:
+        FileNotFoundError: If the work item has no checkpoint or paused state
+    """
+    from reliquary.graph.workflow import build_graph
+
+    with open_checkpointer() as saver:
+        graph = build_graph(checkpointer=saver)
+        state, from_checkpoint = _load_paused_state(graph, work_item_id, run_dir)
+        if state is None:
+            raise FileNotFoundError(f"No paused state for work item {work_item_id}")
+
+        # Update ticket with provided info
+        if state.ticket:
+            state.ticket.problem_statement += f"\n\nAdditional Info: {answer}"
+
+        # Change status to resume workflow
+        state.status = "PLANNING"
+        state.blocked_reason = None
+        state.blocked_needs = []
+
+        _write_checkpoint(graph, state, {
+            "ticket": state.ticket,
+            "status": state.status,
+            "blocked_reason": None,
+            "blocked_needs": [],
+        }, from_checkpoint, as_node="intake")
 
     # Log human action
     action = HumanAction(
@@ -44,48 +118,67 @@ def process_info_provision(work_item_id: str, answer: str, run_dir: str) -> Work
     )
 
     # Save updated state
-    write_json(f"{run_dir}/state_resumed.json", state.model_dump())
+    if run_dir:
+        write_json(f"{run_dir}/state_resumed.json", state.model_dump())
 
     return state
 
 
-def process_approval(work_item_id: str, approved: bool, reason: str, run_dir: str) -> WorkItemState:
+def process_approval(work_item_id: str, approved: bool, reason: str, run_dir: Optional[str] = None) -> WorkItemState:
     """
     Process human approval/rejection.
 
+    The decision is written to the run's checkpoint as the outcome of
+    verification, so resume_run() goes straight to delivery when approved.
+
     Args:
         work_item_id: Work item ID
         approved: Whether approved
         reason: Reason for decision
-        run_dir: Run directory path
+        run_dir: Run directory path (for runs paused before checkpointing)
 
     Returns:
         Updated WorkItemState
-    """
-    # Load state
-    state_file = f"{run_dir}/state_paused.json"
-    with open(state_file, 'r') as f:
-        state_data = json.load(f)
 
-    state = WorkItemState.model_validate(state_data)
-
-    # Log human action
-    action = HumanAction(
-        action_id=f"{work_item_id}_approval",
-        work_item_id=work_item_id,
-        actor="human",
-        action_type="approve" if approved else "reject",
-        timestamp=datetime.utcnow().isoformat(),
-        details={"reason": reason}
-    )
-
-    if approved:
-        state.status = "DELIVERING"
-    else:
-        state.status = "BLOCKED"
-        state.blocked_reason = f"Human rejected: {reason}"
+    Raises:
+        FileNotFoundError: If the work item has no checkpoint or paused state
+        NotAwaitingApproval: If the run isn't waiting for approval (see awaiting_approval)
+    """
+    from reliquary.graph.workflow import build_graph
+
+    with open_checkpointer() as saver:
+        graph = build_graph(checkpointer=saver)
+        state, from_checkpoint = _load_paused_state(graph, work_item_id, run_dir)
+        if state is None:
+            raise FileNotFoundError(f"No paused state for work item {work_item_id}")
+        # A legacy paused state was saved by a run that had stopped.
+        finished = not graph.get_state(thread_config(work_item_id)).next if from_checkpoint else True
+        if not awaiting_approval(state, finished):
+            raise NotAwaitingApproval(f"Work item {work_item_id} is not awaiting approval ({state.status})")
+
+        # Log human action
+        action = HumanAction(
+            action_id=f"{work_item_id}_approval",
+            work_item_id=work_item_id,
+            actor="human",
+            action_type="approve" if approved else "reject",
+            timestamp=datetime.utcnow().isoformat(),
+            details={"reason": reason}
+        )
+
+        if approved:
+            state.status = "DELIVERING"
+        else:
+            state.status = "BLOCKED"
+            state.blocked_reason = f"Human rejected: {reason}"
+
+        _write_checkpoint(graph, state, {
+            "status": state.status,
+            "blocked_reason": state.blocked_reason,
+        }, from_checkpoint, as_node="verify")
 
     # Save updated state
-    write_json(f"{run_dir}/state_after_approval.json", state.model_dump())
+    if run_dir:
+        write_json(f"{run_dir}/state_after_approval.json", state.model_dump())
 
     return state
@@ -0,0 +1 @@
+# LLM client layer for Reliquary of Truth
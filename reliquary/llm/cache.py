@@ -0,0 +1,170 @@
+"""
+Disk cache of LLM responses, selected with RELIQUARY_LLM_CACHE (or --llm-cache):
+
+- record: answer from the cache when possible, otherwise call the model and store the response
+- replay: answer only from the cache; a miss raises LLMCacheMiss, so a run never touches the network
+- off: no caching (default)
+
+Entries are keyed by model, parameters and messages, plus an occurrence index:
+the nth identical request within a work item maps to the nth stored response.
+A retry that re-sends an identical prompt therefore still gets a fresh answer
+while recording, and replay reproduces the recorded sequence. Occurrences are
+counted per process, so a run resumed in a new process starts counting again.
+
+Entries expire after RELIQUARY_LLM_CACHE_TTL_S when recording (replay ignores
+the TTL), and the least recently used ones are evicted above
+RELIQUARY_LLM_CACHE_MAX_MB.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from reliquary.storage.cache_store import get_cache_dir
+
+MODES = ("record", "replay", "off")
+
+# Work item the current LLM calls belong to; occurrences are counted per scope
+_scope: ContextVar[str] = ContextVar("reliquary_llm_cache_scope", default="")
+
+_occurrence_lock = threading.Lock()
+_occurrences: Dict[Tuple[str, str], int] = {}
+
+
+class LLMCacheMiss(RuntimeError):
+    """A replayed run sent a request that was never recorded."""
+
+
+def cache_mode() -> str:
+    mode = os.getenv("RELIQUARY_LLM_CACHE", "off").lower()
+    if mode not in MODES:
+        raise ValueError(f"RELIQUARY_LLM_CACHE must be one of {', '.join(MODES)}, got {mode!r}")
+    return mode
+
+
+@contextmanager
+def cache_scope(name: str):
+    """Count identical requests made inside this block (one work item) separately from others."""
+    token = _scope.set(name)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def request_key(model: str, params: Dict[str, Any], messages: Any) -> str:
+    payload = json.dumps({"model": model, "params": params, "messages": messages}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def next_occurrence(key: str) -> int:
+    """Index of this request among identical ones in the current scope (0 for the first)."""
+    with _occurrence_lock:
+        slot = (_scope.get(), key)
+        n = _occurrences.get(slot, 0)
+        _occurrences[slot] = n + 1
+        return n
+
+
+class LLMResponseCache:
+    """SQLite store of serialized responses with TTL expiry and size-based LRU eviction."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_cache_dir("llm"), "responses.db")
+        self.ttl_s = float(os.getenv("RELIQUARY_LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+        self.max_bytes = int(float(os.getenv("RELIQUARY_LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT NOT NULL,
+                    occurrence INTEGER NOT NULL,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    PRIMARY KEY (key, occurrence)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache(last_used_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per operation: safe across threads and processes.
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str, occurrence: int, ignore_ttl: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Look up a stored response.
+
+        Args:
+            key: request_key() of the request
+            occurrence: next_occurrence() of the request
+            ignore_ttl: Serve expired entries too (replay)
+
+        Returns:
+            The serialized response, or None on a miss
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ? AND occurrence = ?",
+                (key, occurrence),
+            ).fetchone()
+            if row is None:
+                return None
+            if not ignore_ttl and self.ttl_s > 0 and now - row[1] > self.ttl_s:
+                return None
+            conn.execute(
+                "UPDATE llm_cache SET last_used_at = ? WHERE key = ? AND occurrence = ?",
+                (now, key, occurrence),
+            )
+        return json.loads(row[0])
+
+    def put(self, key: str, occurrence: int, model: str, response: Dict[str, Any]) -> None:
+        data = json.dumps(response, default=str)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, occurrence, model, data, len(data), now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT key, occurrence, size FROM llm_cache ORDER BY last_used_at").fetchall()
+        doomed = []
+        for key, occurrence, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key, occurrence))
+            total -= size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ? AND occurrence = ?", doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size}
+
+
+_caches: Dict[str, LLMResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache() -> LLMResponseCache:
+    """The cache in the current cache dir (RELIQUARY_CACHE_DIR), opened once per process."""
+    path = os.path.join(get_cache_dir("llm"), "responses.db")
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = LLMResponseCache(path)
+        return cache
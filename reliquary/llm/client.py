@@ -0,0 +1,400 @@
+"""
+Shared chat-model clients.
+
+Building a ChatOpenAI creates a fresh OpenAI client with its own HTTP
+connection pool, so constructing one per call throws away keep-alive and TLS
+sessions. The registry keeps one long-lived client per model and parameters,
+all on a shared, tuned httpx pool, for every node and concurrent work item in
+the process. Each call is timed: an "llm.request" span on the current trace
+and process-wide latency stats (client_stats()), and its token usage is
+reported to llm.usage. Calls go through the response cache (see llm.cache)
+unless RELIQUARY_LLM_CACHE is off, and the ones that reach the provider wait
+for a slot from the scheduler (see llm.scheduler), which also retries them.
+
+invoke_streaming()/ainvoke_streaming() hand the answer text to a callback as
+it arrives, and stop reading (which ends the generation) when the callback
+asks to. Streamed and plain calls share cache entries.
+
+OPENAI_BASE_URL points every client at another OpenAI-compatible endpoint
+(e.g. a local stand-in server in tests).
+"""
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessageChunk, BaseMessage, message_to_dict, messages_from_dict
+from langchain_openai import ChatOpenAI
+
+from reliquary.llm.cache import LLMCacheMiss, cache_mode, get_response_cache, next_occurrence, request_key
+from reliquary.llm.scheduler import estimate_tokens, get_scheduler, reset_scheduler
+from reliquary.llm.usage import record_usage
+from reliquary.storage.trace_store import current_span_name, span
+
+load_dotenv()
+
+# Latency samples kept per model for client_stats()
+MAX_LATENCY_SAMPLES = 1000
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+# httpx.AsyncClient pools are bound to the event loop that opened them
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_models: Dict[Tuple, "PooledChatModel"] = {}
+_latencies: Dict[str, List[float]] = {}
+_calls: Dict[str, int] = {}
+_errors: Dict[str, int] = {}
+# Builds the chat models instead of ChatOpenAI when set (see set_chat_model_factory)
+_factory: Optional[Callable[..., Any]] = None
+
+# Receives each piece of streamed text; returns True to stop reading
+OnText = Callable[[str], Union[bool, Awaitable[bool]]]
+
+
+def default_model() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+def _limits() -> httpx.Limits:
+    max_connections = int(os.getenv("RELIQUARY_LLM_MAX_CONNECTIONS", "64"))
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=120.0,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(float(os.getenv("RELIQUARY_LLM_TIMEOUT_S", "120")), connect=10.0)
+
+
+def _sync_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits(), timeout=_timeout())
+    return _http_client
+
+
+def _async_http_client(loop: asyncio.AbstractEventLoop) -> httpx.AsyncClient:
+    client = _async_http_clients.get(loop)
+    if client is None:
+        client = _async_http_clients[loop] = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+    return client
+
+
+def _record(model: str, seconds: float, failed: bool) -> None:
+    with _lock:
+        samples = _latencies.setdefault(model, [])
+        samples.append(seconds * 1000)
+        del samples[:-MAX_LATENCY_SAMPLES]
+        _calls[model] = _calls.get(model, 0) + 1
+        if failed:
+            _errors[model] = _errors.get(model, 0) + 1
+
+
+class PooledChatModel:
+    """
+    A registry-owned ChatOpenAI; invoke/ainvoke are timed and go through the response cache.
+
+    The ChatOpenAI itself is built on first use, so a fully replayed run
+    (RELIQUARY_LLM_CACHE=replay) needs no API key or network.
+    """
+
+    def __init__(self, model: str, params: Dict[str, Any], factory: Callable[[], ChatOpenAI]):
+        self.model = model
+        self.params = params
+        self._factory = factory
+        self._llm: Optional[ChatOpenAI] = None
+        self._llm_lock = threading.Lock()
+
+    @property
+    def llm(self) -> ChatOpenAI:
+        with self._llm_lock:
+            if self._llm is None:
+                self._llm = self._factory()
+            return self._llm
+
+    def _cached(self, messages: Any, kwargs: Dict[str, Any]) -> Tuple[str, Optional[Tuple[str, int]], Any]:
+        """(mode, cache slot, cached response or None) for this request."""
+        mode = cache_mode()
+        if mode == "off":
+            return mode, None, None
+        key = request_key(self.model, {**self.params, **kwargs}, messages)
+        occurrence = next_occurrence(key)
+        data = get_response_cache().get(key, occurrence, ignore_ttl=mode == "replay")
+        if data is None and mode == "replay":
+            raise LLMCacheMiss(f"No recorded response for {self.model} request {key[:12]} (occurrence {occurrence})")
+        return mode, (key, occurrence), messages_from_dict([data])[0] if data is not None else None
+
+    def _store(self, mode: str, slot: Optional[Tuple[str, int]], result: Any) -> None:
+        if mode == "record" and slot is not None and isinstance(result, BaseMessage):
+            get_response_cache().put(slot[0], slot[1], self.model, message_to_dict(result))
+
+    def _usage(self, s: Dict[str, Any], stage: Optional[str], result: Any, cached: bool) -> None:
+        usage = record_usage(self.model, stage or "llm", result, cached=cached)
+        s["prompt_tokens"] = usage["prompt_tokens"]
+        s["completion_tokens"] = usage["completion_tokens"]
+
+    def invoke(self, messages: Any, **kwargs: Any) -> Any:
+        stage = current_span_name()
+        with span("llm.request", kind="llm", model=self.model) as s:
+            mode, slot, hit = self._cached(messages, kwargs)
+            s["cached"] = hit is not None
+            if hit is not None:
+                self._usage(s, stage, hit, cached=True)
+                return hit
+            def call() -> Any:
+                started = time.perf_counter()
+                failed = True
+                try:
+                    answer = self.llm.invoke(messages, **kwargs)
+                    failed = False
+                    return answer
+                finally:
+                    _record(self.model, time.perf_counter() - started, failed)
+
+            result = get_scheduler().run(call, stage, estimate_tokens(messages), s)
+            self._usage(s, stage, result, cached=False)
+        self._store(mode, slot, result)
+        return result
+
+    async def ainvoke(self, messages: Any, **kwargs: Any) -> Any:
+        stage = current_span_name()
+        with span("llm.request", kind="llm", model=self.model) as s:
+            mode, slot, hit = self._cached(messages, kwargs)
+            s["cached"] = hit is not None
+            if hit is not None:
+                self._usage(s, stage, hit, cached=True)
+                return hit
+            async def call() -> Any:
+                started = time.perf_counter()
+                failed = True
+                try:
+                    answer = await self.llm.ainvoke(messages, **kwargs)
+                    failed = False
+                    return answer
+                finally:
+                    _record(self.model, time.perf_counter() - started, failed)
+
+            result = await get_scheduler().arun(call, stage, estimate_tokens(messages), s)
+            self._usage(s, stage, result, cached=False)
+        self._store(mode, slot, result)
+        return result
+
+    def _stream_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # OpenAI only reports the usage of a streamed answer when asked to
+        return {**kwargs, "stream_usage": True} if isinstance(self.llm, ChatOpenAI) else kwargs
+
+    def invoke_streaming(self, messages: Any, on_text: Callable[[str], bool], **kwargs: Any) -> Any:
+        """
+        Like invoke(), handing the answer text to on_text as it arrives.
+
+        Args:
+            messages: Chat messages
+            on_text: Called with each new piece of text; returning True stops
+                reading, which ends the generation
+            **kwargs: Call parameters (as for invoke())
+
+        Returns:
+            The answer (only what arrived before on_text stopped it)
+        """
+        stage = current_span_name()
+        with span("llm.request", kind="llm", model=self.model, stream=True) as s:
+            mode, slot, hit = self._cached(messages, kwargs)
+            s["cached"] = hit is not None
+            if hit is not None:
+                self._usage(s, stage, hit, cached=True)
+                on_text(hit.content)
+                return hit
+            # A failure can only be retried before any text has been handed on
+            delivered = []
+
+            def call() -> Any:
+                started = time.perf_counter()
+                failed = True
+                answer = None
+                try:
+                    if hasattr(self.llm, "stream"):
+                        chunks = self.llm.stream(messages, **self._stream_kwargs(kwargs))
+                        try:
+                            for chunk in chunks:
+                                answer = chunk if answer is None else answer + chunk
+                                s.setdefault("first_token_ms", round((time.perf_counter() - started) * 1000, 3))
+                                if chunk.content:
+                                    delivered.append(True)
+                                    if on_text(chunk.content):
+                                        s["stopped"] = True
+                                        break
+                        finally:
+                            # Closing the stream early drops the connection, ending the generation
+                            chunks.close()
+                    else:
+                        # Stand-in models without streaming answer in one piece
+                        answer = self.llm.invoke(messages, **kwargs)
+                        delivered.append(True)
+                        on_text(answer.content)
+                    failed = False
+                finally:
+                    _record(self.model, time.perf_counter() - started, failed)
+                return answer if answer is not None else AIMessageChunk(content="")
+
+            result = get_scheduler().run(call, stage, estimate_tokens(messages), s, can_retry=lambda: not delivered)
+            self._usage(s, stage, result, cached=False)
+        self._store(mode, slot, result)
+        return result
+
+    async def ainvoke_streaming(self, messages: Any, on_text: OnText, **kwargs: Any) -> Any:
+        """Async variant of invoke_streaming(); on_text may be a coroutine function."""
+        async def handle(text: str) -> bool:
+            stop = on_text(text)
+            return bool(await stop) if inspect.isawaitable(stop) else bool(stop)
+
+        stage = current_span_name()
+        with span("llm.request", kind="llm", model=self.model, stream=True) as s:
+            mode, slot, hit = self._cached(messages, kwargs)
+            s["cached"] = hit is not None
+            if hit is not None:
+                self._usage(s, stage, hit, cached=True)
+                await handle(hit.content)
+                return hit
+            delivered = []
+
+            async def call() -> Any:
+                started = time.perf_counter()
+                failed = True
+                answer = None
+                try:
+                    if hasattr(self.llm, "astream"):
+                        chunks = self.llm.astream(messages, **self._stream_kwargs(kwargs))
+                        try:
+                            async for chunk in chunks:
+                                answer = chunk if answer is None else answer + chunk
+                                s.setdefault("first_token_ms", round((time.perf_counter() - started) * 1000, 3))
+                                if chunk.content:
+                                    delivered.append(True)
+                                    if await handle(chunk.content):
+                                        s["stopped"] = True
+                                        break
+                        finally:
+                            await chunks.aclose()
+                    else:
+                        answer = await self.llm.ainvoke(messages, **kwargs)
+                        delivered.append(True)
+                        await handle(answer.content)
+                    failed = False
+                finally:
+                    _record(self.model, time.perf_counter() - started, failed)
+                return answer if answer is not None else AIMessageChunk(content="")
+
+            result = await get_scheduler().arun(call, stage, estimate_tokens(messages), s,
+                                                can_retry=lambda: not delivered)
+            self._usage(s, stage, result, cached=False)
+        self._store(mode, slot, result)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+
+def get_chat_model(model: Optional[str] = None, temperature: float = 0, **params: Any) -> PooledChatModel:
+    """
+    The shared client for a model and parameter set, created on first use.
+
+    Args:
+        model: Model name (default OPENAI_MODEL, else gpt-4o-mini)
+        temperature: Sampling temperature
+        **params: Further ChatOpenAI parameters (part of the registry key)
+
+    Returns:
+        PooledChatModel with invoke()/ainvoke()
+    """
+    model = model or default_model()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    base_url = os.getenv("OPENAI_BASE_URL") or None
+    key = (model, temperature, base_url, tuple(sorted(params.items())), id(loop) if loop else None)
+
+    with _lock:
+        pooled = _models.get(key)
+        if pooled is None:
+            kwargs: Dict[str, Any] = {}
+            if _factory is None:
+                kwargs["http_client"] = _sync_http_client()
+                # Retries are made by the scheduler, which backs every call off on a 429
+                if "max_retries" not in params:
+                    kwargs["max_retries"] = 0
+                if loop is not None:
+                    kwargs["http_async_client"] = _async_http_client(loop)
+                if base_url:
+                    kwargs["base_url"] = base_url
+            if loop is not None:
+                # Entries for a finished loop go with it (ids can be reused)
+                weakref.finalize(loop, _models.pop, key, None)
+            pooled = _models[key] = PooledChatModel(
+                model,
+                {"temperature": temperature, **params},
+                functools.partial(_factory or ChatOpenAI, model=model, temperature=temperature, **kwargs, **params),
+            )
+        return pooled
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 3)
+
+
+def client_stats() -> List[Dict[str, Any]]:
+    """
+    Per-model call latency since process start.
+
+    Returns:
+        List of {model, calls, errors, p50_ms, p95_ms, mean_ms} (latency over the last samples)
+    """
+    with _lock:
+        stats = []
+        for model, samples in sorted(_latencies.items()):
+            values = sorted(samples)
+            stats.append({
+                "model": model,
+                "calls": _calls.get(model, 0),
+                "errors": _errors.get(model, 0),
+                "p50_ms": _percentile(values, 50),
+                "p95_ms": _percentile(values, 95),
+                "mean_ms": round(sum(values) / len(values), 3),
+            })
+        return stats
+
+
+def set_chat_model_factory(factory: Optional[Callable[..., Any]]) -> None:
+    """
+    Build chat models with factory(model=..., temperature=..., **params) instead of ChatOpenAI.
+
+    Used to run the workflow against a scripted stand-in model (see reliquary.bench).
+    Pooled clients are dropped so the next call picks the factory up.
+
+    Args:
+        factory: Returns an object with invoke()/ainvoke(); None restores ChatOpenAI
+    """
+    global _factory
+    reset_clients()
+    _factory = factory
+
+
+def reset_clients() -> None:
+    """Drop every pooled client and the scheduler (e.g. after changing OPENAI_BASE_URL, pool settings or limits)."""
+    global _http_client
+    reset_scheduler()
+    with _lock:
+        _models.clear()
+        _async_http_clients.clear()
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
@@ -0,0 +1,456 @@
+"""
+Process-wide scheduling of LLM requests.
+
+Every provider call made by a pooled client (see llm.client) waits here for
+a slot. Cache hits don't, because they never reach the provider. A slot is
+granted when all of the following hold:
+- fewer than RELIQUARY_LLM_CONCURRENCY calls are in flight;
+- the requests-per-minute bucket (RELIQUARY_LLM_RPM) has room;
+- the tokens-per-minute bucket (RELIQUARY_LLM_TPM) has room.
+A limit of 0 turns that check off.
+
+Waiting calls are served by priority class, then round-robin across repos,
+so one repo's burst can't starve another's calls:
+- "interactive": intake and specialist help;
+- "normal": the rest of a single run (planning, patches);
+- "bulk": batch runs (see llm_scheduling()), whose intake and help
+  rank as normal.
+
+The token bucket is charged with an estimate of the prompt up front, and
+settled against the usage the provider reports. A 429 pauses every call (for
+Retry-After if given, else exponential backoff) before the request goes
+back to the queue. Other transient failures (timeouts, dropped connections,
+5xx) are retried by themselves. At most RELIQUARY_LLM_MAX_RETRIES retries
+are made per call.
+
+scheduler_stats() reports queue depth, wait times and throttling.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+import openai
+
+from reliquary.llm.usage import token_usage
+
+T = TypeVar("T")
+
+PRIORITIES = ("interactive", "normal", "bulk")
+
+# Agent prompts (span names) that someone is waiting on
+INTERACTIVE_STAGES = {"llm.intake", "llm.helper", "llm.help_decider"}
+
+# Wait samples kept per priority class for scheduler_stats()
+MAX_WAIT_SAMPLES = 1000
+
+# First backoff after a 429 without Retry-After; doubles per retry
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 60.0
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("reliquary_llm_scheduling", default={})
+
+_lock = threading.Lock()
+_scheduler: Optional["LLMScheduler"] = None
+
+
+@contextmanager
+def llm_scheduling(repo: Optional[str] = None, bulk: Optional[bool] = None):
+    """
+    Attribute the LLM calls made in this context to a repo and/or to bulk (batch) work.
+
+    Args:
+        repo: Repo the calls are made for (fair queuing key)
+        bulk: Calls are part of a batch run and yield to interactive runs
+    """
+    values = dict(_context.get())
+    if repo is not None:
+        values["repo"] = repo
+    if bulk is not None:
+        values["bulk"] = bulk
+    token = _context.set(values)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def call_priority(stage: Optional[str]) -> str:
+    """Priority class of a call made by the agent prompt `stage` in the current context."""
+    level = (0 if stage in INTERACTIVE_STAGES else 1) + (1 if _context.get().get("bulk") else 0)
+    return PRIORITIES[level]
+
+
+def estimate_tokens(messages: Any) -> int:
+    """Rough prompt size (4 characters per token), charged to the TPM bucket before the call."""
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    chars = 0
+    for m in messages or []:
+        content = m[1] if isinstance(m, (tuple, list)) else getattr(m, "content", m)
+        chars += len(content) if isinstance(content, str) else len(str(content))
+    return chars // 4 + 1
+
+
+def _limit(name: str, default: str) -> int:
+    return max(0, int(os.getenv(name, default)))
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `per_minute` per minute, up to one minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_s(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 when it is now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        # Negative amounts (usage above the estimate) leave the bucket in debt
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Ticket:
+    def __init__(self, priority: str, repo: str, tokens: int, loop: Optional[asyncio.AbstractEventLoop]):
+        self.priority = priority
+        self.repo = repo
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.charged = 0
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future: Optional[asyncio.Future] = loop.create_future() if loop is not None else None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _status(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    """Admits provider calls under the concurrency, RPM and TPM limits, by priority and repo."""
+
+    def __init__(self, concurrency: int = 16, rpm: int = 0, tpm: int = 0, max_retries: int = 2):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.rpm = _Bucket(rpm) if rpm else None
+        self.tpm = _Bucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+        # priority -> repo -> waiting tickets; repos are served round-robin (OrderedDict order)
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._active = 0
+        self._paused_until = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_at = 0.0
+        self._waits: Dict[str, List[float]] = {p: [] for p in PRIORITIES}
+        self._calls: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._throttled = 0
+        self._rate_limited = 0
+        self._retries = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            concurrency=_limit("RELIQUARY_LLM_CONCURRENCY", "16"),
+            rpm=_limit("RELIQUARY_LLM_RPM", "0"),
+            tpm=_limit("RELIQUARY_LLM_TPM", "0"),
+            max_retries=_limit("RELIQUARY_LLM_MAX_RETRIES", "2"),
+        )
+
+    # Queue
+
+    def _next(self) -> Optional[_Ticket]:
+        for priority in PRIORITIES:
+            repos = self._queues[priority]
+            if repos:
+                return repos[next(iter(repos))][0]
+        return None
+
+    def _pop(self, ticket: _Ticket) -> None:
+        repos = self._queues[ticket.priority]
+        waiting = repos[ticket.repo]
+        waiting.popleft()
+        # The repo goes to the back of the rotation (or leaves it when it has nothing queued)
+        del repos[ticket.repo]
+        if waiting:
+            repos[ticket.repo] = waiting
+
+    def _dispatch(self) -> None:
+        """Grant slots to waiting tickets while the limits allow (called with the lock held)."""
+        while self.concurrency == 0 or self._active < self.concurrency:
+            ticket = self._next()
+            if ticket is None:
+                return
+            now = time.monotonic()
+            wait = max(
+                self._paused_until - now,
+                self.rpm.wait_s(1, now) if self.rpm else 0.0,
+                self.tpm.wait_s(ticket.tokens, now) if self.tpm else 0.0,
+            )
+            if wait > 0:
+                self._throttled += 1
+                self._wake_in(wait)
+                return
+            self._pop(ticket)
+            if self.rpm:
+                self.rpm.take(1)
+            if self.tpm:
+                self.tpm.take(ticket.tokens)
+                ticket.charged = ticket.tokens
+            self._active += 1
+            ticket.granted = True
+            samples = self._waits[ticket.priority]
+            samples.append((now - ticket.enqueued) * 1000)
+            del samples[:-MAX_WAIT_SAMPLES]
+            self._calls[ticket.priority] += 1
+            ticket.wake()
+
+    def _wake_in(self, seconds: float) -> None:
+        at = time.monotonic() + seconds
+        if self._timer is not None and self._timer_at <= at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(seconds, self._on_timer)
+        self._timer.daemon = True
+        self._timer_at = at
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _enqueue(self, ticket: _Ticket, first: bool = False) -> None:
+        with self._lock:
+            waiting = self._queues[ticket.priority].setdefault(ticket.repo, deque())
+            # A retried call keeps its place at the front of its repo's line
+            waiting.appendleft(ticket) if first else waiting.append(ticket)
+            self._dispatch()
+
+    def _cancel(self, ticket: _Ticket) -> None:
+        with self._lock:
+            if ticket.granted:
+                self._release_locked(ticket, 0)
+                return
+            repos = self._queues[ticket.priority]
+            waiting = repos.get(ticket.repo)
+            if waiting is not None and ticket in waiting:
+                waiting.remove(ticket)
+                if not waiting:
+                    del repos[ticket.repo]
+
+    def _release_locked(self, ticket: _Ticket, used_tokens: int) -> None:
+        self._active -= 1
+        if self.tpm and ticket.charged:
+            self.tpm.give(ticket.charged - used_tokens)
+        self._dispatch()
+
+    def _release(self, ticket: _Ticket, result: Any) -> None:
+        used = 0
+        if result is not None:
+            # Answers without reported usage keep the estimate
+            used = sum(token_usage(result)) or ticket.charged
+        with self._lock:
+            self._release_locked(ticket, used)
+
+    # Retries
+
+    def _retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Backoff before retrying a failed call, or None when it shouldn't be retried."""
+        if attempt >= self.max_retries:
+            return None
+        status = _status(error)
+        transient = isinstance(error, openai.APIConnectionError) or status in (408, 409) or (status or 0) >= 500
+        if status != 429 and not transient:
+            return None
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt) * (0.5 + random.random() / 2)
+        with self._lock:
+            self._retries += 1
+            if status == 429:
+                # The provider's limit is shared: hold every call back, not just this one
+                self._rate_limited += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                return 0.0
+        return delay
+
+    def run(self, call: Callable[[], T], stage: Optional[str], tokens: int, s: Optional[Dict[str, Any]] = None,
+            can_retry: Callable[[], bool] = lambda: True) -> T:
+        """
+        Make a provider call once a slot is granted, retrying rate-limited and transient failures.
+
+        Args:
+            call: Makes the request
+            stage: Agent prompt making it (its span name), for the priority class
+            tokens: Estimated prompt tokens (see estimate_tokens())
+            s: Attributes of the call's span; priority, queue_ms and retries are recorded there
+            can_retry: False once a failed attempt can't be repeated (e.g. streamed text was used)
+
+        Returns:
+            What call returned
+        """
+        s = s if s is not None else {}
+        priority = call_priority(stage)
+        s["priority"] = priority
+        queued_ms = 0.0
+        attempt = 0
+        while True:
+            ticket = _Ticket(priority, _context.get().get("repo", ""), tokens, None)
+            self._enqueue(ticket, first=attempt > 0)
+            ticket.event.wait()
+            queued_ms += (time.monotonic() - ticket.enqueued) * 1000
+            s["queue_ms"] = round(queued_ms, 3)
+            result = None
+            try:
+                result = call()
+                return result
+            except Exception as e:
+                delay = self._retry_delay(e, attempt) if can_retry() else None
+                if delay is None:
+                    raise
+            finally:
+                self._release(ticket, result)
+            attempt += 1
+            s["retries"] = attempt
+            time.sleep(delay)
+
+    async def arun(self, call: Callable[[], Awaitable[T]], stage: Optional[str], tokens: int,
+                   s: Optional[Dict[str, Any]] = None, can_retry: Callable[[], bool] = lambda: True) -> T:
+        """Async variant of run(); waiting doesn't block the event loop."""
+        s = s if s is not None else {}
+        priority = call_priority(stage)
+        s["priority"] = priority
+        queued_ms = 0.0
+        attempt = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            ticket = _Ticket(priority, _context.get().get("repo", ""), tokens, loop)
+            self._enqueue(ticket, first=attempt > 0)
+            try:
+                await ticket.future
+            except BaseException:
+                self._cancel(ticket)
+                raise
+            queued_ms += (time.monotonic() - ticket.enqueued) * 1000
+            s["queue_ms"] = round(queued_ms, 3)
+            result = None
+            try:
+                result = await call()
+                return result
+            except Exception as e:
+                delay = self._retry_delay(e, attempt) if can_retry() else None
+                if delay is None:
+                    raise
+            finally:
+                self._release(ticket, result)
+            attempt += 1
+            s["retries"] = attempt
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_priority = []
+            for priority in PRIORITIES:
+                values = sorted(self._waits[priority])
+                by_priority.append({
+                    "priority": priority,
+                    "queued": sum(len(w) for w in self._queues[priority].values()),
+                    "calls": self._calls[priority],
+                    "p50_wait_ms": _percentile(values, 50),
+                    "p95_wait_ms": _percentile(values, 95),
+                    "max_wait_ms": round(values[-1], 3) if values else 0.0,
+                })
+            return {
+                "limits": {
+                    "concurrency": self.concurrency,
+                    "rpm": int(self.rpm.capacity) if self.rpm else 0,
+                    "tpm": int(self.tpm.capacity) if self.tpm else 0,
+                },
+                "active": self._active,
+                "queued": sum(p["queued"] for p in by_priority),
+                "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                "throttled": self._throttled,
+                "rate_limited": self._rate_limited,
+                "retries": self._retries,
+                "by_priority": by_priority,
+            }
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 3)
+
+
+def get_scheduler() -> LLMScheduler:
+    """The process-wide scheduler, configured from the environment on first use."""
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler.from_env()
+        return _scheduler
+
+
+def reset_scheduler() -> None:
+    """Drop the scheduler so the next call reads the limits again (calls in flight finish on the old one)."""
+    global _scheduler
+    with _lock:
+        _scheduler = None
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    """
+    Queue depth, wait times and throttling since the scheduler was created.
+
+    Returns:
+        {limits, active, queued, paused_s, throttled, rate_limited, retries,
+         by_priority: [{priority, queued, calls, p50_wait_ms, p95_wait_ms, max_wait_ms}]}
+    """
+    return get_scheduler().stats()
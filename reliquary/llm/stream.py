@@ -0,0 +1,80 @@
+"""
+Incremental parsing of streamed JSON answers.
+
+Patch answers are {"files": [...]} or {"edits": [...]} objects. JSONArrayStream
+picks the entries of one top-level array out of the text as it arrives, so
+each entry can be diffed and checked while the model is still writing the
+rest. Text around the object (e.g. code fences) is ignored.
+"""
+import json
+from typing import Any, List, Optional
+
+
+class JSONArrayStream:
+    """Yields the entries of the top-level array under `key` as each one completes."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ""
+        # True once the array has been closed
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # Last string seen directly inside the top-level object (the current key)
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._entry_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Add streamed text.
+
+        Args:
+            chunk: Next piece of the answer
+
+        Returns:
+            Array entries completed by this chunk, decoded
+
+        Raises:
+            ValueError: A completed entry is not valid JSON
+        """
+        self.text += chunk
+        entries = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = json.loads(text[self._string_start:i + 1])
+                continue
+            if c == '"':
+                if self._depth > 0:
+                    self._in_string = True
+                    self._string_start = i
+            elif c in "{[":
+                if self._depth == 1 and c == "[" and self._last_key == self.key and not self.done:
+                    self._array_depth = 2
+                elif self._array_depth is not None and self._depth == self._array_depth:
+                    self._entry_start = i
+                self._depth += 1
+            elif c in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._array_depth is None:
+                    continue
+                if self._depth == self._array_depth and self._entry_start is not None:
+                    entries.append(json.loads(text[self._entry_start:i + 1]))
+                    self._entry_start = None
+                elif self._depth == self._array_depth - 1:
+                    self._array_depth = None
+                    self.done = True
+        self._pos = len(text)
+        return entries
@@ -0,0 +1,359 @@
+"""
+Structured (JSON) answers from the model, validated against pydantic schemas.
+
+An answer is first repaired locally where that is unambiguous: code fences
+and prose around the JSON are dropped, and the following are fixed:
+- trailing commas;
+- Python literals (True/None, single quotes);
+- a truncated tail.
+Only what is still invalid after that goes back to the model. Fields that
+fail validation are asked for on their own (a single list entry, such as
+files[2], where the error is inside one), and merged into the rest of the
+answer. Only an answer that isn't JSON at all is asked for in full.
+RELIQUARY_LLM_REASKS bounds the extra calls per answer (default 1).
+
+Repairs and re-asks are recorded on the caller's span ("repairs", "reasks").
+"""
+import ast
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+_FENCE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)```", re.DOTALL)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class StructuredOutputError(ValueError):
+    """The model's answer still doesn't fit the schema after repairs and re-asks."""
+
+
+def max_reasks() -> int:
+    return max(0, int(os.getenv("RELIQUARY_LLM_REASKS", "1")))
+
+
+def _strings_masked(text: str) -> str:
+    """text with the inside of every JSON string replaced by spaces (same length), for structural edits."""
+    out = []
+    in_string = escape = False
+    for c in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+                out.append(c)
+                continue
+            out.append(" ")
+        else:
+            in_string = c == '"'
+            out.append(c)
+    return "".join(out)
+
+
+def _strip_fences(text: str) -> str:
+    match = _FENCE.search(text)
+    if match:
+        return match.group(1).strip()
+    # An opening fence without its closing one (truncated answer)
+    return re.sub(r"^```[a-zA-Z]*\s*\n?", "", text).strip()
+
+
+def _extract(text: str) -> str:
+    """The first JSON object or array in text, up to its closing bracket (or the end, if truncated)."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    masked = _strings_masked(text)
+    depth = 0
+    for i in range(start, len(text)):
+        if masked[i] in "{[":
+            depth += 1
+        elif masked[i] in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _drop_trailing_commas(text: str) -> str:
+    masked = _strings_masked(text)
+    drop = {m.start() for m in re.finditer(r",(?=\s*[}\]])", masked)}
+    return "".join(c for i, c in enumerate(text) if i not in drop)
+
+
+def _json_literals(text: str) -> str:
+    masked = _strings_masked(text)
+    out = list(text)
+    for m in re.finditer(r"\b(True|False|None)\b", masked):
+        word = {"True": "true", "False": "false", "None": "null"}[m.group(1)]
+        out[m.start():m.end()] = [word] + [""] * (m.end() - m.start() - 1)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> str:
+    """Close the strings and brackets a truncated answer left open."""
+    stack = []
+    in_string = escape = False
+    for c in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in _CLOSERS:
+            stack.append(_CLOSERS[c])
+        elif c in "}]" and stack:
+            stack.pop()
+    if not stack and not in_string:
+        return text
+    closed = text + ('"' if in_string else "")
+    closed = re.sub(r"[,:\s]+$", "", closed)
+    return closed + "".join(reversed(stack))
+
+
+_REPAIRS = [
+    ("fences", _strip_fences),
+    ("extract", _extract),
+    ("trailing_commas", _drop_trailing_commas),
+    ("literals", _json_literals),
+    ("truncated", _close_truncated),
+]
+
+
+def load_json(text: str, allow_truncated: bool = True) -> Tuple[Any, List[str]]:
+    """
+    Parse a model answer as JSON, repairing common malformations locally.
+
+    Args:
+        text: The answer
+        allow_truncated: Close a truncated answer (off where a cut-off value,
+            e.g. file content, must not pass as complete)
+
+    Returns:
+        (data, names of the repairs that were needed)
+
+    Raises:
+        ValueError: Not recoverable as JSON
+    """
+    candidate = (text or "").strip()
+    repairs: List[str] = []
+    try:
+        return json.loads(candidate, strict=False), repairs
+    except ValueError as e:
+        error = e
+    python_text = candidate
+    for name, fix in _REPAIRS:
+        if name == "truncated" and not allow_truncated:
+            continue
+        if name == "literals":
+            python_text = candidate
+        fixed = fix(candidate)
+        if fixed == candidate:
+            continue
+        candidate = fixed
+        repairs.append(name)
+        try:
+            return json.loads(candidate, strict=False), repairs
+        except ValueError as e:
+            error = e
+    try:
+        # Single-quoted strings: the answer was written as a Python literal
+        data = ast.literal_eval(python_text)
+        return json.loads(json.dumps(data)), [r for r in repairs if r != "literals"] + ["python_literal"]
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        raise ValueError(f"Answer is not valid JSON: {error}") from None
+
+
+def _parts(error: ValidationError) -> List[Tuple[Any, ...]]:
+    """Top-level field, or field and list index, of every validation error (() = the whole answer)."""
+    parts: List[Tuple[Any, ...]] = []
+    for err in error.errors():
+        loc = tuple(err["loc"])
+        part = loc[:2] if len(loc) >= 2 and isinstance(loc[1], int) else loc[:1]
+        if part not in parts:
+            parts.append(part)
+    return parts
+
+
+def _part_key(part: Tuple[Any, ...]) -> str:
+    return f"{part[0]}[{part[1]}]" if len(part) == 2 else str(part[0])
+
+
+def _describe(error: ValidationError) -> str:
+    return "\n".join(
+        f"- {'.'.join(str(p) for p in err['loc']) or '(answer)'}: {err['msg']}" for err in error.errors()
+    )
+
+
+def _reask_parts(error: ValidationError, parts: List[Tuple[Any, ...]]) -> str:
+    shape = ", ".join(f'"{_part_key(p)}": <corrected value>' for p in parts)
+    return (
+        "Parts of your answer did not match the required format:\n"
+        f"{_describe(error)}\n\n"
+        "Return JSON ONLY with corrected values for just these parts, keyed as shown "
+        f"(no markdown, nothing else):\n{{{shape}}}"
+    )
+
+
+def _reask_parts_again(parts: List[Tuple[Any, ...]]) -> str:
+    shape = ", ".join(f'"{_part_key(p)}": <corrected value>' for p in parts)
+    return f"Return JSON ONLY in exactly this shape (no markdown, nothing else):\n{{{shape}}}"
+
+
+def _reask_all(problem: str) -> str:
+    return (
+        f"Your answer could not be used: {problem}\n\n"
+        "Return the complete answer again as JSON ONLY, in the required format, "
+        "without markdown or commentary."
+    )
+
+
+def _merge(data: Dict[str, Any], parts: List[Tuple[Any, ...]], fixes: Any) -> bool:
+    """Put the re-asked values into data; False if the answer had none of them."""
+    if not isinstance(fixes, dict):
+        return False
+    merged = False
+    for part in parts:
+        key = _part_key(part)
+        if key not in fixes:
+            continue
+        if len(part) == 2 and isinstance(data.get(part[0]), list) and part[1] < len(data[part[0]]):
+            data[part[0]][part[1]] = fixes[key]
+        else:
+            data[part[0]] = fixes[key]
+        merged = True
+    return merged
+
+
+class _Resolver:
+    """Turns answers into a schema instance, saying what to ask next when it can't."""
+
+    def __init__(self, schema: Type[T], messages: Any, s: Optional[Dict[str, Any]], allow_truncated: bool):
+        self.schema = schema
+        self.allow_truncated = allow_truncated
+        self.messages: List[Any] = [("user", messages)] if isinstance(messages, str) else list(messages)
+        self.s = s if s is not None else {}
+        self.data: Any = None
+        self.parts: List[Tuple[Any, ...]] = []
+        self.reasks = 0
+
+    def _note(self, repairs: Sequence[str]) -> None:
+        if repairs:
+            self.s["repairs"] = sorted(set(self.s.get("repairs", [])) | set(repairs))
+
+    def _validate(self) -> Tuple[Optional[T], Optional[str]]:
+        try:
+            return self.schema.model_validate(self.data), None
+        except ValidationError as e:
+            self.parts = _parts(e)
+            if not isinstance(self.data, dict) or () in self.parts:
+                self.parts = []
+                return None, _reask_all(f"it did not match the required format:\n{_describe(e)}")
+            return None, _reask_parts(e, self.parts)
+
+    def answer(self, content: str) -> Tuple[Optional[T], Optional[str]]:
+        """Take the model's answer; returns (result, None) or (None, follow-up prompt)."""
+        try:
+            parsed, repairs = load_json(content, self.allow_truncated)
+        except ValueError as e:
+            return None, _reask_parts_again(self.parts) if self.parts else _reask_all(str(e))
+        self._note(repairs)
+        if self.parts and self.data is not None:
+            if not _merge(self.data, self.parts, parsed):
+                return None, _reask_parts_again(self.parts)
+        else:
+            self.data = parsed
+        return self._validate()
+
+    def follow_up(self, content: str, prompt: str) -> List[Any]:
+        self.reasks += 1
+        self.s["reasks"] = self.reasks
+        self.messages += [("assistant", content), ("user", prompt)]
+        return self.messages
+
+    def fail(self, prompt: str) -> StructuredOutputError:
+        return StructuredOutputError(
+            f"{self.schema.__name__} answer still invalid after {self.reasks} re-ask(s): {prompt.splitlines()[0]}"
+        )
+
+
+def resolve_structured(llm: Any, messages: Any, content: str, schema: Type[T],
+                       s: Optional[Dict[str, Any]] = None, allow_truncated: bool = True) -> T:
+    """
+    Validate an answer already received, repairing it or re-asking for the failing parts.
+
+    Args:
+        llm: Chat model (PooledChatModel) used for re-asks
+        messages: The request the answer was for (a prompt string or chat messages)
+        content: The model's answer
+        schema: Pydantic model the answer must validate against
+        s: Attributes of the caller's span; repairs and reasks are recorded there
+        allow_truncated: Accept a truncated answer closed locally (see load_json())
+
+    Returns:
+        The validated answer
+
+    Raises:
+        StructuredOutputError: Still invalid after RELIQUARY_LLM_REASKS re-asks
+    """
+    resolver = _Resolver(schema, messages, s, allow_truncated)
+    result, prompt = resolver.answer(content)
+    while result is None:
+        if resolver.reasks >= max_reasks():
+            raise resolver.fail(prompt)
+        reply = llm.invoke(resolver.follow_up(content, prompt))
+        content = reply.content
+        result, prompt = resolver.answer(content)
+    return result
+
+
+async def aresolve_structured(llm: Any, messages: Any, content: str, schema: Type[T],
+                              s: Optional[Dict[str, Any]] = None, allow_truncated: bool = True) -> T:
+    """Async variant of resolve_structured()."""
+    resolver = _Resolver(schema, messages, s, allow_truncated)
+    result, prompt = resolver.answer(content)
+    while result is None:
+        if resolver.reasks >= max_reasks():
+            raise resolver.fail(prompt)
+        reply = await llm.ainvoke(resolver.follow_up(content, prompt))
+        content = reply.content
+        result, prompt = resolver.answer(content)
+    return result
+
+
+def invoke_structured(llm: Any, messages: Any, schema: Type[T], s: Optional[Dict[str, Any]] = None,
+                      allow_truncated: bool = True) -> T:
+    """
+    Ask the model and validate its answer against schema (see resolve_structured()).
+
+    Args:
+        llm: Chat model (PooledChatModel)
+        messages: Prompt string or chat messages
+        schema: Pydantic model the answer must validate against
+        s: Attributes of the caller's span
+        allow_truncated: See resolve_structured()
+
+    Returns:
+        The validated answer
+    """
+    resp = llm.invoke(messages)
+    return resolve_structured(llm, messages, resp.content, schema, s, allow_truncated)
+
+
+async def ainvoke_structured(llm: Any, messages: Any, schema: Type[T], s: Optional[Dict[str, Any]] = None,
+                             allow_truncated: bool = True) -> T:
+    """Async variant of invoke_structured()."""
+    resp = await llm.ainvoke(messages)
+    return await aresolve_structured(llm, messages, resp.content, schema, s, allow_truncated)
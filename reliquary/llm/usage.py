@@ -0,0 +1,105 @@
+"""
+Token usage and cost of LLM calls.
+
+Every pooled client call (see llm.client) reports its prompt/completion tokens
+to the collector of the enclosing collect_usage() block, which the workflow
+opens around each graph node. Costs use per-million-token prices for known
+models; RELIQUARY_LLM_PRICES (JSON, {"model": {"input": 0.15, "output": 0.6}})
+adds or overrides models. Unknown models cost 0.
+"""
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+# USD per 1M tokens (input, output)
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+_records: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("reliquary_llm_usage", default=None)
+
+
+def _prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    raw = os.getenv("RELIQUARY_LLM_PRICES")
+    if raw:
+        for model, p in json.loads(raw).items():
+            prices[model] = (float(p["input"]), float(p["output"]))
+    return prices
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = _prices()
+    # Dated snapshots (gpt-4o-mini-2024-07-18) are priced like their base model.
+    base = max((m for m in prices if model == m or model.startswith(m + "-")), key=len, default=None)
+    if base is None:
+        return 0.0
+    price_in, price_out = prices[base]
+    return round((prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000, 6)
+
+
+def token_usage(message: Any) -> Tuple[int, int]:
+    """(prompt, completion) tokens reported with a chat model response; (0, 0) if it has none."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return int(usage.get("input_tokens", 0)), int(usage.get("output_tokens", 0))
+    meta = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return int(meta.get("prompt_tokens", 0) or 0), int(meta.get("completion_tokens", 0) or 0)
+
+
+@contextmanager
+def collect_usage():
+    """Collect the usage of every LLM call made in this context into the yielded list."""
+    records: List[Dict[str, Any]] = []
+    token = _records.set(records)
+    try:
+        yield records
+    finally:
+        _records.reset(token)
+
+
+def record_usage(model: str, stage: str, message: Any, cached: bool = False) -> Dict[str, Any]:
+    """
+    Report one call's usage to the current collector.
+
+    Args:
+        model: Model the call went to
+        stage: Agent prompt that made it (its span name, e.g. "llm.patch")
+        message: The response
+        cached: Served by the response cache (tokens counted, nothing billed)
+
+    Returns:
+        {model, stage, prompt_tokens, completion_tokens, cost_usd, cached}
+    """
+    prompt_tokens, completion_tokens = token_usage(message)
+    record = {
+        "model": model,
+        "stage": stage,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost_usd": 0.0 if cached else cost_usd(model, prompt_tokens, completion_tokens),
+        "cached": cached,
+    }
+    records = _records.get()
+    if records is not None:
+        records.append(record)
+    return record
+
+
+def usage_totals(records: List[Any]) -> Dict[str, Any]:
+    """Sum usage records (dicts or LLMUsage) into {calls, prompt_tokens, completion_tokens, total_tokens, cost_usd}."""
+    rows = [r if isinstance(r, dict) else r.model_dump() for r in records]
+    prompt = sum(r["prompt_tokens"] for r in rows)
+    completion = sum(r["completion_tokens"] for r in rows)
+    return {
+        "calls": len(rows),
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+        "cost_usd": round(sum(r["cost_usd"] for r in rows), 6),
+    }
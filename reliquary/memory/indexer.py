@@ -3,6 +3,7 @@ from datetime import datetime
 from typing import Optional
 from reliquary.schemas.state import WorkItemState
 from reliquary.schemas.memory import RunSummary
+from reliquary.llm.usage import usage_totals
 
 
 def extract_failure_mode(state: WorkItemState) -> Optional[str]:
@@ -78,6 +79,8 @@ def index_run(state: WorkItemState, run_dir: str) -> RunSummary:
     if state.evidence.test_runs:
         test_exit_code = state.evidence.test_runs[-1].exit_code
 
+    usage = usage_totals(state.llm_usage)
+
     return RunSummary(
         work_item_id=state.work_item_id,
         repo_name=repo_name,
@@ -90,5 +93,8 @@ def index_run(state: WorkItemState, run_dir: str) -> RunSummary:
         test_exit_code=test_exit_code,
         failure_mode=extract_failure_mode(state),
         completed_at=datetime.utcnow().isoformat(),
-        run_dir=run_dir
+        run_dir=run_dir,
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        cost_usd=usage["cost_usd"],
     )
@@ -1,8 +1,11 @@
 import sqlite3
 import json
+import math
 import os
-from typing import List, Optional
+import threading
+from typing import Any, Dict, List, Optional
 from reliquary.schemas.memory import RunSummary
+from reliquary.schemas.usage import LLMUsage
 
 
 def get_db_path() -> str:
@@ -38,10 +41,62 @@ def init_database():
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_final_status ON run_summaries(final_status)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_failure_mode ON run_summaries(failure_mode)")
 
+    # Per-node / per-tool latency spans (see storage.trace_store)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS node_timings (
+            work_item_id TEXT,
+            repo_name TEXT,
+            kind TEXT,
+            name TEXT,
+            duration_ms REAL,
+            started_at TEXT
+        )
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_timings_stage ON node_timings(kind, name)")
+
+    # Usage columns were added later; bring older databases up to date.
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(run_summaries)")}
+    for column, sql_type in (("prompt_tokens", "INTEGER"), ("completion_tokens", "INTEGER"), ("cost_usd", "REAL")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE run_summaries ADD COLUMN {column} {sql_type} DEFAULT 0")
+
+    # Token usage per LLM call (see llm.usage)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            work_item_id TEXT,
+            repo_name TEXT,
+            node TEXT,
+            stage TEXT,
+            attempt INTEGER,
+            model TEXT,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            cost_usd REAL,
+            cached INTEGER
+        )
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_work_item ON llm_usage(work_item_id)")
+
     conn.commit()
     conn.close()
 
 
+# Database paths already initialized by this process (see _ensure_database)
+_initialized: set = set()
+_init_lock = threading.Lock()
+
+
+def _ensure_database():
+    """init_database() once per process and database path, for writes made on every node."""
+    db_path = os.path.abspath(get_db_path())
+    with _init_lock:
+        if db_path not in _initialized:
+            init_database()
+            _initialized.add(db_path)
+
+
 def save_run_summary(summary: RunSummary):
     """
     Save a run summary to the database.
@@ -57,8 +112,9 @@ def save_run_summary(summary: RunSummary):
     cursor.execute("""
         INSERT OR REPLACE INTO run_summaries
         (work_item_id, repo_name, task_raw, ticket_title, domain_tags, risk_level,
-         final_status, implement_attempts, test_exit_code, failure_mode, completed_at, run_dir)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+         final_status, implement_attempts, test_exit_code, failure_mode, completed_at, run_dir,
+         prompt_tokens, completion_tokens, cost_usd)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         summary.work_item_id,
         summary.repo_name,
@@ -71,13 +127,182 @@ def save_run_summary(summary: RunSummary):
         summary.test_exit_code,
         summary.failure_mode,
         summary.completed_at,
-        summary.run_dir
+        summary.run_dir,
+        summary.prompt_tokens,
+        summary.completion_tokens,
+        summary.cost_usd
     ))
 
     conn.commit()
     conn.close()
 
 
+def save_node_timings(work_item_id: str, repo_name: str, spans: List[Dict[str, Any]]):
+    """
+    Save latency spans for a work item.
+
+    Args:
+        work_item_id: Work item identifier
+        repo_name: Repository name
+        spans: Spans as produced by storage.trace_store.span
+    """
+    if not spans:
+        return
+
+    _ensure_database()
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.executemany("""
+        INSERT INTO node_timings (work_item_id, repo_name, kind, name, duration_ms, started_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [
+        (work_item_id, repo_name, s["kind"], s["name"], s["duration_ms"], s["started_at"])
+        for s in spans
+    ])
+
+    conn.commit()
+    conn.close()
+
+
+def save_llm_usage(work_item_id: str, repo_name: str, usage: List[LLMUsage]):
+    """
+    Save the token usage of a node's LLM calls.
+
+    Args:
+        work_item_id: Work item identifier
+        repo_name: Repository name
+        usage: Usage records (see WorkItemState.llm_usage)
+    """
+    if not usage:
+        return
+
+    _ensure_database()
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.executemany("""
+        INSERT INTO llm_usage (work_item_id, repo_name, node, stage, attempt, model,
+                               prompt_tokens, completion_tokens, cost_usd, cached)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (work_item_id, repo_name, u.node, u.stage, u.attempt, u.model,
+         u.prompt_tokens, u.completion_tokens, u.cost_usd, int(u.cached))
+        for u in usage
+    ])
+
+    conn.commit()
+    conn.close()
+
+
+def get_token_usage(repo_name: Optional[str] = None, top: int = 10) -> dict:
+    """
+    Get LLM token usage and cost, in total and broken down.
+
+    Args:
+        repo_name: Filter by repository name
+        top: Number of most expensive work items to list
+
+    Returns:
+        {totals, by_node, by_stage, by_model, top_work_items}; each row has
+        calls, prompt_tokens, completion_tokens, total_tokens and cost_usd
+        (cached calls count tokens but cost nothing)
+    """
+    init_database()
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    where, params = ("WHERE repo_name = ?", [repo_name]) if repo_name else ("", [])
+    sums = """COUNT(*), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0),
+              COALESCE(SUM(cost_usd), 0), COALESCE(SUM(cached), 0)"""
+
+    def row(values) -> dict:
+        calls, prompt, completion, cost, cached = values
+        return {
+            "calls": calls,
+            "cached_calls": cached,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "cost_usd": round(cost, 6),
+        }
+
+    def grouped(column: str, limit: Optional[int] = None) -> List[dict]:
+        query = f"SELECT {column}, {sums} FROM llm_usage {where} GROUP BY {column} ORDER BY SUM(cost_usd) DESC, SUM(prompt_tokens + completion_tokens) DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        cursor.execute(query, params)
+        return [{column: r[0], **row(r[1:])} for r in cursor.fetchall()]
+
+    cursor.execute(f"SELECT {sums} FROM llm_usage {where}", params)
+    usage = {
+        "totals": row(cursor.fetchone()),
+        "by_node": grouped("node"),
+        "by_stage": grouped("stage"),
+        "by_model": grouped("model"),
+        "top_work_items": grouped("work_item_id", limit=top),
+    }
+
+    conn.close()
+    return usage
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank percentile on an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def get_stage_latency(repo_name: Optional[str] = None) -> List[dict]:
+    """
+    Get latency percentiles per stage (graph node, tool call or LLM call).
+
+    Args:
+        repo_name: Filter by repository name
+
+    Returns:
+        List of {kind, name, count, p50_ms, p95_ms, p99_ms, total_ms}, nodes first
+    """
+    init_database()
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    query = "SELECT kind, name, duration_ms FROM node_timings"
+    params = []
+    if repo_name:
+        query += " WHERE repo_name = ?"
+        params.append(repo_name)
+
+    cursor.execute(query, params)
+    durations: Dict[tuple, List[float]] = {}
+    for kind, name, duration_ms in cursor.fetchall():
+        durations.setdefault((kind, name), []).append(duration_ms)
+
+    conn.close()
+
+    kind_order = {"node": 0, "llm": 1, "tool": 2}
+    stages = []
+    for (kind, name), values in sorted(durations.items(), key=lambda kv: (kind_order.get(kv[0][0], 3), kv[0][1])):
+        values.sort()
+        stages.append({
+            "kind": kind,
+            "name": name,
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50), 1),
+            "p95_ms": round(_percentile(values, 95), 1),
+            "p99_ms": round(_percentile(values, 99), 1),
+            "total_ms": round(sum(values), 1),
+        })
+
+    return stages
+
+
 def query_runs(
     repo_name: Optional[str] = None,
     status: Optional[str] = None,
@@ -136,7 +361,10 @@ def query_runs(
             test_exit_code=row[8],
             failure_mode=row[9],
             completed_at=row[10],
-            run_dir=row[11]
+            run_dir=row[11],
+            prompt_tokens=row[12] or 0,
+            completion_tokens=row[13] or 0,
+            cost_usd=row[14] or 0.0
         ))
 
     conn.close()
@@ -184,5 +412,7 @@ def get_stats() -> dict:
         "successful_runs": successful_runs,
         "success_rate": (successful_runs / total_runs * 100) if total_runs > 0 else 0,
         "avg_attempts": round(avg_attempts, 2),
-        "failure_modes": failure_modes
+        "failure_modes": failure_modes,
+        "stage_latency": get_stage_latency(),
+        "token_usage": get_token_usage()
     }
@@ -0,0 +1,80 @@
+from typing import Any, List, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+# Answers the agents expect from the model, validated by llm.structured.
+
+
+def _as_list(value: Any) -> Any:
+    # Models sometimes answer a one-item list with a bare string
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    return [] if value is None else value
+
+
+class PlanOutput(BaseModel):
+    plan: List[str] = Field(min_length=1)
+
+
+class HelpDecision(BaseModel):
+    need_help: bool = False
+    question: str = ""
+    why: str = ""
+
+    @field_validator("question", "why", mode="before")
+    @classmethod
+    def _text(cls, value: Any) -> Any:
+        return "" if value is None else value
+
+
+class AssessOutput(HelpDecision):
+    plan: List[str] = Field(min_length=1)
+
+
+class FileChange(BaseModel):
+    path: str = Field(min_length=1)
+    content: Optional[str] = None
+    delete: bool = False
+
+    @model_validator(mode="after")
+    def _content_or_delete(self) -> "FileChange":
+        if self.content is None and not self.delete:
+            raise ValueError("content is required unless delete is true")
+        return self
+
+
+class PatchFiles(BaseModel):
+    files: List[FileChange]
+
+
+class FileEdit(BaseModel):
+    path: str = Field(min_length=1)
+    search: str = ""
+    replace: str = ""
+    delete: bool = False
+
+    @field_validator("search", "replace", mode="before")
+    @classmethod
+    def _text(cls, value: Any) -> Any:
+        return "" if value is None else value
+
+
+class PatchEdits(BaseModel):
+    edits: List[FileEdit]
+
+
+class HelperAdvice(BaseModel):
+    advice: List[str] = Field(default_factory=list)
+    checks: List[str] = Field(default_factory=list)
+    risks: List[str] = Field(default_factory=list)
+    needs_more_info: List[str] = Field(default_factory=list)
+    confidence: Optional[Literal["low", "medium", "high"]] = None
+
+    _lists = field_validator("advice", "checks", "risks", "needs_more_info", mode="before")(_as_list)
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _confidence(cls, value: Any) -> Any:
+        # An unknown confidence is dropped rather than failing the answer
+        value = value.lower() if isinstance(value, str) else value
+        return value if value in ("low", "medium", "high") else None
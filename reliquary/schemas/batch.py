@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class BatchItem(BaseModel):
+    item_id: str
+    repo_path: str
+    task_raw: str
+
+
+class BatchItemResult(BaseModel):
+    item_id: str
+    work_item_id: Optional[str] = None
+    status: str  # Final WorkItemState status, or "ERROR" if the run raised
+    implement_attempts: int = 0
+    duration_s: float
+    error: Optional[str] = None
+
+
+class BatchReport(BaseModel):
+    started_at: str
+    finished_at: str
+    workers: int
+    total_items: int
+    status_counts: dict
+    wall_clock_s: float
+    items_per_minute: float
+    results: List[BatchItemResult] = Field(default_factory=list)
+    # LLM scheduler queueing and throttling at the end of the batch (llm.scheduler.scheduler_stats())
+    llm_scheduler: dict = Field(default_factory=dict)
@@ -6,6 +6,13 @@ class CommandRun(BaseModel):
     exit_code: int
     stdout_path: str
     stderr_path: str
+    # Reused from the command cache: the paths point at the original run's outputs
+    cached: bool = False
+    duration_s: Optional[float] = None
+    # Set when the command was killed: "timeout" or "output_limit"
+    termination: Optional[str] = None
+    # Last few KB of stdout, for summaries without reading the artifact file
+    output_tail: str = ""
 
 class Evidence(BaseModel):
     test_runs: List[CommandRun] = Field(default_factory=list)
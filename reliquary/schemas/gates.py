@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+
+class GateResult(BaseModel):
+    gate: str  # "detect_secrets", "bandit", "policy", "requirements_review"
+    attempt: int
+    # skipped: still pending when another blocking gate failed
+    status: Literal["passed", "failed", "timeout", "error", "skipped"]
+    blocking: bool  # a failure stops the attempt before verification
+    findings: List[str] = Field(default_factory=list)
+    duration_s: Optional[float] = None
@@ -34,6 +34,9 @@ DecisionEvent = Literal[
     "TESTS_PASSED",
     "TESTS_FAILED",
     "BLOCKED",
+    "MEMORY_CONSULTED",
+    "SECURITY_SCAN_COMPLETED",
+    "GATES_COMPLETED",
 ]
 
 
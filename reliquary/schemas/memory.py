@@ -30,6 +30,10 @@ class RunSummary(BaseModel):
     failure_mode: Optional[str]  # "tests_failed", "patch_apply_failed", etc.
     completed_at: str
     run_dir: str
+    # LLM token usage and cost over the whole run (see llm.usage)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
 
 
 class PatternMatch(BaseModel):
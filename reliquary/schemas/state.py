@@ -1,5 +1,6 @@
+import operator
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+from typing import Annotated, List, Literal, Optional
 
 from .ticket import TicketSpec
 from .evidence import Evidence
@@ -8,12 +9,15 @@ from .delivery import DeliveryConfig, DeliveryResult
 from .memory import MemoryAdvice
 from .policy import PolicyEvaluation
 from .security import SecurityScanResult
+from .gates import GateResult
+from .usage import LLMUsage
 
 
 Status = Literal[
     "INTAKE",
     "NEEDS_INFO",
     "PLANNING",
+    "POLICY_CHECK",
     "IMPLEMENTING",
     "NEED_HELP",
     "VERIFYING",
@@ -40,20 +44,35 @@ class WorkItemState(BaseModel):
     patch_unified_diff: Optional[str] = None
     patch_applied: bool = False
 
+    # Speculative mode: >1 generates that many patches per attempt and verifies
+    # them in parallel worktrees; patch_unified_diff ends up as the winner.
+    speculative_candidates: int = 1
+    patch_candidates: List[str] = Field(default_factory=list)
+
+    # Verification test scope: "affected_then_full" runs the tests that import a
+    # changed file first and the full suite as the final gate; "affected" skips
+    # the full suite; "full" always runs everything.
+    test_selection: Literal["full", "affected_then_full", "affected"] = "affected_then_full"
+
     evidence: Evidence = Field(default_factory=Evidence)
 
+    # Append-only channels: nodes return only the new entries and LangGraph
+    # concatenates them (operator.add) instead of each node copying the list.
+
     # Review findings
-    review_findings: List[str] = Field(default_factory=list)
+    review_findings: Annotated[List[str], operator.add] = Field(default_factory=list)
 
     # Loop controls
     implement_attempts: int = 0
     max_implement_attempts: int = 4
 
     # Week 2: Collaboration + truth-preserving escalation
-    help_requests: List[HelpRequest] = Field(default_factory=list)
-    help_responses: List[HelpResponse] = Field(default_factory=list)
-    decision_log: List[DecisionLogEntry] = Field(default_factory=list)
+    help_requests: Annotated[List[HelpRequest], operator.add] = Field(default_factory=list)
+    help_responses: Annotated[List[HelpResponse], operator.add] = Field(default_factory=list)
+    decision_log: Annotated[List[DecisionLogEntry], operator.add] = Field(default_factory=list)
     help_cycles: int = 0
+    # help_decision_key() of the last help decision; unchanged means asking again learns nothing
+    help_decision_key: Optional[str] = None
     max_help_cycles: int = 3
 
     blocked_reason: Optional[str] = None
@@ -69,3 +88,7 @@ class WorkItemState(BaseModel):
     # Phase 5: Safety, Policy & Governance
     policy_evaluation: Optional[PolicyEvaluation] = None
     security_scans: List[SecurityScanResult] = Field(default_factory=list)
+    # Pre-verification gate results, every attempt (see graph.gates)
+    gate_results: Annotated[List[GateResult], operator.add] = Field(default_factory=list)
+    # Token usage and cost of every LLM call, per node (see llm.usage)
+    llm_usage: Annotated[List[LLMUsage], operator.add] = Field(default_factory=list)
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class LLMUsage(BaseModel):
+    node: str  # graph node that made the call, e.g. "implement"
+    stage: str  # prompt, e.g. "llm.patch", "llm.help_decider"
+    attempt: int  # implement attempts completed when the node ran
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    cached: bool = False  # served by the response cache, not billed
@@ -11,7 +11,7 @@ def run_bandit(repo_path: str, files: List[str]) -> SecurityScanResult:
 
     Args:
         repo_path: Repository path
-        files: List of files to scan
+        files: List of files to scan, relative to repo_path (empty scans the whole repo)
 
     Returns:
         SecurityScanResult
@@ -21,7 +21,8 @@ def run_bandit(repo_path: str, files: List[str]) -> SecurityScanResult:
     try:
         # Run bandit with JSON output
         result = subprocess.run(
-            ["bandit", "-r", repo_path, "-f", "json"],
+            ["bandit", "-f", "json", *files] if files else ["bandit", "-r", repo_path, "-f", "json"],
+            cwd=repo_path,
             capture_output=True,
             text=True,
             timeout=60
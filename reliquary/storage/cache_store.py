@@ -0,0 +1,41 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+
+def get_cache_dir(*parts: str) -> str:
+    """
+    Directory for derived, safe-to-delete caches (RELIQUARY_CACHE_DIR, default .reliquary_cache).
+
+    Args:
+        *parts: Sub-directories below the cache root (e.g. "import_graph")
+
+    Returns:
+        Path to the (created) directory
+    """
+    path = os.path.join(os.getenv("RELIQUARY_CACHE_DIR", ".reliquary_cache"), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def repo_cache_key(repo_path: str) -> str:
+    """Stable file-name-safe key for a repository checkout."""
+    return hashlib.sha1(os.path.realpath(repo_path).encode("utf-8")).hexdigest()[:16]
+
+
+def read_cache_json(path: str) -> Optional[Any]:
+    """Load a JSON cache file; a missing or corrupt file is a cache miss."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache_json(path: str, data: Any) -> None:
+    # Write then rename so concurrent readers never see a half-written file.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    Path(tmp).write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+from contextlib import asynccontextmanager, contextmanager
+import typing
+from typing import Any, Dict, Set, Tuple
+
+from pydantic import BaseModel
+
+
+def get_checkpoint_db_path() -> str:
+    """Get the path to the graph checkpoint database."""
+    return os.getenv("RELIQUARY_CHECKPOINT_DB", "checkpoints.db")
+
+
+def thread_config(work_item_id: str) -> Dict[str, Any]:
+    """LangGraph config addressing one work item's checkpoint thread."""
+    return {"configurable": {"thread_id": work_item_id}}
+
+
+def _state_model_types(model: type, seen: Set[type]) -> Set[type]:
+    """Collect every pydantic model reachable from a model's field annotations."""
+    if model in seen:
+        return seen
+    seen.add(model)
+
+    def walk(annotation):
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            _state_model_types(annotation, seen)
+        for arg in typing.get_args(annotation):
+            walk(arg)
+
+    for field in model.model_fields.values():
+        walk(field.annotation)
+    return seen
+
+
+def _serde():
+    """
+    Checkpoint serializer that may rebuild our state models.
+
+    Recent LangGraph versions warn on (and will later block) deserializing
+    types that are not allow-listed; older ones have no allowlist at all.
+    """
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from reliquary.schemas.state import WorkItemState
+
+    allowed: Tuple[Tuple[str, str], ...] = tuple(
+        (t.__module__, t.__name__) for t in _state_model_types(WorkItemState, set())
+    )
+    try:
+        return JsonPlusSerializer(allowed_msgpack_modules=allowed)
+    except TypeError:
+        return JsonPlusSerializer()
+
+
+@contextmanager
+def open_checkpointer():
+    """
+    Open a SQLite-backed LangGraph checkpointer.
+
+    The graph writes a checkpoint after every node, so a run can resume from
+    its last completed node after a human answer, a crash or a restart. The
+    connection is shared across threads (batch runs); SqliteSaver serialises
+    access internally.
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    conn = sqlite3.connect(get_checkpoint_db_path(), check_same_thread=False)
+    try:
+        yield SqliteSaver(conn, serde=_serde())
+    finally:
+        conn.close()
+
+
+@asynccontextmanager
+async def open_async_checkpointer():
+    """Async counterpart of open_checkpointer() for build_async_graph()."""
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    import aiosqlite
+
+    async with aiosqlite.connect(get_checkpoint_db_path()) as conn:
+        yield AsyncSqliteSaver(conn, serde=_serde())
@@ -1,14 +1,83 @@
 import json
+import os
+import threading
 from pathlib import Path
 from datetime import datetime
-from typing import Any, Dict
-
-def new_run_dir(base_dir: str, work_item_id: str) -> str:
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    run_dir = Path(base_dir) / f"{work_item_id}_{ts}"
-    run_dir.mkdir(parents=True, exist_ok=True)
-    (run_dir / "artifacts").mkdir(exist_ok=True)
-    return str(run_dir)
+from typing import Any, Dict, Optional
+
+MANIFEST_FILE = "manifest.json"
+
+# Manifest updates are read-modify-write; speculative candidates and async
+# nodes of the same work item make them concurrently.
+_manifest_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _manifest_lock(run_dir: str) -> threading.Lock:
+    key = os.path.abspath(run_dir)
+    with _locks_lock:
+        return _manifest_locks.setdefault(key, threading.Lock())
+
+
+def work_item_dir(base_dir: str, work_item_id: str) -> str:
+    """Stable directory for everything recorded about one work item."""
+    path = Path(base_dir) / work_item_id
+    path.mkdir(parents=True, exist_ok=True)
+    return str(path)
+
+
+def attempt_dir(run_dir: str, attempt: int) -> str:
+    """Per-attempt subdirectory (with its own artifacts/) inside a work item's run dir."""
+    path = Path(run_dir) / "attempts" / f"attempt_{attempt}"
+    (path / "artifacts").mkdir(parents=True, exist_ok=True)
+    return str(path)
+
+
+def read_manifest(run_dir: str) -> Dict[str, Any]:
+    path = Path(run_dir) / MANIFEST_FILE
+    if not path.exists():
+        return {"work_item_id": Path(run_dir).name, "created_at": datetime.utcnow().isoformat(), "attempts": []}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def record_attempt(run_dir: str, attempt: int, **details) -> Dict[str, Any]:
+    """
+    Add or update one attempt's entry in the run manifest.
+
+    Paths in details should be relative to run_dir so the tree can be moved.
+    """
+    with _manifest_lock(run_dir):
+        manifest = read_manifest(run_dir)
+        entry = next((a for a in manifest["attempts"] if a["attempt"] == attempt), None)
+        if entry is None:
+            entry = {"attempt": attempt, "dir": f"attempts/attempt_{attempt}"}
+            manifest["attempts"].append(entry)
+        entry.update(details)
+        return write_manifest(run_dir, manifest)
+
+
+def update_manifest(run_dir: str, **fields) -> Dict[str, Any]:
+    with _manifest_lock(run_dir):
+        manifest = read_manifest(run_dir)
+        manifest.update(fields)
+        return write_manifest(run_dir, manifest)
+
+
+def write_manifest(run_dir: str, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    manifest["updated_at"] = datetime.utcnow().isoformat()
+    # Written aside and renamed, so readers never see a half-written manifest.
+    path = Path(run_dir) / MANIFEST_FILE
+    tmp = path.with_name(f"{MANIFEST_FILE}.{os.getpid()}.{threading.get_ident()}.tmp")
+    write_json(str(tmp), manifest)
+    os.replace(tmp, path)
+    return manifest
+
+
+def latest_passing_attempt(run_dir: str) -> Optional[Dict[str, Any]]:
+    """The most recent attempt whose tests passed, or None."""
+    passing = [a for a in read_manifest(run_dir)["attempts"] if a.get("outcome") == "tests_passed"]
+    return max(passing, key=lambda a: a["attempt"]) if passing else None
+
 
 def write_json(path: str, data: Any) -> None:
     Path(path).write_text(json.dumps(data, indent=2), encoding="utf-8")
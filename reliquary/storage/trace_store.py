@@ -0,0 +1,102 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+# Spans recorded while the current graph node runs; None outside a traced node.
+_current_spans: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("reliquary_trace_spans", default=None)
+
+# Name of the innermost open span (e.g. the agent prompt an LLM request belongs to)
+_open_span: ContextVar[Optional[str]] = ContextVar("reliquary_open_span", default=None)
+
+
+@contextmanager
+def span(name: str, kind: str = "tool", **attrs):
+    """
+    Time a block and record it on the current node's trace.
+
+    Yields the span's attribute dict so callers can attach results
+    (e.g. exit codes) before it closes. Outside a traced node this is a no-op.
+
+    Args:
+        name: Span name (e.g. "run_command", "llm.patch")
+        kind: "node", "tool" or "llm"
+        **attrs: Extra attributes stored with the span
+    """
+    spans = _current_spans.get()
+    started_at = datetime.utcnow().isoformat()
+    started = time.perf_counter()
+    token = _open_span.set(name)
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _open_span.reset(token)
+        if spans is not None:
+            spans.append({
+                "name": name,
+                "kind": kind,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "attrs": attrs,
+            })
+
+
+def current_span_name() -> Optional[str]:
+    """Name of the innermost span open in this context, if any."""
+    return _open_span.get()
+
+
+@contextmanager
+def collect_spans():
+    """Collect every span recorded in this context into the yielded list."""
+    spans: List[Dict[str, Any]] = []
+    token = _current_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_spans.reset(token)
+
+
+def write_trace(run_dir: str, work_item_id: str, spans: List[Dict[str, Any]]):
+    """
+    Append spans to the run's trace.jsonl.
+
+    Args:
+        run_dir: Path to the run directory
+        work_item_id: Work item identifier
+        spans: Spans to append
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    trace_path = os.path.join(run_dir, "trace.jsonl")
+    with open(trace_path, 'a') as f:
+        for s in spans:
+            f.write(json.dumps({"work_item_id": work_item_id, **s}) + '\n')
+
+
+def read_trace(run_dir: str) -> List[Dict[str, Any]]:
+    """
+    Read all spans from a run's trace.jsonl.
+
+    Args:
+        run_dir: Path to the run directory
+
+    Returns:
+        List of spans in recorded order
+    """
+    trace_path = os.path.join(run_dir, "trace.jsonl")
+    if not os.path.exists(trace_path):
+        return []
+
+    spans = []
+    with open(trace_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+    return spans
@@ -0,0 +1,410 @@
+"""
+Persistent per-repository code index, used to pick the files a patch prompt shows.
+
+For every file in a checkout the index keeps:
+- its git blob id;
+- a one-line summary (a module's docstring, or the first line of a text file);
+- for Python files, the symbols defined at the top level (functions, classes
+  and their methods, constants, route paths) and the imports.
+
+It is stored in the cache dir (code_index/, one JSON file per repository)
+and keyed by the git tree of the working tree. An unchanged tree is served
+as is, from memory after the first load in a process. Otherwise only files
+whose blob id changed are read and parsed again. So indexing is paid once
+per commit (or edit), not on every attempt.
+
+select_context() ranks files against a ticket by the words they share with
+its text (path, symbols, summary). Entry points and widely imported modules
+get a small bonus, and import neighbours of the best matches move up. The
+tests covering each chosen file come along with it.
+"""
+import ast
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from reliquary.storage.cache_store import get_cache_dir, repo_cache_key, read_cache_json, write_cache_json
+from reliquary.storage.trace_store import span
+from reliquary.tools.git_tools import tree_blobs, tree_hash
+from reliquary.tools.impact import SKIP_DIRS, is_test_file, parse_imports, resolve_import_graph
+
+# Bump when the entry layout changes; older index files are rebuilt.
+INDEX_VERSION = 1
+
+# Larger files (and binary ones) are indexed by hash only
+MAX_INDEXED_BYTES = 512_000
+
+SUMMARY_CHARS = 160
+
+# File contents shown in a prompt are cut at this many characters (as fs_tools.read_text)
+MAX_FILE_CHARS = 12000
+
+# Lines of "related files" outline shown after the chosen files
+MAX_OUTLINE_FILES = 20
+
+ENTRY_POINTS = {"app.py", "main.py", "__main__.py", "cli.py", "server.py", "manage.py", "wsgi.py", "asgi.py"}
+
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "when", "should", "must", "not",
+    "are", "was", "were", "has", "have", "had", "will", "can", "all", "any", "each", "its", "our",
+    "your", "their", "them", "then", "than", "there", "which", "who", "what", "where", "how", "why",
+    "add", "adds", "make", "use", "uses", "new", "none", "true", "false", "self", "cls", "return",
+    "returns", "title", "problem", "acceptance", "constraint", "out", "scope", "def", "class",
+    "import", "test", "tests", "file", "files", "code", "function", "value", "also", "only", "but",
+}
+
+_memo: Dict[str, "CodeIndex"] = {}
+_memo_lock = threading.Lock()
+_repo_locks: Dict[str, threading.Lock] = {}
+
+
+def context_limits() -> Tuple[int, int]:
+    """(files, characters) of file contents a patch prompt may show (RELIQUARY_CONTEXT_FILES / _CHARS)."""
+    return (
+        max(1, int(os.getenv("RELIQUARY_CONTEXT_FILES", "6"))),
+        max(1, int(os.getenv("RELIQUARY_CONTEXT_CHARS", "40000"))),
+    )
+
+
+def _words(text: str) -> Set[str]:
+    """Lowercase words of text, identifiers split at underscores and camelCase, common words dropped."""
+    words = set()
+    for token in re.findall(r"[A-Za-z][A-Za-z0-9]*", text):
+        for part in re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+", token):
+            word = part.lower()
+            if len(word) < 3 or word in _STOPWORDS or word.isdigit():
+                continue
+            # Plurals match their singular
+            words.add(word[:-1] if len(word) > 4 and word.endswith("s") and not word.endswith("ss") else word)
+    return words
+
+
+def _skipped(rel: str) -> bool:
+    return any(part in SKIP_DIRS or part.endswith(".egg-info") for part in rel.split("/")[:-1])
+
+
+def _blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _walk_blobs(repo_path: str) -> Dict[str, str]:
+    """{path: blob id} by hashing every file (for directories that aren't git checkouts)."""
+    blobs = {}
+    for dirpath, dirnames, filenames in os.walk(repo_path):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.endswith(".egg-info")]
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            if os.path.islink(full):
+                continue
+            try:
+                blobs[Path(full).relative_to(repo_path).as_posix()] = _blob_sha(Path(full).read_bytes())
+            except OSError:
+                continue
+    return blobs
+
+
+def _snapshot(repo_path: str) -> Tuple[str, Optional[Dict[str, str]]]:
+    """
+    (tree id, {path: blob id}) of the working tree as it is now.
+
+    For git checkouts the blob ids are left out (None) and only listed once
+    the tree turns out to differ from the indexed one.
+    """
+    try:
+        return tree_hash(repo_path), None
+    except (RuntimeError, OSError):
+        blobs = _walk_blobs(repo_path)
+        return hashlib.sha1(repr(sorted(blobs.items())).encode("utf-8")).hexdigest(), blobs
+
+
+def _first_line(text: str) -> str:
+    for line in text.splitlines():
+        line = line.strip().strip("#/*-=\"' ").strip()
+        if line:
+            return line[:SUMMARY_CHARS]
+    return ""
+
+
+def _routes(node: ast.AST) -> List[str]:
+    """URL paths in a function's decorators (@app.get("/health"), @bp.route("/users"))."""
+    paths = []
+    for dec in getattr(node, "decorator_list", []):
+        if isinstance(dec, ast.Call) and dec.args:
+            arg = dec.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and arg.value.startswith("/"):
+                paths.append(arg.value)
+    return paths
+
+
+def _symbols(tree: ast.Module) -> List[List]:
+    """[kind, name, line] of what a module defines at the top level (and its classes' methods)."""
+    symbols: List[List] = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append(["def", node.name, node.lineno])
+            symbols.extend(["route", path, node.lineno] for path in _routes(node))
+        elif isinstance(node, ast.ClassDef):
+            symbols.append(["class", node.name, node.lineno])
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append(["def", f"{node.name}.{item.name}", item.lineno])
+                    symbols.extend(["route", path, item.lineno] for path in _routes(item))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id.isupper():
+                    symbols.append(["const", target.id, node.lineno])
+    return symbols
+
+
+def _index_file(rel: str, data: bytes, blob: str) -> Dict:
+    entry: Dict = {"blob": blob, "size": len(data), "text": False, "summary": "", "symbols": [], "imports": []}
+    if len(data) > MAX_INDEXED_BYTES or b"\0" in data[:8000]:
+        return entry
+    text = data.decode("utf-8", errors="replace")
+    entry["text"] = True
+    if not rel.endswith(".py"):
+        entry["summary"] = _first_line(text)
+        return entry
+    try:
+        tree = ast.parse(data, filename=rel)
+    except (SyntaxError, ValueError):
+        entry["summary"] = _first_line(text)
+        return entry
+    docstring = ast.get_docstring(tree)
+    entry["summary"] = _first_line(docstring) if docstring else ""
+    entry["symbols"] = _symbols(tree)
+    entry["imports"] = parse_imports(rel, data, tree)
+    return entry
+
+
+class CodeIndex:
+    """The index of one checkout at one tree: {path: entry} plus the import graph built from it."""
+
+    def __init__(self, repo_path: str, tree: str, files: Dict[str, Dict]):
+        self.repo_path = repo_path
+        self.tree = tree
+        self.files = files
+        self.imports = resolve_import_graph({rel: e["imports"] for rel, e in files.items() if rel.endswith(".py")})
+        self.importers: Dict[str, List[str]] = {}
+        for rel, deps in self.imports.items():
+            for dep in deps:
+                self.importers.setdefault(dep, []).append(rel)
+        self._words: Dict[str, Tuple[Set[str], Set[str], Set[str]]] = {}
+
+    def _file_words(self, rel: str) -> Tuple[Set[str], Set[str], Set[str]]:
+        """(path, symbol, summary) words of a file, computed once."""
+        words = self._words.get(rel)
+        if words is None:
+            entry = self.files[rel]
+            words = self._words[rel] = (
+                _words(rel.rsplit(".", 1)[0]),
+                _words(" ".join(str(name) for _, name, _ in entry["symbols"])),
+                _words(entry["summary"]),
+            )
+        return words
+
+    def rank(self, text: str) -> List[Tuple[str, float]]:
+        """
+        Text files by relevance to text (e.g. a ticket), best first.
+
+        Args:
+            text: What the context is for
+
+        Returns:
+            [(path, score)] for files scoring above 0
+        """
+        wanted = _words(text)
+        lowered = text.lower()
+        identifiers = set(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", text))
+        direct: Dict[str, float] = {}
+        for rel, entry in self.files.items():
+            # Binary and empty files, and package markers (an __init__.py defining nothing), have nothing to show
+            if not entry["text"] or not entry["size"] or (
+                    rel.endswith("__init__.py") and not (entry["symbols"] or entry["imports"])):
+                continue
+            path_w, symbol_w, summary_w = self._file_words(rel)
+            score = 3.0 * len(wanted & path_w) + 2.0 * len(wanted & symbol_w) + 1.0 * len(wanted & summary_w)
+            name = rel.rsplit("/", 1)[-1]
+            if rel.lower() in lowered or ("." in name and len(name) > 4 and name.lower() in lowered):
+                score += 10.0
+            for kind, value, _ in entry["symbols"]:
+                # Names and routes quoted in the text itself (f_7, parse_config, /health)
+                if kind == "route":
+                    score += 3.0 if value.lower() in lowered else 0.0
+                elif len(value) >= 3 and value.rsplit(".", 1)[-1] in identifiers:
+                    score += 4.0
+            direct[rel] = score
+
+        scores = dict(direct)
+        # Modules the best matches import, or are imported by, are likely to be touched too
+        best = sorted((rel for rel, score in direct.items() if score > 0), key=lambda r: -direct[r])[:5]
+        for rel in best:
+            for other in self.imports.get(rel, []) + self.importers.get(rel, []):
+                if other in scores:
+                    scores[other] += 0.3 * direct[rel]
+        top = max(scores.values(), default=0.0)
+        for rel in scores:
+            # Weak matches next to strong ones are noise: keep what scores at least a quarter of the best
+            if top > 0 and scores[rel] < top / 4:
+                scores[rel] = 0.0
+                continue
+            name = rel.rsplit("/", 1)[-1]
+            if name in ENTRY_POINTS:
+                scores[rel] += 0.5
+            # Package __init__ files are "imported" by every import of a submodule
+            if name != "__init__.py":
+                scores[rel] += min(1.0, 0.2 * len(self.importers.get(rel, [])))
+            if is_test_file(rel):
+                scores[rel] *= 0.5
+        return sorted(((rel, round(s, 3)) for rel, s in scores.items() if s > 0), key=lambda item: (-item[1], item[0]))
+
+    def tests_for(self, rel: str) -> List[str]:
+        """Test files that import rel directly, or are named after it (tests/test_<name>.py)."""
+        stem = rel.rsplit("/", 1)[-1][:-3] if rel.endswith(".py") else None
+        tests = [t for t in self.importers.get(rel, []) if is_test_file(t)]
+        if stem:
+            tests += sorted(t for t in self.files if is_test_file(t) and t.rsplit("/", 1)[-1] in (
+                f"test_{stem}.py", f"{stem}_test.py") and t not in tests)
+        return tests
+
+    def outline(self, rel: str) -> str:
+        """One line describing a file: path, summary and what it defines."""
+        entry = self.files[rel]
+        names = [str(name) for kind, name, _ in entry["symbols"]
+                 if kind != "route" and not str(name).rsplit(".", 1)[-1].startswith("_")][:12]
+        routes = [str(name) for kind, name, _ in entry["symbols"] if kind == "route"][:6]
+        parts = [rel]
+        if entry["summary"]:
+            parts.append(f"- {entry['summary']}")
+        if names:
+            parts.append(f"[defines: {', '.join(names)}]")
+        if routes:
+            parts.append(f"[routes: {', '.join(routes)}]")
+        return " ".join(parts)
+
+    def select(self, text: str, max_files: int, max_chars: int) -> Tuple[List[str], List[str]]:
+        """
+        Files to show in full for text, and outline lines for the next most relevant ones.
+
+        Args:
+            text: What the context is for (e.g. a ticket)
+            max_files: Most files shown in full
+            max_chars: Most characters of file content in total
+
+        Returns:
+            (paths to show in full, outline lines of related files)
+        """
+        ranked = self.rank(text)
+        chosen: List[str] = []
+        used = 0
+
+        def take(rel: str) -> None:
+            nonlocal used
+            size = min(self.files[rel]["size"], MAX_FILE_CHARS)
+            if rel not in chosen and len(chosen) < max_files and used + size <= max_chars:
+                chosen.append(rel)
+                used += size
+
+        for rel, _ in ranked:
+            if len(chosen) >= max_files:
+                break
+            if is_test_file(rel):
+                continue
+            take(rel)
+            # The tests covering a chosen file show how it is exercised (and where new tests go)
+            for test in self.tests_for(rel)[:1]:
+                take(test)
+        for rel, _ in ranked:
+            # Room left (few source matches): the best-matching tests themselves
+            take(rel)
+        outline = [self.outline(rel) for rel, _ in ranked if rel not in chosen][:MAX_OUTLINE_FILES]
+        return chosen, outline
+
+
+def _repo_lock(key: str) -> threading.Lock:
+    with _memo_lock:
+        return _repo_locks.setdefault(key, threading.Lock())
+
+
+def load_code_index(repo_path: str) -> CodeIndex:
+    """
+    The index of a checkout as it is now, updating the stored one by blob id.
+
+    Args:
+        repo_path: Checkout to index
+
+    Returns:
+        CodeIndex for the current working tree
+    """
+    key = os.path.realpath(repo_path)
+    with span("code_index") as s:
+        tree, blobs = _snapshot(repo_path)
+        with _memo_lock:
+            index = _memo.get(key)
+        if index is not None and index.tree == tree:
+            s["files"] = len(index.files)
+            s["indexed"] = 0
+            return index
+
+        # One update per repository at a time; concurrent callers wait and reuse it
+        with _repo_lock(key):
+            with _memo_lock:
+                index = _memo.get(key)
+            if index is not None and index.tree == tree:
+                s["files"] = len(index.files)
+                s["indexed"] = 0
+                return index
+
+            if blobs is None:
+                blobs = {rel: sha for rel, sha in tree_blobs(repo_path, tree).items() if not _skipped(rel)}
+            s["files"] = len(blobs)
+            cache_path = os.path.join(get_cache_dir("code_index"), f"{repo_cache_key(repo_path)}.json")
+            stored = read_cache_json(cache_path) or {}
+            previous = stored.get("files", {}) if stored.get("version") == INDEX_VERSION else {}
+
+            files: Dict[str, Dict] = {}
+            indexed = 0
+            for rel, blob in sorted(blobs.items()):
+                entry = previous.get(rel)
+                if entry is None or entry["blob"] != blob:
+                    try:
+                        data = Path(repo_path, rel).read_bytes()
+                    except OSError:
+                        continue
+                    entry = _index_file(rel, data, blob)
+                    indexed += 1
+                files[rel] = entry
+            s["indexed"] = indexed
+
+            if indexed or stored.get("tree") != tree or len(previous) != len(files):
+                write_cache_json(cache_path, {"version": INDEX_VERSION, "tree": tree, "files": files})
+            index = CodeIndex(repo_path, tree, files)
+            with _memo_lock:
+                _memo[key] = index
+            return index
+
+
+def select_context(repo_path: str, text: str, max_files: Optional[int] = None,
+                   max_chars: Optional[int] = None) -> Tuple[List[str], List[str]]:
+    """
+    Files most relevant to text (e.g. a ticket), via the repository's code index.
+
+    Args:
+        repo_path: Checkout the context is taken from
+        text: What the context is for
+        max_files: Most files shown in full (default RELIQUARY_CONTEXT_FILES)
+        max_chars: Most characters of content in total (default RELIQUARY_CONTEXT_CHARS)
+
+    Returns:
+        (paths to show in full, outline lines of the next most relevant files)
+    """
+    default_files, default_chars = context_limits()
+    index = load_code_index(repo_path)
+    with span("select_context") as s:
+        chosen, outline = index.select(text, max_files or default_files, max_chars or default_chars)
+        s["chosen"] = chosen
+    return chosen, outline
@@ -0,0 +1,172 @@
+"""
+Git-compatible unified diffs built in process.
+
+Produces what `git diff` prints for a text change, including the new/deleted
+file headers and the blob ids on the index line, so the result applies with
+`git apply` without writing files or spawning git.
+
+Lines are matched patience-style (like `git diff --patience`): lines that
+occur exactly once on both sides anchor the match, and only the gaps between
+anchors go through difflib. difflib alone slows down sharply on large files
+with scattered changes.
+"""
+import bisect
+import difflib
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+NO_NEWLINE = "\\ No newline at end of file\n"
+
+# Object id git shows for a missing side (new or deleted file)
+NULL_BLOB = "0" * 7
+
+
+def split_lines(text: str) -> List[str]:
+    """Lines with their "\\n" kept; unlike str.splitlines, only "\\n" ends a line (CRLF stays intact)."""
+    if not text:
+        return []
+    lines = text.split("\n")
+    out = [line + "\n" for line in lines[:-1]]
+    if lines[-1]:
+        out.append(lines[-1])
+    return out
+
+
+def blob_id(content: str) -> str:
+    """Abbreviated git object id of a file with this content (as on a diff's index line)."""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()[:7]
+
+
+def _unique_anchors(a: List[str], b: List[str], alo: int, ahi: int, blo: int, bhi: int) -> List[Tuple[int, int]]:
+    """Longest increasing run of (i, j) pairs of lines unique in both ranges."""
+    counts: Dict[str, List[int]] = {}
+    for i in range(alo, ahi):
+        entry = counts.setdefault(a[i], [0, i, 0, -1])
+        entry[0] += 1
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[2] += 1
+            entry[3] = j
+    pairs = sorted((e[1], e[3]) for e in counts.values() if e[0] == 1 and e[2] == 1)
+
+    # Longest increasing subsequence of the b indexes (patience sorting)
+    tails: List[int] = []
+    tail_at: List[int] = []
+    back: List[int] = []
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_at.append(k)
+        else:
+            tails[pos] = j
+            tail_at[pos] = k
+        back.append(tail_at[pos - 1] if pos else -1)
+    run = []
+    k = tail_at[-1] if tail_at else -1
+    while k >= 0:
+        run.append(pairs[k])
+        k = back[k]
+    return run[::-1]
+
+
+def _match(a: List[str], b: List[str], alo: int, ahi: int, blo: int, bhi: int, blocks: List[Tuple[int, int, int]]) -> None:
+    """Append the matching (i, j, 1) lines of a[alo:ahi] and b[blo:bhi] to blocks, in order."""
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        blocks.append((alo, blo, 1))
+        alo, blo = alo + 1, blo + 1
+    tail = []
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi, bhi = ahi - 1, bhi - 1
+        tail.append((ahi, bhi, 1))
+    # Two different lines (the common case for a one-line change) can't match
+    if alo < ahi and blo < bhi and (ahi - alo > 1 or bhi - blo > 1):
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            for i, j in anchors:
+                if alo < i and blo < j:
+                    _match(a, b, alo, i, blo, j, blocks)
+                blocks.append((i, j, 1))
+                alo, blo = i + 1, j + 1
+            _match(a, b, alo, ahi, blo, bhi, blocks)
+        else:
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            blocks.extend((alo + i, blo + j, n) for i, j, n in matcher.get_matching_blocks() if n)
+    blocks.extend(reversed(tail))
+
+
+class _Matcher(difflib.SequenceMatcher):
+    """SequenceMatcher over precomputed matching blocks (for its hunk grouping)."""
+
+    def __init__(self, a: List[str], b: List[str]):
+        self.a, self.b = a, b
+        blocks: List[Tuple[int, int, int]] = []
+        _match(a, b, 0, len(a), 0, len(b), blocks)
+        merged: List[Tuple[int, int, int]] = []
+        for i, j, n in blocks:
+            if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+                merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+            else:
+                merged.append((i, j, n))
+        self.matching_blocks = merged + [(len(a), len(b), 0)]
+        self.opcodes = None
+
+
+def _hunk_range(start: int, stop: int) -> str:
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+def unified_file_diff(path: str, old: Optional[str], new: Optional[str], context: int = 3,
+                      mode: str = "100644") -> str:
+    """
+    Git-style unified diff of one file, built in memory (applies with `git apply`).
+
+    Args:
+        path: Repo-relative path (forward slashes)
+        old: Current content, or None for a new file
+        new: New content, or None for a deleted file
+        context: Context lines around each change
+        mode: Git file mode (100755 for executables)
+
+    Returns:
+        The diff (with diff --git / new or deleted file / index headers), or "" when nothing changed
+    """
+    if old == new or (old is None and new is None):
+        return ""
+    out = [f"diff --git a/{path} b/{path}\n"]
+    if old is None:
+        out.append(f"new file mode {mode}\n")
+        out.append(f"index {NULL_BLOB}..{blob_id(new)}\n")
+    elif new is None:
+        out.append(f"deleted file mode {mode}\n")
+        out.append(f"index {blob_id(old)}..{NULL_BLOB}\n")
+    else:
+        out.append(f"index {blob_id(old)}..{blob_id(new)} {mode}\n")
+
+    a, b = split_lines(old or ""), split_lines(new or "")
+    groups = list(_Matcher(a, b).get_grouped_opcodes(context))
+    if groups:
+        out.append("--- /dev/null\n" if old is None else f"--- a/{path}\n")
+        out.append("+++ /dev/null\n" if new is None else f"+++ b/{path}\n")
+    body = []
+    for group in groups:
+        first, last = group[0], group[-1]
+        body.append(f"@@ -{_hunk_range(first[1], last[2])} +{_hunk_range(first[3], last[4])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                body.extend(" " + line for line in a[i1:i2])
+                continue
+            body.extend("-" + line for line in a[i1:i2])
+            body.extend("+" + line for line in b[j1:j2])
+    for line in body:
+        if line.endswith("\n"):
+            out.append(line)
+        else:
+            # Last line of a file without a trailing newline
+            out.append(line + "\n" + NO_NEWLINE)
+    return "".join(out)
@@ -0,0 +1,231 @@
+"""
+File changes proposed by the owner agent, applied in memory.
+
+An edit is {"path", "search", "replace"}: "search" must occur exactly once in
+the file (after earlier edits to the same file) and is replaced by "replace".
+An empty "search" creates a new file with "replace" as its content. A full
+file is {"path", "content"}. Either form deletes the file with
+{"path", "delete": true}. The result is turned straight into a unified diff,
+without writing files or running git.
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from reliquary.tools.diff_tools import split_lines, unified_file_diff
+
+# {rel_path: (original content or None for a new file, new content or None for a deleted file)}
+Changes = Dict[str, Tuple[Optional[str], Optional[str]]]
+
+
+class EditError(ValueError):
+    """An edit that can't be applied (unknown file, search text missing or ambiguous)."""
+
+
+def _safe_path(repo_path: str, rel: str) -> Path:
+    rel = (rel or "").replace("\\", "/").strip()
+    target = (Path(repo_path) / rel).resolve()
+    if not rel or os.path.isabs(rel) or not target.is_relative_to(Path(repo_path).resolve()):
+        raise EditError(f"Edit path outside the repository: {rel!r}")
+    return target
+
+
+def _read(path: Path) -> str:
+    # newline="" keeps CRLF files byte-for-byte
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def _locate_loose(content: str, search: str) -> Optional[Tuple[int, int]]:
+    """(start, end) of the one run of lines equal to search's lines ignoring trailing whitespace."""
+    lines = split_lines(content)
+    wanted = [l.rstrip() for l in split_lines(search)]
+    if not wanted:
+        return None
+    starts = [
+        i for i in range(len(lines) - len(wanted) + 1)
+        if [l.rstrip() for l in lines[i:i + len(wanted)]] == wanted
+    ]
+    if len(starts) != 1:
+        return None
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets[starts[0]], offsets[starts[0] + len(wanted)]
+
+
+def _replace_once(path: str, content: str, search: str, replace: str) -> str:
+    count = content.count(search)
+    if count == 1:
+        return content.replace(search, replace, 1)
+    if count > 1:
+        raise EditError(f"Search text occurs {count} times in {path}; include more context")
+
+    # Models often drift on trailing whitespace; accept a unique line-wise match.
+    span = _locate_loose(content, search)
+    if span is None:
+        raise EditError(f"Search text not found in {path}")
+    start, end = span
+    if not replace.endswith("\n") and content[start:end].endswith("\n"):
+        replace += "\n"
+    return content[:start] + replace + content[end:]
+
+
+def _entry_path(repo_path: str, entry: Any) -> Tuple[str, Path]:
+    if not isinstance(entry, dict):
+        raise EditError(f"Change must be an object, got {type(entry).__name__}")
+    rel = str(entry.get("path", "")).replace("\\", "/").strip()
+    return rel, _safe_path(repo_path, rel)
+
+
+def _current(files: Changes, rel: str, target: Path) -> Tuple[Optional[str], Optional[str]]:
+    """(original, current) content of a file, counting earlier changes."""
+    if rel in files:
+        return files[rel]
+    if target.is_file():
+        content = _read(target)
+        return content, content
+    return None, None
+
+
+def _delete(files: Changes, rel: str, original: Optional[str], content: Optional[str]) -> str:
+    if content is None:
+        raise EditError(f"File not found: {rel}")
+    files[rel] = (original, None)
+    return rel
+
+
+def apply_edit(repo_path: str, files: Changes, edit: Dict[str, Any]) -> str:
+    """
+    Apply one edit on top of earlier ones, updating files in place.
+
+    Args:
+        repo_path: Repository the edit refers to (not modified)
+        files: Changes so far
+        edit: {"path", "search", "replace"} or {"path", "delete": true}
+
+    Returns:
+        Path of the file the edit changed
+
+    Raises:
+        EditError: The edit can't be applied unambiguously
+    """
+    rel, target = _entry_path(repo_path, edit)
+    original, content = _current(files, rel, target)
+    if edit.get("delete"):
+        return _delete(files, rel, original, content)
+
+    search = edit.get("search") or ""
+    replace = edit.get("replace") or ""
+    if content is None:
+        if search:
+            raise EditError(f"File not found: {rel}")
+        files[rel] = (original, replace)
+        return rel
+    if not search:
+        raise EditError(f"Empty search text for existing file {rel}")
+    files[rel] = (original, _replace_once(rel, content, search, replace))
+    return rel
+
+
+def apply_file(repo_path: str, files: Changes, entry: Dict[str, Any]) -> str:
+    """
+    Apply one full-file change on top of earlier ones, updating files in place.
+
+    Args:
+        repo_path: Repository the change refers to (not modified)
+        files: Changes so far
+        entry: {"path", "content"} or {"path", "delete": true}
+
+    Returns:
+        Path of the file
+
+    Raises:
+        EditError: Bad path, or deleting a file that doesn't exist
+        KeyError: No content given
+    """
+    rel, target = _entry_path(repo_path, entry)
+    original, content = _current(files, rel, target)
+    if entry.get("delete"):
+        return _delete(files, rel, original, content)
+    files[rel] = (original, str(entry["content"]))
+    return rel
+
+
+def apply_edits(repo_path: str, edits: List[Dict[str, Any]]) -> Changes:
+    """
+    Apply search/replace edits to the repo's files in memory.
+
+    Args:
+        repo_path: Repository the edits refer to (not modified)
+        edits: [{"path", "search", "replace"}], applied in order
+
+    Returns:
+        Changes: {rel_path: (original content or None, new content or None)}
+
+    Raises:
+        EditError: An edit can't be applied unambiguously
+    """
+    files: Changes = {}
+    for edit in edits:
+        apply_edit(repo_path, files, edit)
+    return files
+
+
+def file_diff(repo_path: str, rel: str, old: Optional[str], new: Optional[str]) -> str:
+    """Diff of one changed file, with the mode of the file in the repo."""
+    target = Path(repo_path) / rel
+    mode = "100755" if target.is_file() and os.access(target, os.X_OK) else "100644"
+    return unified_file_diff(rel, old, new, mode=mode)
+
+
+def changes_to_diff(repo_path: str, files: Changes) -> str:
+    """
+    Combined git-style diff of in-memory changes, all files in one pass.
+
+    Args:
+        repo_path: Repository the changes refer to
+        files: Changes from apply_edits() / apply_file()
+
+    Returns:
+        The diff ("" when nothing changes)
+    """
+    return "".join(file_diff(repo_path, rel, old, new) for rel, (old, new) in files.items())
+
+
+def edits_to_diff(repo_path: str, edits: List[Dict[str, Any]]) -> str:
+    """
+    Unified diff for a list of edits, built in memory.
+
+    Args:
+        repo_path: Repository the edits refer to
+        edits: See apply_edits()
+
+    Returns:
+        Combined diff of every changed file ("" when nothing changes)
+
+    Raises:
+        EditError: An edit can't be applied unambiguously
+    """
+    return changes_to_diff(repo_path, apply_edits(repo_path, edits))
+
+
+def files_to_diff(repo_path: str, entries: List[Dict[str, Any]]) -> str:
+    """
+    Unified diff for complete new file contents, built in memory.
+
+    Args:
+        repo_path: Repository the files belong to
+        entries: [{"path", "content"} or {"path", "delete": true}]
+
+    Returns:
+        Combined diff of every changed file ("" when nothing changes)
+
+    Raises:
+        EditError: Bad path, or deleting a file that doesn't exist
+        KeyError: An entry without content
+    """
+    files: Changes = {}
+    for entry in entries:
+        apply_file(repo_path, files, entry)
+    return changes_to_diff(repo_path, files)
@@ -1,27 +1,696 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import platform
+import shlex
+import signal
 import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from reliquary.schemas.evidence import CommandRun
+from reliquary.tools.pytest_daemon import run_pytest_warm, arun_pytest_warm
+from reliquary.storage.cache_store import get_cache_dir, read_cache_json, write_cache_json
+from reliquary.storage.trace_store import span
 
-def run_command(repo_path: str, command: str, out_dir: str, label: str) -> CommandRun:
+# Output is copied to the artifact files in chunks of this size
+CHUNK_BYTES = 64 * 1024
+
+# Bytes of each stream kept in memory for the CommandRun summary
+TAIL_BYTES = 4 * 1024
+
+# Bytes read back from disk when tailing a running command's output
+LIVE_TAIL_BYTES = 64 * 1024
+
+# Time left to read the remaining output once the command's process group is
+# gone, even when the command finished right at its wall-clock limit
+DRAIN_GRACE_S = 2.0
+
+
+def command_limits(timeout_s: Optional[float] = None, max_output_bytes: Optional[int] = None) -> Tuple[float, int]:
+    """
+    Wall-clock and output-size limits for a command (explicit values win over the environment).
+
+    RELIQUARY_COMMAND_TIMEOUT_S (default 1800) and RELIQUARY_COMMAND_MAX_OUTPUT_MB
+    (default 200, stdout and stderr combined) apply when no value is passed.
+
+    Returns:
+        (timeout_s, max_output_bytes)
+    """
+    if timeout_s is None:
+        timeout_s = float(os.getenv("RELIQUARY_COMMAND_TIMEOUT_S", "1800"))
+    if max_output_bytes is None:
+        max_output_bytes = int(float(os.getenv("RELIQUARY_COMMAND_MAX_OUTPUT_MB", "200")) * 1024 * 1024)
+    return timeout_s, max_output_bytes
+
+
+def _output_paths(out_dir: str, label: str) -> Tuple[str, str]:
     Path(out_dir).mkdir(parents=True, exist_ok=True)
     stdout_path = str(Path(out_dir) / f"{label}.stdout.txt")
     stderr_path = str(Path(out_dir) / f"{label}.stderr.txt")
+    return stdout_path, stderr_path
+
+
+def _status_path(out_dir: str, label: str) -> str:
+    return str(Path(out_dir) / f"{label}.status.json")
+
+
+def _write_status(out_dir: str, label: str, **fields: Any) -> None:
+    # Read by live_command() (the API) while the command runs; replaced atomically.
+    write_cache_json(_status_path(out_dir, label), {"label": label, **fields})
+
+
+def read_tail(path: str, max_bytes: int = LIVE_TAIL_BYTES) -> str:
+    """The last max_bytes of a (possibly still growing) text file; empty if it doesn't exist."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            data = f.read(max_bytes)
+    except OSError:
+        return ""
+    return data.decode("utf-8", errors="replace")
+
+
+class _OutputSink:
+    """Writes one stream to its artifact file and keeps a bounded tail in memory."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.tail = deque()
+        self.tail_size = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def write(self, chunk: bytes) -> None:
+        with self.lock:
+            # A pump abandoned at the deadline may still deliver a late chunk.
+            if self.file.closed:
+                return
+            self.file.write(chunk)
+            self.file.flush()
+            self.bytes += len(chunk)
+            self.tail.append(chunk)
+            self.tail_size += len(chunk)
+            while self.tail_size - len(self.tail[0]) >= TAIL_BYTES:
+                self.tail_size -= len(self.tail.popleft())
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+    def text(self) -> str:
+        return b"".join(self.tail)[-TAIL_BYTES:].decode("utf-8", errors="replace")
+
+
+def _shell_argv(command: str) -> List[str]:
+    # PowerShell on Windows; POSIX workers have no PowerShell, so use sh there
+    if os.name == "nt":
+        return ["powershell", "-NoProfile", "-Command", command]
+    return ["/bin/sh", "-c", command]
+
+
+def format_argv(argv: List[str]) -> str:
+    """Display form of an argv (recorded as CommandRun.command and used in cache keys)."""
+    return subprocess.list2cmdline(argv) if os.name == "nt" else shlex.join(argv)
+
+
+def venv_python(repo_path: str) -> str:
+    """
+    The target repo's .venv interpreter for this platform.
+
+    Windows venvs put it in .venv/Scripts/python.exe, POSIX ones in
+    .venv/bin/python; whichever exists is used, preferring the platform's own
+    layout. Without a venv the platform's path is returned, and running it
+    fails with a recorded spawn error.
+
+    Args:
+        repo_path: Target repository
+
+    Returns:
+        Absolute path to the interpreter
+    """
+    venv = os.path.abspath(os.path.join(repo_path, ".venv"))
+    windows = [os.path.join(venv, "Scripts", "python.exe"), os.path.join(venv, "Scripts", "python")]
+    posix = [os.path.join(venv, "bin", "python")]
+    candidates = windows + posix if os.name == "nt" else posix + windows
+    return next((c for c in candidates if os.path.exists(c)), candidates[0])
+
+
+def _group_kwargs() -> Dict[str, Any]:
+    # Own process group, so limits and cancellation reach the command's children too.
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
 
-    # Use PowerShell to run commands consistently on Windows
-    proc = subprocess.run(
-        ["powershell", "-NoProfile", "-Command", command],
-        cwd=repo_path,
-        capture_output=True,
-        text=True,
-    )
 
-    Path(stdout_path).write_text(proc.stdout or "", encoding="utf-8")
-    Path(stderr_path).write_text(proc.stderr or "", encoding="utf-8")
+def _kill_group(pid: int) -> None:
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], capture_output=True)
+        return
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
 
-    return CommandRun(
+
+class _Limits:
+    """Shared output budget of one command; trips once, recording why the command was stopped."""
+
+    def __init__(self, pid: int, max_output_bytes: int, sinks: List[_OutputSink]):
+        self.pid = pid
+        self.max_output_bytes = max_output_bytes
+        self.sinks = sinks
+        self.termination: Optional[str] = None
+
+    def check(self) -> None:
+        if self.termination is None and sum(s.bytes for s in self.sinks) > self.max_output_bytes:
+            self.stop("output_limit")
+
+    def stop(self, reason: str) -> None:
+        if self.termination is None:
+            self.termination = reason
+            _kill_group(self.pid)
+
+
+def _drain_deadline(deadline: float) -> float:
+    return max(deadline, time.monotonic() + DRAIN_GRACE_S)
+
+
+async def _exited(proc: asyncio.subprocess.Process) -> int:
+    # Process.wait() also waits for the pipes to close, which a background
+    # child can hold open indefinitely; returncode is set as soon as it exits.
+    waiting = asyncio.ensure_future(proc.wait())
+    try:
+        while proc.returncode is None and not waiting.done():
+            await asyncio.wait({waiting}, timeout=0.05)
+    finally:
+        waiting.cancel()
+    return proc.returncode
+
+
+def _started(out_dir: str, label: str, command: str, pid: Optional[int],
+             stdout_path: str, stderr_path: str) -> Tuple[float, str]:
+    started_at = datetime.utcnow().isoformat()
+    _write_status(out_dir, label, command=command, pid=pid, status="running", started_at=started_at,
+                  stdout_path=stdout_path, stderr_path=stderr_path)
+    return time.monotonic(), started_at
+
+
+def _finished(out_dir: str, label: str, command: str, exit_code: int, stdout_path: str, stderr_path: str,
+              started: Tuple[float, str], termination: Optional[str], tail: str) -> CommandRun:
+    run = CommandRun(
         command=command,
-        exit_code=proc.returncode,
+        exit_code=exit_code,
         stdout_path=stdout_path,
         stderr_path=stderr_path,
+        duration_s=round(time.monotonic() - started[0], 3),
+        termination=termination,
+        output_tail=tail,
     )
+    _write_status(out_dir, label, command=command, status=termination or "exited", exit_code=exit_code,
+                  started_at=started[1], finished_at=datetime.utcnow().isoformat(),
+                  duration_s=run.duration_s, stdout_path=stdout_path, stderr_path=stderr_path)
+    return run
+
+
+def _spawn_failed(out_dir: str, label: str, command: str, stdout_path: str, stderr_path: str,
+                  error: OSError) -> CommandRun:
+    # e.g. the venv interpreter doesn't exist: a failed run, not a crash of the graph
+    started = _started(out_dir, label, command, None, stdout_path, stderr_path)
+    Path(stdout_path).write_text("", encoding="utf-8")
+    Path(stderr_path).write_text(f"Failed to start {command}: {error}\n", encoding="utf-8")
+    return _finished(out_dir, label, command, 127, stdout_path, stderr_path, started, None, "")
+
+
+def _run_process(repo_path: str, argv: List[str], command: str, out_dir: str, label: str,
+                 timeout_s: Optional[float], max_output_bytes: Optional[int]) -> CommandRun:
+    stdout_path, stderr_path = _output_paths(out_dir, label)
+    timeout_s, max_output_bytes = command_limits(timeout_s, max_output_bytes)
+
+    with span("run_command", label=label) as s:
+        try:
+            proc = subprocess.Popen(
+                argv,
+                cwd=repo_path,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **_group_kwargs(),
+            )
+        except OSError as e:
+            s["exit_code"] = 127
+            return _spawn_failed(out_dir, label, command, stdout_path, stderr_path, e)
+        started = _started(out_dir, label, command, proc.pid, stdout_path, stderr_path)
+        sinks = [_OutputSink(stdout_path), _OutputSink(stderr_path)]
+        limits = _Limits(proc.pid, max_output_bytes, sinks)
+
+        def pump(stream, sink: _OutputSink) -> None:
+            with stream:
+                while True:
+                    chunk = stream.read1(CHUNK_BYTES)
+                    if not chunk:
+                        return
+                    sink.write(chunk)
+                    limits.check()
+
+        pumps = [threading.Thread(target=pump, args=(stream, sink), daemon=True)
+                 for stream, sink in zip((proc.stdout, proc.stderr), sinks)]
+        for t in pumps:
+            t.start()
+        deadline = time.monotonic() + timeout_s
+        try:
+            proc.wait(timeout=timeout_s)
+        except subprocess.TimeoutExpired:
+            limits.stop("timeout")
+            proc.wait()
+        finally:
+            # Background children (e.g. a server the tests started) would keep
+            # the pipes open, and the pumps with them, past the limit.
+            _kill_group(proc.pid)
+            if proc.returncode is None:
+                proc.wait()
+            drain_until = _drain_deadline(deadline)
+            for t in pumps:
+                t.join(max(drain_until - time.monotonic(), 0))
+            if any(t.is_alive() for t in pumps):
+                # Something outside the group still holds the output open.
+                limits.stop("timeout")
+            for sink in sinks:
+                sink.close()
+
+        s["exit_code"] = proc.returncode
+        s["output_bytes"] = sum(sink.bytes for sink in sinks)
+        if limits.termination:
+            s["termination"] = limits.termination
+
+    return _finished(out_dir, label, command, proc.returncode, stdout_path, stderr_path,
+                     started, limits.termination, sinks[0].text())
+
+
+async def _arun_process(repo_path: str, argv: List[str], command: str, out_dir: str, label: str,
+                        timeout_s: Optional[float], max_output_bytes: Optional[int]) -> CommandRun:
+    stdout_path, stderr_path = _output_paths(out_dir, label)
+    timeout_s, max_output_bytes = command_limits(timeout_s, max_output_bytes)
+
+    with span("run_command", label=label) as s:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                cwd=repo_path,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **_group_kwargs(),
+            )
+        except OSError as e:
+            s["exit_code"] = 127
+            return _spawn_failed(out_dir, label, command, stdout_path, stderr_path, e)
+        started = _started(out_dir, label, command, proc.pid, stdout_path, stderr_path)
+        sinks = [_OutputSink(stdout_path), _OutputSink(stderr_path)]
+        limits = _Limits(proc.pid, max_output_bytes, sinks)
+
+        async def pump(stream: asyncio.StreamReader, sink: _OutputSink) -> None:
+            while True:
+                chunk = await stream.read(CHUNK_BYTES)
+                if not chunk:
+                    return
+                sink.write(chunk)
+                limits.check()
+
+        pumps = asyncio.gather(pump(proc.stdout, sinks[0]), pump(proc.stderr, sinks[1]))
+        deadline = time.monotonic() + timeout_s
+        try:
+            try:
+                await asyncio.wait_for(_exited(proc), timeout_s)
+            except asyncio.TimeoutError:
+                limits.stop("timeout")
+                await _exited(proc)
+            # As in _run_process: background children must not hold the pipes open.
+            _kill_group(proc.pid)
+            try:
+                await asyncio.wait_for(pumps, _drain_deadline(deadline) - time.monotonic())
+            except asyncio.TimeoutError:
+                limits.stop("timeout")
+                # Something outside the group still holds the output open; stop
+                # reading it (asyncio.subprocess has no public way to do this).
+                proc._transport.close()
+        except asyncio.CancelledError:
+            # Cancelled (e.g. a losing speculative candidate): don't leave the command running.
+            _kill_group(proc.pid)
+            await _exited(proc)
+            pumps.cancel()
+            raise
+        finally:
+            for sink in sinks:
+                sink.close()
+
+        s["exit_code"] = proc.returncode
+        s["output_bytes"] = sum(sink.bytes for sink in sinks)
+        if limits.termination:
+            s["termination"] = limits.termination
+
+    return _finished(out_dir, label, command, proc.returncode, stdout_path, stderr_path,
+                     started, limits.termination, sinks[0].text())
+
+
+def run_argv(
+    repo_path: str,
+    argv: List[str],
+    out_dir: str,
+    label: str,
+    timeout_s: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+) -> CommandRun:
+    """
+    Spawn a program directly (no shell), streaming its output to the artifact files.
+
+    The default for verification: no shell startup cost and no dependency on
+    PowerShell. Output handling and limits are the same as run_command().
+
+    Args:
+        repo_path: Directory to run in
+        argv: Program and arguments (e.g. [venv_python(repo), "-m", "pytest", "-q"])
+        out_dir: Artifacts directory for {label}.stdout.txt / .stderr.txt / .status.json
+        label: Output file label
+        timeout_s: Wall-clock limit in seconds
+        max_output_bytes: Limit on stdout + stderr
+
+    Returns:
+        CommandRun; exit code 127 if the program could not be started
+    """
+    return _run_process(repo_path, argv, format_argv(argv), out_dir, label, timeout_s, max_output_bytes)
+
+
+async def arun_argv(
+    repo_path: str,
+    argv: List[str],
+    out_dir: str,
+    label: str,
+    timeout_s: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+) -> CommandRun:
+    """Async variant of run_argv()."""
+    return await _arun_process(repo_path, argv, format_argv(argv), out_dir, label, timeout_s, max_output_bytes)
+
+
+def run_command(
+    repo_path: str,
+    command: str,
+    out_dir: str,
+    label: str,
+    timeout_s: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+) -> CommandRun:
+    """
+    Run a command line through the platform shell, streaming its output to the artifact files.
+
+    Opt-in for commands that need shell syntax (pipes, redirection, ...);
+    prefer run_argv(). Only a bounded tail of the output is held in memory.
+    The command runs in its own process group, which is killed when it
+    exceeds the wall-clock or output-size limit (see command_limits()).
+
+    Args:
+        repo_path: Directory to run in
+        command: Command line (PowerShell on Windows, sh elsewhere)
+        out_dir: Artifacts directory for {label}.stdout.txt / .stderr.txt / .status.json
+        label: Output file label
+        timeout_s: Wall-clock limit in seconds
+        max_output_bytes: Limit on stdout + stderr
+
+    Returns:
+        CommandRun; termination is "timeout" or "output_limit" if the command was killed
+    """
+    return _run_process(repo_path, _shell_argv(command), command, out_dir, label, timeout_s, max_output_bytes)
+
+
+async def arun_command(
+    repo_path: str,
+    command: str,
+    out_dir: str,
+    label: str,
+    timeout_s: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+) -> CommandRun:
+    """Async variant of run_command; the event loop stays free while the command runs."""
+    return await _arun_process(repo_path, _shell_argv(command), command, out_dir, label, timeout_s, max_output_bytes)
+
+
+def live_command(run_dir: str, lines: int = 50) -> Optional[Dict[str, Any]]:
+    """
+    The most recently started command under a run directory, with the tail of its output.
+
+    Output is streamed to disk as commands run, so this works from another
+    process (the API) while a verification is still in progress.
+
+    Args:
+        run_dir: runs/{work_item_id}
+        lines: Number of trailing lines per stream
+
+    Returns:
+        Status record plus stdout_tail/stderr_tail, or None if no command has run
+    """
+    statuses = glob.glob(os.path.join(run_dir, "**", "*.status.json"), recursive=True)
+    if not statuses:
+        return None
+    records = [r for r in (read_cache_json(p) for p in statuses) if r]
+    if not records:
+        return None
+    # A command still running wins over ones that finished later (parallel candidates).
+    status = max(records, key=lambda r: (r.get("status") == "running", r.get("started_at", "")))
+
+    def tail(path: Optional[str]) -> List[str]:
+        text = read_tail(path) if path else ""
+        return text.splitlines()[-lines:] if lines > 0 else []
+
+    return {
+        **status,
+        "stdout_tail": tail(status.get("stdout_path")),
+        "stderr_tail": tail(status.get("stderr_path")),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Content-addressed CommandRun cache: a command's result is determined by the
+# exact source tree it ran on, the command line and the environment, so a
+# recorded pass or fail can be reused instead of running the command again.
+# Disable with RELIQUARY_COMMAND_CACHE=off.
+# ---------------------------------------------------------------------------
+
+# Environment variables that change how tests behave
+_FINGERPRINT_ENV_PREFIXES = ("PYTHON", "PYTEST")
+
+
+def command_cache_enabled() -> bool:
+    return os.getenv("RELIQUARY_COMMAND_CACHE", "on").lower() not in ("off", "0", "false")
+
+
+def env_fingerprint(repo_path: str) -> str:
+    """
+    Hash of what, besides the source tree, decides a test run's outcome.
+
+    Covers the platform, the repo venv's interpreter config and installed
+    distributions, and PYTHON*/PYTEST* environment variables.
+
+    Args:
+        repo_path: Target repository (its .venv is fingerprinted)
+
+    Returns:
+        Hex digest
+    """
+    h = hashlib.sha256()
+    h.update(platform.platform().encode())
+
+    venv = os.path.join(repo_path, ".venv")
+    cfg = Path(venv, "pyvenv.cfg")
+    if cfg.exists():
+        h.update(cfg.read_bytes())
+    # Windows: .venv/Lib/site-packages, POSIX: .venv/lib/pythonX.Y/site-packages
+    dists = glob.glob(os.path.join(venv, "Lib", "site-packages", "*.dist-info"))
+    dists += glob.glob(os.path.join(venv, "lib", "python*", "site-packages", "*.dist-info"))
+    for name in sorted(os.path.basename(d) for d in dists):
+        h.update(name.encode())
+
+    for key in sorted(os.environ):
+        if key.startswith(_FINGERPRINT_ENV_PREFIXES):
+            h.update(f"{key}={os.environ[key]}".encode())
+    return h.hexdigest()
+
+
+def command_cache_key(tree: str, command: str, fingerprint: str) -> str:
+    return hashlib.sha256("\0".join((tree, command, fingerprint)).encode()).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(get_cache_dir("command_runs", key[:2]), f"{key}.json")
+
+
+def lookup_command_run(key: str) -> Optional[CommandRun]:
+    """A recorded run for this key whose output files still exist, or None."""
+    entry = read_cache_json(_cache_path(key))
+    if not entry:
+        return None
+    run = CommandRun.model_validate(entry["run"])
+    if not (os.path.exists(run.stdout_path) and os.path.exists(run.stderr_path)):
+        return None
+    return run.model_copy(update={"cached": True})
+
+
+def record_command_run(key: str, run: CommandRun) -> None:
+    # A killed run isn't a property of the tree: hitting a limit can depend on machine load.
+    if run.termination:
+        return
+    # Absolute paths: the cached run links the original outputs from any run dir.
+    stored = run.model_copy(update={
+        "stdout_path": os.path.abspath(run.stdout_path),
+        "stderr_path": os.path.abspath(run.stderr_path),
+    })
+    write_cache_json(_cache_path(key), {"run": stored.model_dump(), "recorded_at": datetime.utcnow().isoformat()})
+
+
+def _link_outputs(run: CommandRun, out_dir: str, label: str) -> CommandRun:
+    # Leave a pointer in this attempt's artifacts to the outputs being reused.
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    Path(out_dir, f"{label}.cached.json").write_text(json.dumps({
+        "command": run.command,
+        "exit_code": run.exit_code,
+        "stdout_path": run.stdout_path,
+        "stderr_path": run.stderr_path,
+    }, indent=2), encoding="utf-8")
+    return run
+
+
+def _cache_lookup(tree: str, command: str, fingerprint: str, label: str) -> Tuple[str, Optional[CommandRun]]:
+    key = command_cache_key(tree, command, fingerprint)
+    with span("command_cache", label=label) as s:
+        hit = lookup_command_run(key)
+        s["hit"] = hit is not None
+    return key, hit
+
+
+def _cached(tree: str, command: str, fingerprint: str, out_dir: str, label: str,
+            execute: Callable[[], CommandRun]) -> CommandRun:
+    """execute(), unless a run of the same command on the same tree and environment was recorded."""
+    if not (tree and command_cache_enabled()):
+        return execute()
+
+    key, hit = _cache_lookup(tree, command, fingerprint, label)
+    if hit is not None:
+        return _link_outputs(hit, out_dir, label)
+
+    run = execute()
+    record_command_run(key, run)
+    return run
+
+
+async def _acached(tree: str, command: str, fingerprint: str, out_dir: str, label: str,
+                   execute: Callable[[], Awaitable[CommandRun]]) -> CommandRun:
+    """Async variant of _cached()."""
+    if not (tree and command_cache_enabled()):
+        return await execute()
+
+    key, hit = _cache_lookup(tree, command, fingerprint, label)
+    if hit is not None:
+        return _link_outputs(hit, out_dir, label)
+
+    run = await execute()
+    record_command_run(key, run)
+    return run
+
+
+# ---------------------------------------------------------------------------
+# pytest: cache first, then the warm worker for the repo's interpreter
+# (tools.pytest_daemon), then the interpreter spawned directly (no shell).
+# ---------------------------------------------------------------------------
+
+def pytest_argv(python: str, args: List[str]) -> List[str]:
+    return [python, "-m", "pytest", *args]
+
+
+def pytest_command(python: str, args: List[str]) -> str:
+    """The command line equivalent to a pytest run (also its cache key)."""
+    return format_argv(pytest_argv(python, args))
+
+
+def _run_pytest(repo_path: str, python: str, args: List[str], out_dir: str, label: str,
+                fingerprint: str, preload: Optional[Callable[[], List[str]]]) -> CommandRun:
+    command = pytest_command(python, args)
+    stdout_path, stderr_path = _output_paths(out_dir, label)
+    timeout_s, max_output_bytes = command_limits()
+    started = _started(out_dir, label, command, None, stdout_path, stderr_path)
+    result = run_pytest_warm(python, fingerprint, repo_path, args, stdout_path, stderr_path, preload,
+                             timeout_s=timeout_s, max_output_bytes=max_output_bytes)
+    if result is None:
+        return run_argv(repo_path=repo_path, argv=pytest_argv(python, args), out_dir=out_dir, label=label)
+    # The worker's child wrote the files directly; the summary tail comes from disk.
+    return _finished(out_dir, label, command, result[0], stdout_path, stderr_path,
+                     started, result[1], read_tail(stdout_path, TAIL_BYTES))
+
+
+async def _arun_pytest(repo_path: str, python: str, args: List[str], out_dir: str, label: str,
+                       fingerprint: str, preload: Optional[Callable[[], List[str]]]) -> CommandRun:
+    command = pytest_command(python, args)
+    stdout_path, stderr_path = _output_paths(out_dir, label)
+    timeout_s, max_output_bytes = command_limits()
+    started = _started(out_dir, label, command, None, stdout_path, stderr_path)
+    result = await arun_pytest_warm(python, fingerprint, repo_path, args, stdout_path, stderr_path, preload,
+                                    timeout_s=timeout_s, max_output_bytes=max_output_bytes)
+    if result is None:
+        return await arun_argv(repo_path=repo_path, argv=pytest_argv(python, args), out_dir=out_dir, label=label)
+    return _finished(out_dir, label, command, result[0], stdout_path, stderr_path,
+                     started, result[1], read_tail(stdout_path, TAIL_BYTES))
+
+
+def run_pytest(
+    repo_path: str,
+    python: str,
+    args: List[str],
+    out_dir: str,
+    label: str,
+    tree: str = "",
+    fingerprint: str = "",
+    preload: Optional[Callable[[], List[str]]] = None,
+) -> CommandRun:
+    """
+    Run pytest in a checkout, as cheaply as possible.
+
+    A cached result for the same tree/command/environment is reused; otherwise
+    the run goes to the warm pytest worker for `python` and, if no worker is
+    available, to the interpreter spawned directly (no shell).
+
+    Args:
+        repo_path: Checkout to run in
+        python: Target repo's interpreter
+        args: pytest arguments
+        out_dir: Artifacts directory for output files
+        label: Output file label
+        tree: Git tree hash of the checkout; empty skips the cache
+        fingerprint: env_fingerprint() of the target repo
+        preload: Returns modules for a new worker to import up front (only called when one starts)
+
+    Returns:
+        CommandRun
+    """
+    return _cached(tree, pytest_command(python, args), fingerprint, out_dir, label,
+                   lambda: _run_pytest(repo_path, python, args, out_dir, label, fingerprint, preload))
+
+
+async def arun_pytest(
+    repo_path: str,
+    python: str,
+    args: List[str],
+    out_dir: str,
+    label: str,
+    tree: str = "",
+    fingerprint: str = "",
+    preload: Optional[Callable[[], List[str]]] = None,
+) -> CommandRun:
+    """Async variant of run_pytest()."""
+    return await _acached(tree, pytest_command(python, args), fingerprint, out_dir, label,
+                          lambda: _arun_pytest(repo_path, python, args, out_dir, label, fingerprint, preload))
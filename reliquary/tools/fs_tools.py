@@ -1,18 +1,17 @@
+import os
 from pathlib import Path
 from typing import List
 
 def list_tree(root: str, max_files: int = 200) -> List[str]:
     root_path = Path(root)
     files = []
-    for p in root_path.rglob("*"):
-        if p.is_file():
-            rel = p.relative_to(root_path).as_posix()
-            # Skip venv and git internals
-            if rel.startswith(".git/") or rel.startswith(".venv/") or "/.venv/" in rel:
-                continue
-            files.append(rel)
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        # Skip venv and git internals (pruned, so they are never walked)
+        dirnames[:] = sorted(d for d in dirnames if d not in (".git", ".venv"))
+        for name in sorted(filenames):
+            files.append(Path(dirpath, name).relative_to(root_path).as_posix())
             if len(files) >= max_files:
-                break
+                return sorted(files)
     return sorted(files)
 
 def read_text(root: str, rel_path: str, max_chars: int = 12000) -> str:
@@ -1,13 +1,38 @@
+import asyncio
+import atexit
+import os
+import shutil
 import subprocess
+import tempfile
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
 
-def _run(repo_path: str, args: list[str]) -> subprocess.CompletedProcess:
+from reliquary.storage.trace_store import span
+
+def _run(repo_path: str, args: list[str], env: dict | None = None) -> subprocess.CompletedProcess:
     return subprocess.run(
         ["git"] + args,
         cwd=repo_path,
         capture_output=True,
         text=True,
         shell=False,
+        env={**os.environ, **env} if env else None,
+    )
+
+async def _arun(repo_path: str, args: list[str]) -> subprocess.CompletedProcess:
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args,
+        cwd=repo_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    return subprocess.CompletedProcess(
+        ["git"] + args,
+        proc.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
     )
 
 def ensure_clean_or_commit(repo_path: str) -> None:
@@ -18,7 +43,15 @@ def ensure_clean_or_commit(repo_path: str) -> None:
     return
 
 def get_diff(repo_path: str) -> str:
-    r = _run(repo_path, ["diff"])
+    with span("get_diff"):
+        r = _run(repo_path, ["diff"])
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr.strip())
+    return r.stdout
+
+async def aget_diff(repo_path: str) -> str:
+    with span("get_diff"):
+        r = await _arun(repo_path, ["diff"])
     if r.returncode != 0:
         raise RuntimeError(r.stderr.strip())
     return r.stdout
@@ -27,10 +60,264 @@ def apply_patch(repo_path: str, patch_path: str) -> None:
     p = Path(patch_path)
     if not p.exists():
         raise FileNotFoundError(patch_path)
-    r = _run(repo_path, ["apply", "--whitespace=fix", str(p)])
+    with span("apply_patch"):
+        r = _run(repo_path, ["apply", "--whitespace=fix", str(p)])
+    if r.returncode != 0:
+        raise RuntimeError(f"git apply failed:\n{r.stderr}")
+
+async def aapply_patch(repo_path: str, patch_path: str) -> None:
+    p = Path(patch_path)
+    if not p.exists():
+        raise FileNotFoundError(patch_path)
+    with span("apply_patch"):
+        r = await _arun(repo_path, ["apply", "--whitespace=fix", str(p)])
     if r.returncode != 0:
         raise RuntimeError(f"git apply failed:\n{r.stderr}")
 
+def tree_hash(repo_path: str) -> str:
+    """
+    Git tree hash of the working tree as it is now (tracked + untracked, minus ignored).
+
+    Uses a scratch copy of the index, so the checkout's real index, and
+    therefore `git diff`, is left alone. Copying it keeps its stat cache:
+    only files that changed since the last `git add` are re-hashed.
+    """
+    r = _run(repo_path, ["rev-parse", "--git-path", "index"])
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr.strip())
+    index = Path(repo_path, r.stdout.strip())
+
+    with span("tree_hash"), tempfile.TemporaryDirectory() as tmp:
+        scratch = os.path.join(tmp, "index")
+        if index.exists():
+            shutil.copyfile(index, scratch)
+        env = {"GIT_INDEX_FILE": scratch}
+        for args in (["add", "-A"], ["write-tree"]):
+            r = _run(repo_path, args, env=env)
+            if r.returncode != 0:
+                raise RuntimeError(r.stderr.strip())
+    return r.stdout.strip()
+
+def tree_blobs(repo_path: str, tree: str) -> dict[str, str]:
+    """{path: blob id} of every regular file in a git tree (e.g. from tree_hash); symlinks and submodules are left out."""
+    r = _run(repo_path, ["ls-tree", "-r", "-z", tree])
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr.strip())
+    blobs = {}
+    for record in r.stdout.split("\0"):
+        if not record:
+            continue
+        meta, path = record.split("\t", 1)
+        mode, kind, sha = meta.split()
+        if kind == "blob" and mode != "120000":
+            blobs[path] = sha
+    return blobs
+
 def create_patch_file(out_path: str, unified_diff: str) -> None:
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
     Path(out_path).write_text(unified_diff, encoding="utf-8")
+
+
+# `git worktree add/remove/prune` edit the shared .git/worktrees admin dir; a
+# prune racing an add can delete the half-created entry, so run them one at a time.
+_worktree_admin_lock = threading.Lock()
+
+def add_worktree(repo_path: str) -> str:
+    """Check out HEAD into a fresh detached worktree and return its path."""
+    path = tempfile.mkdtemp(prefix="reliquary_wt_")
+    with span("worktree_add"), _worktree_admin_lock:
+        r = _run(repo_path, ["worktree", "add", "--detach", "--force", path, "HEAD"])
+    if r.returncode != 0:
+        shutil.rmtree(path, ignore_errors=True)
+        raise RuntimeError(f"git worktree add failed:\n{r.stderr}")
+    return path
+
+def remove_worktree(repo_path: str, path: str) -> None:
+    with _worktree_admin_lock:
+        r = _run(repo_path, ["worktree", "remove", "--force", path])
+        shutil.rmtree(path, ignore_errors=True)
+        if r.returncode != 0:
+            _run(repo_path, ["worktree", "prune"])
+
+def head_sha(repo_path: str) -> str:
+    r = _run(repo_path, ["rev-parse", "HEAD"])
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr.strip())
+    return r.stdout.strip()
+
+
+# Idle worktrees kept per repository (RELIQUARY_WORKTREE_POOL_SIZE).
+DEFAULT_POOL_SIZE = 2
+
+
+class WorktreePool:
+    """
+    `git worktree` checkouts of one repository, handed out matching its working tree.
+
+    Verification applies patches and runs tests in a checkout from the pool
+    instead of the user's working tree, so attempts never stack on each other
+    and concurrent work items on the same repo stay isolated. Patches are
+    written against the working tree, uncommitted and untracked (not ignored)
+    files included, so a checkout is brought from HEAD to that state when it
+    is handed out. Returned checkouts are reset in place (reset --hard +
+    clean), which is much cheaper than adding a new worktree; up to `size` of
+    them are kept warm.
+    """
+
+    def __init__(self, repo_path: str, size: int = DEFAULT_POOL_SIZE):
+        self.repo_path = repo_path
+        self.size = size
+        self._idle: list[tuple[str, str]] = []  # (path, sha it is checked out at)
+        self._lock = threading.Lock()
+        self._closed = False
+        # Drop entries left behind by a process that died holding checkouts.
+        with _worktree_admin_lock:
+            _run(repo_path, ["worktree", "prune"])
+
+    def warm(self) -> None:
+        """Create idle checkouts until `size` are ready."""
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= self.size:
+                    return
+            try:
+                sha = head_sha(self.repo_path)
+                path = add_worktree(self.repo_path)
+            except RuntimeError:
+                # Not a usable repo (yet); acquire() will surface the error.
+                return
+            if not self._put(path, sha):
+                remove_worktree(self.repo_path, path)
+
+    def acquire(self) -> str:
+        path = self._acquire_head()
+        try:
+            self._match_working_tree(path)
+        except RuntimeError:
+            self.release(path)
+            raise
+        return path
+
+    def _match_working_tree(self, path: str) -> None:
+        # The objects are shared with the repo, so the user's working tree is
+        # one tree_hash() away; read-tree -u writes only the files that differ.
+        with span("worktree_sync") as s:
+            tree = tree_hash(self.repo_path)
+            head = _run(path, ["rev-parse", "HEAD^{tree}"])
+            s["dirty"] = head.stdout.strip() != tree
+            if s["dirty"]:
+                r = _run(path, ["read-tree", "-u", "--reset", tree])
+                if r.returncode != 0:
+                    raise RuntimeError(f"git read-tree failed:\n{r.stderr}")
+
+    def _acquire_head(self) -> str:
+        sha = head_sha(self.repo_path)
+        with self._lock:
+            entry = self._idle.pop() if self._idle else None
+
+        if entry is None:
+            with span("worktree_acquire", warm=False):
+                return add_worktree(self.repo_path)
+
+        path, at = entry
+        with span("worktree_acquire", warm=True):
+            if at != sha and not self._reset(path, sha):
+                # The checkout could not follow HEAD; start over with a new one.
+                remove_worktree(self.repo_path, path)
+                return add_worktree(self.repo_path)
+        return path
+
+    def release(self, path: str) -> None:
+        sha = head_sha(self.repo_path)
+        with span("worktree_reset"):
+            clean = self._reset(path, sha)
+        if not clean or not self._put(path, sha):
+            remove_worktree(self.repo_path, path)
+
+    def _reset(self, path: str, sha: str) -> bool:
+        # -x also drops ignored files (pytest caches, __pycache__) left behind by the tests.
+        reset = _run(path, ["reset", "-q", "--hard", sha])
+        clean = _run(path, ["clean", "-fdqx"])
+        return reset.returncode == 0 and clean.returncode == 0
+
+    def _put(self, path: str, sha: str) -> bool:
+        with self._lock:
+            if self._closed or len(self._idle) >= self.size:
+                return False
+            self._idle.append((path, sha))
+            return True
+
+    @contextmanager
+    def checkout(self):
+        """A checkout matching the working tree for the duration of the block."""
+        path = self.acquire()
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    @asynccontextmanager
+    async def acheckout(self):
+        """Async variant of checkout(); git runs off the event loop."""
+        path = await asyncio.to_thread(self.acquire)
+        try:
+            yield path
+        finally:
+            await asyncio.to_thread(self.release, path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for path, _ in idle:
+            remove_worktree(self.repo_path, path)
+
+
+_pools: dict[str, WorktreePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_worktree_pool(repo_path: str) -> WorktreePool:
+    """
+    Shared pool for a repository; the first call starts warming it in the background.
+
+    Args:
+        repo_path: Path to the repository
+
+    Returns:
+        The repository's WorktreePool
+    """
+    key = os.path.realpath(repo_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            size = int(os.getenv("RELIQUARY_WORKTREE_POOL_SIZE", str(DEFAULT_POOL_SIZE)))
+            pool = _pools[key] = WorktreePool(key, size=size)
+            threading.Thread(target=pool.warm, daemon=True).start()
+    return pool
+
+
+def close_worktree_pool(repo_path: str) -> None:
+    """Remove a repository's idle checkouts and forget its pool (e.g. before deleting the repo)."""
+    with _pools_lock:
+        pool = _pools.pop(os.path.realpath(repo_path), None)
+    if pool is not None:
+        pool.close()
+
+
+@atexit.register
+def close_worktree_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def worktree(repo_path: str):
+    """Checkout of the repo's working tree (HEAD plus uncommitted changes) from its pool, for a `with` block."""
+    return get_worktree_pool(repo_path).checkout()
+
+def aworktree(repo_path: str):
+    """Async variant of worktree(), for an `async with` block."""
+    return get_worktree_pool(repo_path).acheckout()
@@ -0,0 +1,311 @@
+import ast
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from reliquary.storage.cache_store import get_cache_dir, repo_cache_key, read_cache_json, write_cache_json
+from reliquary.storage.trace_store import span
+
+# Directories never scanned for modules
+SKIP_DIRS = {".git", ".venv", "venv", "env", "node_modules", "__pycache__", ".pytest_cache", ".tox", "build", "dist"}
+
+# Changes to these affect how every test runs; select the full suite.
+GLOBAL_FILES = {"conftest.py", "pytest.ini", "setup.cfg", "tox.ini", "pyproject.toml", "setup.py"}
+
+# Above this many selected test files, just run the full suite.
+MAX_SELECTED_TESTS = 200
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _diff_lines(diff_text: str):
+    """(line, new-side line number) pairs; file headers get line number None."""
+    old_left = new_left = line_no = 0
+    for line in (diff_text or "").splitlines():
+        if old_left > 0 or new_left > 0:
+            # Inside a hunk, so a removed "-- x" line is not a "--- " file header.
+            if line.startswith("+"):
+                new_left -= 1
+            elif line.startswith("-"):
+                old_left -= 1
+            elif not line.startswith("\\"):
+                old_left, new_left = old_left - 1, new_left - 1
+            yield line, line_no
+            if not line.startswith(("-", "\\")):
+                line_no += 1
+            continue
+        hunk = _HUNK_HEADER.match(line)
+        if hunk:
+            old_left = int(hunk.group(1) or 1)
+            line_no, new_left = int(hunk.group(2)), int(hunk.group(3) or 1)
+        yield line, None
+
+
+def _side_path(name: str) -> Optional[str]:
+    """Path on a ---/+++ line: "" for /dev/null, None when it can't be read."""
+    # git appends a tab to names containing spaces (other tools a timestamp).
+    name = name.split("\t")[0]
+    if name == "/dev/null":
+        return ""
+    if name.startswith(("a/", "b/")):
+        return name[2:]
+    return None
+
+
+def _header_path(header: str) -> Optional[str]:
+    # "diff --git a/<p> b/<p>" is only unambiguous when both sides name the same path.
+    rest = header[len("diff --git "):]
+    half = (len(rest) - 1) // 2
+    a, b = rest[:half], rest[half + 1:]
+    return a[2:] if a.startswith("a/") and b.startswith("b/") and a[2:] == b[2:] else None
+
+
+def changed_files(diff_text: str) -> List[str]:
+    """
+    Repo-relative paths touched by a unified diff (both sides of renames).
+
+    Paths are read from the ---/+++ and rename lines, so names with spaces
+    work. Returns an empty list (impact unknown) if any file's path can't be
+    read.
+    """
+    paths: List[str] = []
+    header = None  # git header of a file not named by any other line yet
+    for line, line_no in _diff_lines(diff_text):
+        if line_no is not None:
+            continue
+        if line.startswith("diff --git "):
+            path = _header_path(header) if header else ""
+            header = line
+        elif line.startswith(("--- ", "+++ ")):
+            path, header = _side_path(line[4:]), None
+        elif line.startswith(("rename from ", "rename to ")):
+            path, header = line.split(" ", 2)[2], None
+            if path.startswith('"'):
+                path = None
+        else:
+            continue
+        if path is None:
+            return []
+        if path and path not in paths:
+            paths.append(path)
+    if header:
+        path = _header_path(header)
+        if path is None:
+            return []
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+def added_lines(diff_text: str) -> Dict[str, Set[int]]:
+    """New-side line numbers of the lines a unified diff adds, per repo-relative path."""
+    added: Dict[str, Set[int]] = {}
+    current: Optional[Set[int]] = None
+    for line, line_no in _diff_lines(diff_text):
+        if line_no is None:
+            if line.startswith("+++ "):
+                target = _side_path(line[4:])
+                current = added.setdefault(target, set()) if target else None
+        elif current is not None and line.startswith("+"):
+            current.add(line_no)
+    return added
+
+
+def is_test_file(rel_path: str) -> bool:
+    name = os.path.basename(rel_path)
+    return rel_path.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _python_files(root: str) -> List[str]:
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.endswith(".egg-info")]
+        for f in filenames:
+            if f.endswith(".py"):
+                files.append(Path(os.path.join(dirpath, f)).relative_to(root).as_posix())
+    return sorted(files)
+
+
+def _module_names(rel_path: str) -> List[str]:
+    # pkg/mod.py -> pkg.mod, pkg/__init__.py -> pkg; src/ layouts also import without the prefix.
+    parts = rel_path[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    names = [".".join(parts)] if parts else []
+    if len(parts) > 1 and parts[0] == "src":
+        names.append(".".join(parts[1:]))
+    return names
+
+
+def parse_imports(rel_path: str, source: bytes, tree: Optional[ast.Module] = None) -> List[str]:
+    """Absolute module names a file imports (relative imports resolved against its package); tree skips parsing."""
+    if tree is None:
+        try:
+            tree = ast.parse(source, filename=rel_path)
+        except (SyntaxError, ValueError):
+            return []
+
+    package = rel_path[:-3].split("/")[:-1]
+    names: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - (node.level - 1)] if node.level - 1 <= len(package) else []
+                prefix = ".".join(base + ([node.module] if node.module else []))
+            else:
+                prefix = node.module or ""
+            # "from pkg import mod" may name a submodule; keep both candidates.
+            if prefix:
+                names.append(prefix)
+            names.extend(f"{prefix}.{a.name}" if prefix else a.name for a in node.names if a.name != "*")
+    return names
+
+
+def _parsed_imports(root: str, cache_key: Optional[str]) -> Dict[str, List[str]]:
+    """{rel_path: imported module names} for every Python file, via the per-repo cache."""
+    cache_path = os.path.join(get_cache_dir("import_graph"), f"{repo_cache_key(cache_key or root)}.json")
+    cache = read_cache_json(cache_path) or {}
+
+    with span("import_graph", cache_entries=len(cache)) as s:
+        files = _python_files(root)
+        raw: Dict[str, List[str]] = {}
+        parsed = 0
+        for rel in files:
+            source = Path(root, rel).read_bytes()
+            digest = hashlib.sha1(source).hexdigest()
+            entry = cache.get(rel)
+            if entry is None or entry["sha"] != digest:
+                entry = cache[rel] = {"sha": digest, "imports": parse_imports(rel, source)}
+                parsed += 1
+            raw[rel] = entry["imports"]
+        s["files"] = len(files)
+        s["parsed"] = parsed
+
+    if parsed or len(cache) != len(files):
+        write_cache_json(cache_path, {rel: cache[rel] for rel in files})
+    return raw
+
+
+def _modules_by_name(files) -> Dict[str, str]:
+    by_module: Dict[str, str] = {}
+    for rel in files:
+        for name in _module_names(rel):
+            by_module.setdefault(name, rel)
+    return by_module
+
+
+def build_import_graph(root: str, cache_key: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Map each Python file under root to the repo files it imports.
+
+    Parsed imports are cached per file content hash (in the cache dir, per
+    repository), so repeated calls on checkouts of the same repo only re-parse
+    files that changed.
+
+    Args:
+        root: Checkout to scan (e.g. a verification worktree)
+        cache_key: Repository the checkout belongs to (defaults to root)
+
+    Returns:
+        {rel_path: [imported rel_paths]}, only edges inside the repo
+    """
+    return resolve_import_graph(_parsed_imports(root, cache_key))
+
+
+def resolve_import_graph(raw: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """
+    Resolve parsed imports (see parse_imports()) to the repo files they load.
+
+    Args:
+        raw: {rel_path: imported module names} for every Python file
+
+    Returns:
+        {rel_path: [imported rel_paths]}, only edges inside the repo
+    """
+    by_module = _modules_by_name(raw)
+
+    graph: Dict[str, List[str]] = {}
+    for rel, names in raw.items():
+        # pytest puts a test file's own directory on sys.path, so sibling imports resolve too.
+        local = rel[:-3].split("/")[:-1]
+        deps: Set[str] = set()
+        for name in names:
+            for parts in (name.split("."), local + name.split(".")):
+                # "import a.b.c" also executes a/__init__.py and a/b/__init__.py
+                for i in range(len(parts), 0, -1):
+                    target = by_module.get(".".join(parts[:i]))
+                    if target and target != rel:
+                        deps.add(target)
+        graph[rel] = sorted(deps)
+    return graph
+
+
+def external_imports(root: str, cache_key: Optional[str] = None) -> List[str]:
+    """
+    Top-level modules the repo imports from outside itself (stdlib and third-party).
+
+    Args:
+        root: Checkout to scan
+        cache_key: Repository the checkout belongs to, for the import-graph cache
+
+    Returns:
+        Sorted top-level module names
+    """
+    raw = _parsed_imports(root, cache_key)
+    by_module = _modules_by_name(raw)
+    local_tops = {name.split(".")[0] for name in by_module}
+    return sorted({
+        name.split(".")[0]
+        for names in raw.values()
+        for name in names
+        if name and name.split(".")[0] not in local_tops
+    })
+
+
+def select_affected_tests(root: str, changed: List[str], cache_key: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Test files that (transitively) import any changed file.
+
+    Args:
+        root: Checkout with the patch applied
+        changed: Repo-relative paths the patch touches
+        cache_key: Repository the checkout belongs to, for the import-graph cache
+
+    Returns:
+        Sorted test paths, possibly empty; None when impact can't be bounded
+        (non-Python, pytest-config or deleted files, or too many tests) and
+        the full suite should run instead.
+    """
+    if not changed:
+        return None
+    for rel in changed:
+        if not rel.endswith(".py") or os.path.basename(rel) in GLOBAL_FILES:
+            return None
+        # A deleted module has no node left to find its importers from.
+        if not os.path.exists(os.path.join(root, rel)):
+            return None
+
+    graph = build_import_graph(root, cache_key=cache_key)
+
+    dependents: Dict[str, Set[str]] = {}
+    for rel, deps in graph.items():
+        for dep in deps:
+            dependents.setdefault(dep, set()).add(rel)
+
+    affected: Set[str] = set()
+    frontier = [rel for rel in changed if rel in graph]
+    while frontier:
+        rel = frontier.pop()
+        if rel in affected:
+            continue
+        affected.add(rel)
+        frontier.extend(dependents.get(rel, ()))
+
+    tests = sorted(rel for rel in affected if is_test_file(rel))
+    if len(tests) > MAX_SELECTED_TESTS:
+        return None
+    return tests
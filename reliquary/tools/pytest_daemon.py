@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import stat
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from reliquary.storage.trace_store import span
+
+# Standalone server script, run under the target repo's interpreter
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pytest_worker.py")
+
+# How long a new worker may take to import pytest + preloads before we fall back
+STARTUP_TIMEOUT_S = 30.0
+
+# Workers exit on their own after this long without requests
+IDLE_TIMEOUT_S = 900.0
+
+# Extra time the client waits beyond the run's own timeout, which the worker enforces
+REPLY_GRACE_S = 30.0
+
+_start_lock = threading.Lock()
+# Socket paths whose worker failed to start; use the subprocess path for them from now on
+_unavailable: set = set()
+
+
+def daemon_enabled() -> bool:
+    """The warm worker needs fork() and Unix sockets; RELIQUARY_PYTEST_DAEMON=off disables it."""
+    if os.getenv("RELIQUARY_PYTEST_DAEMON", "on").lower() in ("off", "0", "false"):
+        return False
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+
+def _socket_dir() -> Optional[str]:
+    # Private to the current user (0700), so nobody else can bind a worker's
+    # socket first and answer its test runs.
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    if runtime and os.path.isdir(runtime):
+        path = os.path.join(runtime, "reliquary")
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"reliquary-{os.getuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        return None
+    return path
+
+
+def socket_path(python: str, fingerprint: str) -> Optional[str]:
+    """Worker socket for this interpreter, or None if no private directory is available."""
+    # Keyed by interpreter and environment fingerprint, so a changed venv gets a fresh worker.
+    # Kept short: Unix socket paths are limited to ~100 bytes.
+    directory = _socket_dir()
+    if directory is None:
+        return None
+    key = hashlib.sha1(f"{os.path.realpath(python)}\0{fingerprint}".encode()).hexdigest()[:16]
+    return os.path.join(directory, f"pytest_{key}.sock")
+
+
+def _connect(path: str) -> Optional[socket.socket]:
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return None
+    # Only talk to a worker this user started.
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def _start_worker(python: str, path: str, preload: Optional[Callable[[], List[str]]]) -> Optional[socket.socket]:
+    """Start a worker for this interpreter (unless one is already serving) and connect to it."""
+    with _start_lock:
+        sock = _connect(path)
+        if sock is not None or path in _unavailable or not os.path.exists(python):
+            return sock
+
+        with span("pytest_daemon_start") as s:
+            preload = preload() if preload else []
+            s["preload"] = len(preload)
+            try:
+                proc = subprocess.Popen(
+                    [python, WORKER_SCRIPT, "--socket", path,
+                     "--preload", ",".join(preload), "--idle-timeout", str(IDLE_TIMEOUT_S)],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+            except OSError:
+                _unavailable.add(path)
+                s["started"] = False
+                return None
+
+            deadline = time.monotonic() + STARTUP_TIMEOUT_S
+            while time.monotonic() < deadline:
+                sock = _connect(path)
+                if sock is not None:
+                    s["started"] = True
+                    return sock
+                if proc.poll() is not None and proc.returncode != 0:
+                    break
+                time.sleep(0.05)
+
+            _unavailable.add(path)
+            s["started"] = False
+            return None
+
+
+def _request(cwd: str, args: List[str], stdout_path: str, stderr_path: str,
+             timeout_s: Optional[float], max_output_bytes: Optional[int]) -> bytes:
+    return (json.dumps({
+        "cwd": os.path.abspath(cwd),
+        "args": args,
+        "stdout_path": os.path.abspath(stdout_path),
+        "stderr_path": os.path.abspath(stderr_path),
+        "timeout_s": timeout_s,
+        "max_output_bytes": max_output_bytes,
+    }) + "\n").encode()
+
+
+def _result(reply: bytes) -> Optional[Tuple[int, Optional[str]]]:
+    try:
+        data = json.loads(reply)
+        return int(data["exit_code"]), data.get("termination")
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _reply_timeout(timeout_s: Optional[float]) -> Optional[float]:
+    return timeout_s + REPLY_GRACE_S if timeout_s else None
+
+
+# Reported when the worker stops answering within the grace period
+_NO_REPLY = (-9, "timeout")
+
+
+def run_pytest_warm(
+    python: str,
+    fingerprint: str,
+    cwd: str,
+    args: List[str],
+    stdout_path: str,
+    stderr_path: str,
+    preload: Optional[Callable[[], List[str]]] = None,
+    timeout_s: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+) -> Optional[Tuple[int, Optional[str]]]:
+    """
+    Run pytest through the warm worker for `python`, starting it if needed.
+
+    Args:
+        python: Target repo's interpreter (the worker runs under it)
+        fingerprint: Environment fingerprint (see exec_tools.env_fingerprint)
+        cwd: Checkout to run the tests in
+        args: pytest arguments
+        stdout_path: File that receives the run's stdout
+        stderr_path: File that receives the run's stderr
+        preload: Returns the modules a new worker imports once at startup
+        timeout_s: Wall-clock limit; the worker kills the run's process group past it
+        max_output_bytes: Limit on stdout + stderr, enforced the same way
+
+    Returns:
+        (exit code, termination reason or None), or None if no worker is
+        available (use the subprocess path)
+    """
+    if not daemon_enabled():
+        return None
+
+    path = socket_path(python, fingerprint)
+    if path is None:
+        return None
+    sock = _connect(path) or _start_worker(python, path, preload)
+    if sock is None:
+        return None
+
+    with sock, span("pytest_daemon", args=len(args)) as s:
+        sock.settimeout(_reply_timeout(timeout_s))
+        sock.sendall(_request(cwd, args, stdout_path, stderr_path, timeout_s, max_output_bytes))
+        reply = b""
+        try:
+            while not reply.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                reply += chunk
+            result = _result(reply)
+        except socket.timeout:
+            # Closing the connection makes the worker kill the run.
+            result = _NO_REPLY
+        s["exit_code"] = result[0] if result else None
+    return result
+
+
+async def arun_pytest_warm(
+    python: str,
+    fingerprint: str,
+    cwd: str,
+    args: List[str],
+    stdout_path: str,
+    stderr_path: str,
+    preload: Optional[Callable[[], List[str]]] = None,
+    timeout_s: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+) -> Optional[Tuple[int, Optional[str]]]:
+    """
+    Async variant of run_pytest_warm().
+
+    Cancelling it closes the connection, which makes the worker kill the test run.
+    """
+    if not daemon_enabled():
+        return None
+
+    path = socket_path(python, fingerprint)
+    if path is None:
+        return None
+    sock = _connect(path) or await asyncio.to_thread(_start_worker, python, path, preload)
+    if sock is None:
+        return None
+
+    with span("pytest_daemon", args=len(args)) as s:
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+        try:
+            writer.write(_request(cwd, args, stdout_path, stderr_path, timeout_s, max_output_bytes))
+            await writer.drain()
+            try:
+                result = _result(await asyncio.wait_for(reader.readline(), _reply_timeout(timeout_s)))
+            except asyncio.TimeoutError:
+                result = _NO_REPLY
+        finally:
+            writer.close()
+        s["exit_code"] = result[0] if result else None
+    return result
@@ -0,0 +1,212 @@
+"""
+Warm pytest worker (forkserver) for one target-repo interpreter.
+
+Runs under the *target repo's* venv Python, so it must not import reliquary.
+It imports pytest and the repo's third-party dependencies once, then serves
+requests on a Unix socket. Each request forks a child that chdirs into the
+requested checkout, redirects stdout/stderr to the given files and runs
+pytest.main(args), so every test run starts with the heavy imports done
+but without any of the checkout's own modules loaded.
+
+Protocol: one JSON line per connection,
+    {"cwd": ..., "args": [...], "stdout_path": ..., "stderr_path": ...,
+     "timeout_s": ..., "max_output_bytes": ...}
+answered with {"exit_code": n, "termination": null | "timeout" | "output_limit"}.
+The child's process group is killed when it exceeds either limit or when the
+client disconnects first.
+
+Started by reliquary.tools.pytest_daemon; exits after --idle-timeout seconds
+without requests.
+"""
+import argparse
+import importlib
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+
+def _preload(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except BaseException:
+            # Optional speed-up only; the child imports it again if it must.
+            pass
+
+
+def _child(request):
+    try:
+        os.setpgid(0, 0)
+        os.chdir(request["cwd"])
+        for fd, path in ((1, request["stdout_path"]), (2, request["stderr_path"])):
+            target = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(target, fd)
+            os.close(target)
+        # Match `python -m pytest`: the checkout is importable from its root.
+        sys.path.insert(0, request["cwd"])
+        sys.argv = ["pytest"] + list(request["args"])
+
+        import pytest
+        code = pytest.main(list(request["args"]))
+    except BaseException:
+        traceback.print_exc()
+        code = 3
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            pass
+    os._exit(int(code))
+
+
+def _output_size(request):
+    size = 0
+    for key in ("stdout_path", "stderr_path"):
+        try:
+            size += os.path.getsize(request[key])
+        except OSError:
+            pass
+    return size
+
+
+def _kill(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class Worker:
+    def __init__(self, socket_path, idle_timeout):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        # fork() from one thread at a time so children never inherit a half-held lock of ours
+        self.fork_lock = threading.Lock()
+
+    def handle(self, conn):
+        with self.lock:
+            self.active += 1
+        try:
+            buf = b""
+            while not buf.endswith(b"\n"):
+                chunk = conn.recv(65536)
+                if not chunk:
+                    return
+                buf += chunk
+            request = json.loads(buf)
+
+            with self.fork_lock:
+                pid = os.fork()
+            if pid == 0:
+                conn.close()
+                _child(request)
+
+            result = self.wait(pid, conn, request)
+            if result is not None:
+                exit_code, termination = result
+                conn.sendall((json.dumps({"exit_code": exit_code, "termination": termination}) + "\n").encode())
+        except Exception:
+            traceback.print_exc()
+        finally:
+            conn.close()
+            with self.lock:
+                self.active -= 1
+                self.last_used = time.monotonic()
+
+    def wait(self, pid, conn, request):
+        timeout_s = request.get("timeout_s")
+        max_output = request.get("max_output_bytes")
+        deadline = time.monotonic() + timeout_s if timeout_s else None
+        termination = None
+        while True:
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return os.waitstatus_to_exitcode(status), termination
+            if termination is None:
+                if deadline is not None and time.monotonic() > deadline:
+                    termination = "timeout"
+                elif max_output and _output_size(request) > max_output:
+                    termination = "output_limit"
+                if termination:
+                    _kill(pid)
+                    continue
+            readable, _, _ = select.select([conn], [], [], 0.05)
+            if readable and not conn.recv(1, socket.MSG_PEEK):
+                # Client gave up (cancellation): stop the test run.
+                _kill(pid)
+                os.waitpid(pid, 0)
+                return None
+
+    def serve(self):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.socket_path)
+        except OSError:
+            # Another worker bound it while we were preloading.
+            server.close()
+            return
+        server.listen(64)
+        server.settimeout(1.0)
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    with self.lock:
+                        idle = self.active == 0 and time.monotonic() - self.last_used > self.idle_timeout
+                    if idle:
+                        return
+                    continue
+                conn.settimeout(None)
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+
+def _already_served(socket_path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--preload", default="")
+    parser.add_argument("--idle-timeout", type=float, default=900.0)
+    args = parser.parse_args(argv)
+
+    # Another worker won the race to start for this interpreter.
+    if _already_served(args.socket):
+        return 0
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    import pytest  # noqa: F401  (the point of the worker)
+    _preload([m for m in args.preload.split(",") if m])
+
+    Worker(args.socket, args.idle_timeout).serve()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
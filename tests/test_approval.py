@@ -0,0 +1,75 @@
+"""Approving a run only applies to runs the policy gate held back after their tests passed."""
+from typing import Optional, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from reliquary.api import server
+from reliquary.graph.workflow import build_graph
+from reliquary.human.interaction_handler import NotAwaitingApproval, process_approval
+from reliquary.schemas.evidence import CommandRun, Evidence
+from reliquary.schemas.policy import PolicyEvaluation
+from reliquary.schemas.state import WorkItemState
+from reliquary.storage.checkpoint_store import open_checkpointer, thread_config
+
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("RELIQUARY_CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+    monkeypatch.setenv("RELIQUARY_DB_PATH", str(tmp_path / "memory.db"))
+
+
+def _checkpoint_finished_run(work_item_id: str, tests_exit_code: Optional[int], policy_passed: bool, reason: str) -> None:
+    # A run that has ended (verification routed it to END), without running any nodes.
+    runs = [] if tests_exit_code is None else [
+        CommandRun(command="pytest -q", exit_code=tests_exit_code, stdout_path="out.txt", stderr_path="err.txt")
+    ]
+    state = WorkItemState(
+        work_item_id=work_item_id,
+        repo_path=".",
+        task_raw="add /health",
+        status="BLOCKED",
+        blocked_reason=reason,
+        evidence=Evidence(test_runs=runs),
+        policy_evaluation=PolicyEvaluation(policy_version="1.0", evaluated_at="", violations=[],
+                                           passed=policy_passed),
+    )
+    with open_checkpointer() as saver:
+        build_graph(checkpointer=saver).update_state(thread_config(work_item_id), dict(state), as_node="verify")
+
+
+def _checkpointed(work_item_id: str) -> Tuple[WorkItemState, tuple]:
+    with open_checkpointer() as saver:
+        snapshot = build_graph(checkpointer=saver).get_state(thread_config(work_item_id))
+    return WorkItemState.model_validate(snapshot.values), snapshot.next
+
+
+def test_approve_rejected_for_run_with_failing_tests():
+    _checkpoint_finished_run("failing", tests_exit_code=1, policy_passed=True, reason="Tests failed")
+
+    response = TestClient(server.app).post("/runs/failing/approve", params={"approved": True})
+
+    assert response.status_code == 409
+    state, pending = _checkpointed("failing")
+    assert state.status == "BLOCKED"
+    assert pending == ()
+
+
+def test_approve_rejected_for_run_blocked_before_verification():
+    _checkpoint_finished_run("secrets", tests_exit_code=None, policy_passed=True,
+                             reason="Security scans failed - potential secrets detected")
+
+    with pytest.raises(NotAwaitingApproval):
+        process_approval("secrets", True, "ship it")
+
+
+def test_policy_blocked_run_with_passing_tests_can_be_approved():
+    _checkpoint_finished_run("policy", tests_exit_code=0, policy_passed=False, reason="Policy gate failed: x")
+
+    state = process_approval("policy", True, "reviewed")
+
+    assert state.status == "DELIVERING"
+    checkpointed, pending = _checkpointed("policy")
+    assert checkpointed.status == "DELIVERING"
+    assert pending == ("deliver",)
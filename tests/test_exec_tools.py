@@ -0,0 +1,43 @@
+"""Command limits when the command leaves children running in the background."""
+import asyncio
+import os
+import shutil
+import time
+
+import pytest
+
+from reliquary.tools.exec_tools import arun_command, run_command
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="uses /bin/sh job control")
+
+
+def test_backgrounded_child_does_not_outlive_the_command(tmp_path):
+    started = time.monotonic()
+    run = run_command(str(tmp_path), "sleep 30 & echo hi", str(tmp_path / "out"), "bg", timeout_s=5)
+
+    assert time.monotonic() - started < 5
+    assert run.exit_code == 0
+    assert run.termination is None
+    assert run.output_tail == "hi\n"
+
+
+def test_backgrounded_child_does_not_outlive_the_async_command(tmp_path):
+    started = time.monotonic()
+    run = asyncio.run(arun_command(str(tmp_path), "sleep 30 & echo hi", str(tmp_path / "out"), "bg", timeout_s=5))
+
+    assert time.monotonic() - started < 5
+    assert run.exit_code == 0
+    assert run.termination is None
+    assert run.output_tail == "hi\n"
+
+
+@pytest.mark.skipif(shutil.which("setsid") is None, reason="needs setsid")
+def test_output_held_open_outside_the_group_is_cut_at_the_limit(tmp_path):
+    # setsid moves the child out of the command's process group, so only the deadline stops it.
+    started = time.monotonic()
+    run = run_command(str(tmp_path), "setsid sleep 5 & sleep 0.5; echo hi", str(tmp_path / "out"), "escaped",
+                      timeout_s=1)
+
+    assert time.monotonic() - started < 4.5
+    assert run.termination == "timeout"
+    assert run.output_tail == "hi\n"
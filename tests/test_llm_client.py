@@ -0,0 +1,93 @@
+"""Pooled chat clients against a local stand-in for the OpenAI API."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from reliquary.llm import client
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so connection reuse by the shared pool is visible server-side
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests += 1
+        out = json.dumps({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("RELIQUARY_LLM_CACHE", "off")
+    client.reset_clients()
+    with client._lock:
+        client._latencies.clear()
+        client._calls.clear()
+        client._errors.clear()
+    yield server
+    client.reset_clients()
+    server.shutdown()
+    server.server_close()
+
+
+def test_repeated_get_chat_model_shares_one_pool(stub_server):
+    first = client.get_chat_model("stub-model")
+    second = client.get_chat_model("stub-model")
+    other = client.get_chat_model("stub-model", temperature=0.5)
+
+    assert first is second
+    assert other is not first
+    pool = client._sync_http_client()
+    for model in (first, other):
+        assert model.llm.root_client._client is pool
+
+    for model in (first, second, other, first):
+        assert model.invoke("ping").content == "pong"
+
+    assert stub_server.requests == 4
+    # Sequential calls reuse the pool's keep-alive connection.
+    assert stub_server.connections == 1
+
+
+def test_client_stats_counts_calls_per_model(stub_server):
+    for _ in range(3):
+        client.get_chat_model("stub-a").invoke("ping")
+    client.get_chat_model("stub-b").invoke("ping")
+
+    stats = {s["model"]: s for s in client.client_stats()}
+    assert set(stats) == {"stub-a", "stub-b"}
+    assert stats["stub-a"]["calls"] == 3
+    assert stats["stub-b"]["calls"] == 1
+    assert all(s["errors"] == 0 for s in stats.values())
+    assert all(0 < s["p50_ms"] <= s["p95_ms"] for s in stats.values())
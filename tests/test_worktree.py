@@ -0,0 +1,62 @@
+"""Verification checkouts match the user's working tree, uncommitted changes included."""
+import os
+import subprocess
+
+import pytest
+
+from reliquary.tools.edit_tools import edits_to_diff
+from reliquary.tools.git_tools import apply_patch, close_worktree_pool, create_patch_file, worktree
+
+
+def _git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+@pytest.fixture
+def dirty_repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    (repo / "app.py").write_text("x = 1\n")
+    (repo / "old.py").write_text("gone = True\n")
+    _git(repo, "add", ".")
+    _git(repo, "-c", "user.email=t@example.com", "-c", "user.name=t", "commit", "-qm", "init")
+
+    # Uncommitted edit, untracked file, deleted file and an ignored file
+    (repo / "app.py").write_text("x = 2\n")
+    (repo / "helper.py").write_text("from app import x\n")
+    (repo / "old.py").unlink()
+    (repo / ".gitignore").write_text("*.log\n")
+    (repo / "debug.log").write_text("noise\n")
+    yield str(repo)
+    close_worktree_pool(str(repo))
+
+
+def test_patch_written_against_dirty_tree_applies_in_checkout(dirty_repo, tmp_path):
+    patch = edits_to_diff(dirty_repo, [{"path": "app.py", "search": "x = 2", "replace": "x = 3"}])
+    patch_path = str(tmp_path / "change.patch")
+    create_patch_file(patch_path, patch)
+
+    with worktree(dirty_repo) as wt:
+        apply_patch(wt, patch_path)
+        assert open(os.path.join(wt, "app.py")).read() == "x = 3\n"
+        assert open(os.path.join(wt, "helper.py")).read() == "from app import x\n"
+        assert not os.path.exists(os.path.join(wt, "old.py"))
+        assert not os.path.exists(os.path.join(wt, "debug.log"))
+
+    # The user's tree is untouched, and the next checkout starts from it again.
+    assert open(os.path.join(dirty_repo, "app.py")).read() == "x = 2\n"
+    with worktree(dirty_repo) as wt:
+        assert open(os.path.join(wt, "app.py")).read() == "x = 2\n"
+
+
+def test_checkout_follows_a_clean_tree_back_to_head(dirty_repo):
+    _git(dirty_repo, "checkout", "-q", "--", ".")
+    os.remove(os.path.join(dirty_repo, "helper.py"))
+    os.remove(os.path.join(dirty_repo, ".gitignore"))
+    os.remove(os.path.join(dirty_repo, "debug.log"))
+
+    with worktree(dirty_repo) as wt:
+        assert open(os.path.join(wt, "app.py")).read() == "x = 1\n"
+        assert os.path.exists(os.path.join(wt, "old.py"))
+        assert not os.path.exists(os.path.join(wt, "helper.py"))